@@ -0,0 +1,83 @@
+# actions.py
+from __future__ import annotations
+import time
+from typing import Any, Dict, List, Tuple
+
+MAX_ACTIONS = 20
+MAX_NOTCHES = 20
+MAX_TEXT = 2000
+
+Action = Tuple[str, Any]
+
+
+def _coord(step: Dict[str, Any], key: str, n: int) -> float:
+    if key not in step:
+        raise ValueError(f"action {n}: move needs {key}")
+    v = step[key]
+    if isinstance(v, bool) or not isinstance(v, (int, float)):
+        raise ValueError(f"action {n}: {key} must be a number")
+    return max(0.0, min(1000.0, float(v)))
+
+
+def parse_actions(raw: Any) -> List[Action]:
+    # Validates the whole list before anything runs, so a bad step never
+    # leaves the UI half way through a sequence.
+    if not isinstance(raw, list) or not raw:
+        raise ValueError("actions must be a non-empty list")
+    if len(raw) > MAX_ACTIONS:
+        raise ValueError(f"at most {MAX_ACTIONS} actions per call")
+    out: List[Action] = []
+    for n, step in enumerate(raw, 1):
+        if not isinstance(step, dict):
+            raise ValueError(f"action {n}: expected an object")
+        kind = step.get("type")
+        if kind == "move":
+            out.append(("move", (_coord(step, "x", n), _coord(step, "y", n))))
+        elif kind == "click":
+            out.append(("click", None))
+        elif kind == "type":
+            text = step.get("text")
+            if not isinstance(text, str) or not text:
+                raise ValueError(f"action {n}: type needs non-empty text")
+            if len(text) > MAX_TEXT:
+                raise ValueError(f"action {n}: text longer than {MAX_TEXT} characters")
+            out.append(("type", text))
+        elif kind == "scroll":
+            notches = step.get("notches", 1)
+            if isinstance(notches, bool) or not isinstance(notches, int):
+                raise ValueError(f"action {n}: notches must be an integer")
+            if not 1 <= notches <= MAX_NOTCHES:
+                raise ValueError(f"action {n}: notches must be 1-{MAX_NOTCHES}")
+            out.append(("scroll", notches))
+        else:
+            raise ValueError(f"action {n}: unknown type {kind!r}")
+    return out
+
+
+def describe(action: Action) -> str:
+    kind, arg = action
+    if kind == "move":
+        return f"moved to ({arg[0]:.0f}, {arg[1]:.0f})"
+    if kind == "click":
+        return "clicked"
+    if kind == "type":
+        return f"typed {arg!r}"
+    return f"scrolled down {arg} notch{'es' if arg > 1 else ''}"
+
+
+def run_actions(backend: Any, actions: List[Action], gap: float = 0.03) -> str:
+    # gap lets the target process each input (a click's focus change before
+    # the typing that follows it); the caller settles once at the end.
+    for i, (kind, arg) in enumerate(actions):
+        if i and gap > 0:
+            time.sleep(gap)
+        if kind == "move":
+            backend.move_mouse_norm(*arg)
+        elif kind == "click":
+            backend.click_mouse()
+        elif kind == "type":
+            backend.type_text(arg)
+        elif kind == "scroll":
+            backend.scroll_down(arg)
+    done = "; ".join(describe(a) for a in actions)
+    return f"Performed {len(actions)} action{'s' if len(actions) > 1 else ''}: {done}."
@@ -1,44 +1,397 @@
 # agent.py
 from __future__ import annotations
-import os
+import sys
+import threading
 import time
-import base64
 import json
-import urllib.request
-from typing import Any, Dict, List
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
-import winapi
+import actions
+import archive
+import backends
+import budget as budget_mod
+import dumpwriter
+import encoders
+import framediff
+import history as history_mod
+import imaging
+import lmclient
+import payload as payload_mod
+import settle
+import streaming
+import tracing
+import vision
 
 
-def post_to_lm(payload: Dict[str, Any], endpoint: str, timeout: int) -> Dict[str, Any]:
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        endpoint, data=data, headers={"Content-Type": "application/json"}, method="POST"
-    )
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        return json.loads(resp.read().decode("utf-8"))
+ACTION_TOOLS = ("move_mouse", "click_mouse", "type_text", "scroll_down", "perform_actions")
+
+CLICK_TOOLS = ("click_mouse", "perform_actions")
+
+SKIPPED = (
+    "skipped: focus changed after an earlier call in this response; "
+    "look at the new screen before continuing."
+)
+
+OBSERVE_NOTE = (
+    "\n\nEvery action result already includes a fresh screenshot taken after "
+    "the action; call take_screenshot only when no recent screen is available."
+)
+
+
+def post_to_lm(
+    payload: Dict[str, Any],
+    endpoint: str,
+    timeout: int,
+    gzip_body: bool = False,
+    body: Optional[bytes] = None,
+) -> Dict[str, Any]:
+    return lmclient.get_client(endpoint, timeout, gzip_body).post(payload, body)
 
 
 def prune_old_screenshots(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    pairs = []
-    i = 0
-    while i < len(messages):
-        if (i + 1 < len(messages) and
-            messages[i].get("role") == "tool" and
-            messages[i].get("name") == "take_screenshot" and
-            messages[i + 1].get("role") == "user" and
-            isinstance(messages[i + 1].get("content"), list)):
-            pairs.append((i, i + 1))
-            i += 2
-        else:
-            i += 1
-    if len(pairs) <= 1:
+    # Drops every screen but the newest, whichever call it came from (a
+    # take_screenshot, or an action's frame in observe mode) and wherever it
+    # sits in its step's block of images. Tool results stay, so every call
+    # keeps its answer; zoom crops after the newest screen stay with it.
+    screens = [
+        i
+        for i, m in enumerate(messages)
+        if history_mod.is_image_message(m) and not history_mod.is_zoom_message(m)
+    ]
+    if not screens:
         return messages
-    drop = set()
-    for tool_idx, user_idx in pairs[:-1]:
-        drop.add(tool_idx)
-        drop.add(user_idx)
-    return [m for i, m in enumerate(messages) if i not in drop]
+    newest = screens[-1]
+    return [
+        m for i, m in enumerate(messages) if i >= newest or not history_mod.is_image_message(m)
+    ]
+
+
+class ToolExecutor:
+    def __init__(
+        self,
+        cfg: Dict[str, Any],
+        backend: backends.Backend,
+        tracer: Optional[tracing.Tracer] = None,
+    ) -> None:
+        self.backend = backend
+        self.tracer = tracer or tracing.Tracer()
+        self.last_screen_w, self.last_screen_h = backend.get_screen_size()
+        self.vision = vision.from_cfg(cfg)
+        self.zoom_budget = cfg.get("vision_zoom_budget", 1024)
+        self.target_w = cfg.get("target_w")
+        self.target_h = cfg.get("target_h")
+        if not self.target_w or not self.target_h:
+            self.target_w, self.target_h = self.vision.plan(
+                self.last_screen_w, self.last_screen_h, cfg.get("vision_token_budget", 1000)
+            )
+        self.dumps = dumpwriter.from_cfg(cfg)
+        self.dumps.on_write = lambda ms, n: self.tracer.record("dump_write", ms, bytes=n)
+        self.log_frames = cfg.get("log_frames", True)
+        self.encoder = encoders.from_cfg(cfg)
+        self.detector = (
+            framediff.TileChangeDetector(cfg.get("change_tile", 32))
+            if cfg.get("change_detection", False)
+            else None
+        )
+        self.dirty_report_max = cfg.get("dirty_report_max", 0.25)
+        self.settler = settle.from_cfg(cfg, backend)
+        self.action_gap = cfg.get("action_gap", 0.03)
+        self.observe = cfg.get("observe_after_act", False)
+        self.counts = {
+            "tool_calls": 0,
+            "screenshots": 0,
+            "observed_frames": 0,
+            "skipped_calls": 0,
+        }
+        self._capture = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="observe")
+            if self.observe
+            else None
+        )
+        self._shot_lock = threading.Lock()
+
+    def execute(
+        self, name: str, arg_str: str, observe: bool = True
+    ) -> Tuple[str, Union[None, Dict[str, Any], Future]]:
+        # Returns the tool result text and, for a new frame, the user message
+        # carrying the image. In observe-after-act mode an action returns a
+        # Future instead: the post-action frame is settling and encoding on
+        # the capture thread, and resolve() folds it into the result.
+        self.counts["tool_calls"] += 1
+        with self.tracer.span("tool", tool=name):
+            content, image = self._run_tool(name, arg_str)
+        if observe and self.observe and name in ACTION_TOOLS and image is None and not (
+            content.startswith("error")
+        ):
+            image = self.capture_after(name)
+        return content, image
+
+    def capture_after(self, name: str) -> Union[None, Dict[str, Any], Future]:
+        # A frame reflecting the last action: settled and encoded on the
+        # capture thread in observe mode, taken right away otherwise.
+        if self._capture is not None:
+            return self._capture.submit(self._observe, name)
+        done: Future = Future()
+        done.set_result(self.screenshot())
+        return done
+
+    def _observe(self, name: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        self._wait(name)
+        self.counts["observed_frames"] += 1
+        return self.screenshot()
+
+    def resolve(
+        self, content: str, image: Union[None, Dict[str, Any], Future]
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        if isinstance(image, Future):
+            shot, image = image.result()
+            content = f"{content} {shot}"
+        return content, image
+
+    def close(self) -> Dict[str, Any]:
+        if self._capture is not None:
+            self._capture.shutdown(wait=True)
+        return self.dumps.close()
+
+    def _wait(self, name: str) -> None:
+        result = self.settler.wait(name)
+        self.tracer.record("settle", result["settle_ms"], action=name)
+
+    def _settle(self, name: str) -> None:
+        # Observe mode settles on the capture thread instead.
+        if self._capture is None:
+            self._wait(name)
+
+    def _run_tool(self, name: str, arg_str: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        try:
+            if name == "take_screenshot":
+                self.counts["screenshots"] += 1
+                return self.screenshot()
+
+            elif name == "move_mouse":
+                args = json.loads(arg_str)
+                xn = float(args["x"])
+                yn = float(args["y"])
+                xn = max(0.0, min(1000.0, xn))
+                yn = max(0.0, min(1000.0, yn))
+                self.backend.move_mouse_norm(xn, yn)
+                self._settle("move_mouse")
+                return f"Cursor moved to ({xn:.0f}, {yn:.0f}).", None
+
+            elif name == "click_mouse":
+                self.backend.click_mouse()
+                self._settle("click_mouse")
+                return "Mouse clicked.", None
+
+            elif name == "type_text":
+                args = json.loads(arg_str)
+                text = str(args["text"])
+                self.backend.type_text(text)
+                self._settle("type_text")
+                return f"Typed: {text}", None
+
+            elif name == "scroll_down":
+                self.backend.scroll_down()
+                self._settle("scroll_down")
+                return "Scrolled down.", None
+
+            elif name == "perform_actions":
+                args = json.loads(arg_str)
+                steps = actions.parse_actions(args["actions"])
+                content = actions.run_actions(self.backend, steps, self.action_gap)
+                self._settle("perform_actions")
+                return content, None
+
+            elif name == "zoom_region":
+                args = json.loads(arg_str)
+                return self.zoom(
+                    float(args["x0"]), float(args["y0"]), float(args["x1"]), float(args["y1"])
+                )
+
+            return "error: unknown_tool", None
+
+        except (json.JSONDecodeError, KeyError, ValueError, TypeError) as e:
+            return f"error: {str(e)}", None
+
+    def screenshot(self) -> Tuple[str, Optional[Dict[str, Any]]]:
+        # The capture thread and the agent loop share the change detector.
+        with self._shot_lock:
+            return self._screenshot()
+
+    def _screenshot(self) -> Tuple[str, Optional[Dict[str, Any]]]:
+        target_w, target_h = self.target_w, self.target_h
+        rgb, screen_w, screen_h = self._capture_rgb(
+            lambda: self.backend.capture_frame(target_w, target_h)
+        )
+        self.last_screen_w, self.last_screen_h = screen_w, screen_h
+        with self.tracer.span("diff"):
+            diff = self.detector.update(rgb, target_w, target_h) if self.detector else None
+        if diff is not None and not diff["changed"]:
+            return "Screen unchanged since last capture.", None
+
+        png_bytes = self._encode(rgb, target_w, target_h)
+
+        content = "Screenshot captured."
+        if (
+            diff is not None
+            and diff["dirty_tiles"] <= self.dirty_report_max * diff["total_tiles"]
+        ):
+            x0, y0, x1, y1 = framediff.bbox_to_norm(diff["bbox"], target_w, target_h)
+            content += (
+                f" Changed since last capture: region ({x0}, {y0}) to ({x1}, {y1})."
+            )
+        return content, image_message("Current screen:", png_bytes)
+
+    def _capture_rgb(self, grab: Callable[[], Any]) -> Any:
+        with self.tracer.span("capture"):
+            frame = grab()
+        # bgra_to_rgb runs inside the capture on the GDI path; split it out.
+        convert_ms = imaging.take_convert_ms()
+        if convert_ms is not None:
+            self.tracer.record("convert", convert_ms)
+        return frame
+
+    def _encode(self, rgb: bytes, w: int, h: int) -> bytes:
+        with self.tracer.span("encode") as attrs:
+            png_bytes = self.encoder.encode(rgb, w, h)
+            attrs["bytes"] = len(png_bytes)
+        if self.log_frames:
+            print(f"[frame] {json.dumps(self.encoder.last_stats)}", file=sys.stderr)
+        with self.tracer.span("dump_queue"):
+            self.dumps.submit(png_bytes, rgb, w, h)
+        return png_bytes
+
+    def zoom(
+        self, x0: float, y0: float, x1: float, y1: float
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        # A sub-rectangle at up to native resolution, so the overview frame
+        # can stay small and detail is paid for only when asked for.
+        x0, x1 = sorted(max(0.0, min(1000.0, v)) for v in (x0, x1))
+        y0, y1 = sorted(max(0.0, min(1000.0, v)) for v in (y0, y1))
+        screen_w, screen_h = self.last_screen_w, self.last_screen_h
+        left, top = backends.norm_to_screen_px(x0, y0, screen_w, screen_h)
+        right, bottom = backends.norm_to_screen_px(x1, y1, screen_w, screen_h)
+        w, h = right - left + 1, bottom - top + 1
+        if w < 2 or h < 2:
+            return "error: zoom region is empty", None
+        # Never larger than the source: the server's own resize does any
+        # upscaling a small region needs, and the PNG stays small.
+        zw, zh = self.vision.plan(w, h, self.zoom_budget)
+        zw, zh = min(zw, w), min(zh, h)
+        rgb = self._capture_rgb(lambda: self.backend.capture_region(left, top, w, h, zw, zh))
+        png_bytes = self._encode(rgb, zw, zh)
+        text = f"{history_mod.ZOOM_PREFIX} ({x0:.0f}, {y0:.0f}) to ({x1:.0f}, {y1:.0f}):"
+        content = f"Zoomed region captured at {zw}x{zh} from {w}x{h} screen pixels."
+        return content, image_message(text, png_bytes)
+
+
+def image_message(text: str, png_bytes: bytes) -> Dict[str, Any]:
+    return {
+        "role": "user",
+        "content": [
+            {"type": "text", "text": text},
+            {
+                "type": "image_url",
+                "image_url": {"url": payload_mod.ImageData(png_bytes)},
+            },
+        ],
+    }
+
+
+def clicks(name: str, arg_str: str) -> bool:
+    if name == "click_mouse":
+        return True
+    if name == "perform_actions":
+        try:
+            steps = json.loads(arg_str).get("actions") or []
+        except (json.JSONDecodeError, AttributeError):
+            return False
+        return any(isinstance(s, dict) and s.get("type") == "click" for s in steps)
+    return False
+
+
+def can_start_early(name: str, arg_str: str) -> bool:
+    # Whether a call may run before the rest of the response is known. A
+    # click's focus check and a screenshot's deferral depend on the calls
+    # after it, so those wait for run_tool_calls. Early calls run without
+    # observing; run_tool_calls captures the frame if the call was last.
+    return name != "take_screenshot" and not (name in CLICK_TOOLS and clicks(name, arg_str))
+
+
+def run_tool_calls(
+    tools: ToolExecutor,
+    tool_calls: List[Dict[str, Any]],
+    early: Dict[str, Future],
+    policy: str = "sequential",
+) -> List[List[Any]]:
+    # Runs every call of one response in order. A click that moves focus ends
+    # the batch, since later calls were planned against the old screen, and
+    # screenshots asked for mid-batch are taken once, after the last call.
+    results: List[List[Any]] = []
+    wanted: Optional[int] = None
+    last = len(tool_calls) - 1
+    for i, tc in enumerate(tool_calls):
+        name = tc["function"]["name"]
+        arg_str = tc["function"].get("arguments") or "{}"
+        if policy == "first" and i > 0:
+            results.append([tc, "error: only one tool call per response allowed", None])
+            continue
+        if tc["id"] in early:
+            content, image = early[tc["id"]].result()
+        elif name == "take_screenshot" and i < last and policy != "first":
+            tools.counts["tool_calls"] += 1
+            tools.counts["screenshots"] += 1
+            results.append([tc, "Deferred until the other calls in this response ran.", None])
+            wanted = i
+            continue
+        else:
+            click = name in CLICK_TOOLS and clicks(name, arg_str) and i < last
+            before = tools.backend.focus_token() if click else None
+            content, image = tools.execute(name, arg_str, observe=i == last)
+            if click and not content.startswith("error"):
+                after = tools.backend.focus_token()
+                if before is None or after != before:
+                    results.append([tc, content, image])
+                    for rest in tool_calls[i + 1 :]:
+                        results.append([rest, SKIPPED, None])
+                    tools.counts["skipped_calls"] += last - i
+                    if tools.observe:
+                        wanted = i
+                    break
+        results.append([tc, content, image])
+        if image is not None and name != "zoom_region":
+            wanted = None
+        elif tools.observe and name in ACTION_TOOLS and not content.startswith("error"):
+            wanted = i
+    if wanted is not None:
+        results[wanted][2] = tools.capture_after(results[wanted][0]["function"]["name"])
+    return results
+
+
+def trace_llm(
+    tracer: tracing.Tracer,
+    timing: Dict[str, Any],
+    usage: Optional[Dict[str, Any]],
+    timings: Optional[Dict[str, Any]],
+    ttft_ms: Optional[float] = None,
+) -> None:
+    usage = usage or {}
+    tracer.record(
+        "llm",
+        timing.get("total_ms", 0.0),
+        bytes=timing.get("sent_bytes"),
+        prompt_tokens=usage.get("prompt_tokens"),
+        completion_tokens=usage.get("completion_tokens"),
+    )
+    # Prefer the server's own split (llama.cpp "timings"); a stream's first
+    # token is the next best marker. A plain response only has the total.
+    if timings and "prompt_ms" in timings:
+        tracer.record("prefill", timings["prompt_ms"])
+        tracer.record("decode", timings.get("predicted_ms", 0.0))
+    elif ttft_ms is not None:
+        tracer.record("prefill", ttft_ms)
+        tracer.record("decode", max(0.0, timing.get("total_ms", 0.0) - ttft_ms))
 
 
 def run_agent(
@@ -46,153 +399,201 @@ def run_agent(
     task_prompt: str,
     tools_schema: List[Dict[str, Any]],
     cfg: Dict[str, Any],
+    report: Optional[Dict[str, Any]] = None,
 ) -> str:
+    # report, when given, is filled with the run's counters on the way out
+    # (steps, whether the model finished, token usage, the trace summary).
     endpoint = cfg["endpoint"]
     model_id = cfg["model_id"]
     timeout = cfg["timeout"]
     temperature = cfg["temperature"]
     max_tokens = cfg["max_tokens"]
-    target_w = cfg["target_w"]
-    target_h = cfg["target_h"]
-    dump_dir = cfg["dump_dir"]
-    dump_prefix = cfg["dump_prefix"]
-    dump_start = cfg["dump_start"]
     max_steps = cfg["max_steps"]
     step_delay = cfg["step_delay"]
+    log_http = cfg.get("log_http", True)
+    log_history = cfg.get("log_history", True)
+    gzip_requests = cfg.get("gzip_requests", False)
+    stream = cfg.get("stream", False)
+    call_policy = cfg.get("tool_call_policy", "sequential")
+    stream_usage = cfg.get("stream_include_usage", False)
+    recorder = archive.from_cfg(cfg)
+    # Settle polls are probes, not frames the model sees; the archive skips them.
+    backend = recorder.wrap(
+        backends.from_cfg(cfg), skip=(tuple(cfg.get("settle_size", (192, 108))),)
+    )
+    tracer = tracing.from_cfg(cfg)
+    tools = ToolExecutor(cfg, backend, tracer)
+    recorder.start(
+        system_prompt, task_prompt, tools_schema, cfg, (tools.last_screen_w, tools.last_screen_h)
+    )
+    builder = payload_mod.PayloadBuilder()
+    requests = 0
+    steps = 0
+    finished = False
+    final = ""
+    tokens = {"prompt_tokens": 0, "completion_tokens": 0}
+    if tools.observe:
+        system_prompt += OBSERVE_NOTE
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tool") if stream else None
 
-    os.makedirs(dump_dir, exist_ok=True)
-
-    messages: List[Dict[str, Any]] = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": task_prompt},
-    ]
-
-    dump_idx = dump_start
-    last_screen_w, last_screen_h = winapi.get_screen_size()
+    history = history_mod.History(
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": task_prompt},
+        ],
+        policy=cfg.get("history_policy", "checkpoint"),
+        keep_images=cfg.get("history_keep_images", 1),
+        compact_every=cfg.get("history_compact_every", 4),
+        image_tokens=tools.vision.tokens(tools.target_w, tools.target_h),
+        prune=prune_old_screenshots,
+    )
+    context = budget_mod.from_cfg(cfg, history, tools_schema)
+    if tools.log_frames:
+        plan = {
+            "target": [tools.target_w, tools.target_h],
+            "tokens": history.image_tokens,
+            "grid": tools.vision.grid,
+        }
+        print(f"[vision] {json.dumps(plan)}", file=sys.stderr)
 
-    for _ in range(max_steps):
-        resp = post_to_lm(
-            {
+    try:
+        for step in range(1, max_steps + 1):
+            tracer.step = steps = step
+            t_step = time.perf_counter()
+            payload = {
                 "model": model_id,
-                "messages": messages,
+                "messages": context.fit(step),
                 "tools": tools_schema,
                 "tool_choice": "auto",
                 "temperature": temperature,
                 "max_tokens": max_tokens,
-            },
-            endpoint,
-            timeout,
-        )
+            }
+            requests += 1
+            if log_history:
+                print(f"[history] {json.dumps(history.prefix_stats())}", file=sys.stderr)
+            early: Dict[str, Future] = {}
+            if stream:
+                client = lmclient.get_client(endpoint, timeout, gzip_requests)
+                first: List[str] = []
 
-        msg = resp["choices"][0]["message"]
-        messages.append(msg)
+                def dispatch(tc: Dict[str, Any]) -> None:
+                    # Start the first call while the model is still streaming
+                    # its trailing tokens; the rest run in order afterwards.
+                    if first:
+                        return
+                    first.append(tc["id"])
+                    name = tc["function"]["name"]
+                    arg_str = tc["function"].get("arguments") or "{}"
+                    if can_start_early(name, arg_str):
+                        early[tc["id"]] = pool.submit(tools.execute, name, arg_str, False)
 
-        tool_calls = msg.get("tool_calls") or []
-        if not tool_calls:
-            return msg.get("content", "")
-
-        if len(tool_calls) > 1:
-            for extra_tc in tool_calls[1:]:
-                messages.append(
-                    {
-                        "role": "tool",
-                        "tool_call_id": extra_tc["id"],
-                        "name": extra_tc["function"]["name"],
-                        "content": "error: only one tool call per response allowed",
-                    }
+                with tracer.span("serialize") as attrs:
+                    if stream_usage:
+                        body = builder.build(
+                            payload, stream=True, stream_options={"include_usage": True}
+                        )
+                    else:
+                        body = builder.build(payload, stream=True)
+                    attrs["bytes"] = len(body)
+                msg, metrics = streaming.stream_completion(
+                    client.stream(payload, body), dispatch
                 )
-            tool_calls = tool_calls[:1]
-
-        for tc in tool_calls:
-            name = tc["function"]["name"]
-            arg_str = tc["function"].get("arguments", "{}")
-            call_id = tc["id"]
-            content = ""
-
-            try:
-                if name == "take_screenshot":
-                    png_bytes, screen_w, screen_h = winapi.capture_screenshot_png(
-                        target_w, target_h
-                    )
-                    last_screen_w, last_screen_h = screen_w, screen_h
-
-                    fn = os.path.join(
-                        dump_dir, f"{dump_prefix}{dump_idx:04d}.png"
-                    )
-                    with open(fn, "wb") as f:
-                        f.write(png_bytes)
-                    dump_idx += 1
-
-                    content = "Screenshot captured."
-                    b64 = base64.b64encode(png_bytes).decode("ascii")
-
-                    messages.append(
-                        {
-                            "role": "tool",
-                            "tool_call_id": call_id,
-                            "name": name,
-                            "content": content,
-                        }
-                    )
-                    messages.append(
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": "Current screen:"},
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": "data:image/png;base64," + b64
-                                    },
-                                },
-                            ],
-                        }
-                    )
-                    messages = prune_old_screenshots(messages)
-
-                elif name == "move_mouse":
-                    args = json.loads(arg_str)
-                    xn = float(args["x"])
-                    yn = float(args["y"])
-                    xn = max(0.0, min(1000.0, xn))
-                    yn = max(0.0, min(1000.0, yn))
-                    winapi.move_mouse_norm(xn, yn)
-                    time.sleep(0.06)
-                    content = f"Cursor moved to ({xn:.0f}, {yn:.0f})."
-
-                elif name == "click_mouse":
-                    winapi.click_mouse()
-                    time.sleep(0.06)
-                    content = "Mouse clicked."
-
-                elif name == "type_text":
-                    args = json.loads(arg_str)
-                    text = str(args["text"])
-                    winapi.type_text(text)
-                    time.sleep(0.06)
-                    content = f"Typed: {text}"
-
-                elif name == "scroll_down":
-                    winapi.scroll_down()
-                    time.sleep(0.06)
-                    content = "Scrolled down."
-
-                else:
-                    content = "error: unknown_tool"
-
-            except (json.JSONDecodeError, KeyError, ValueError, TypeError) as e:
-                content = f"error: {str(e)}"
-
-            if name != "take_screenshot":
-                messages.append(
+                if log_http:
+                    print(f"[stream] {json.dumps(metrics)}", file=sys.stderr)
+                usage, timings = metrics["usage"], metrics["timings"]
+            else:
+                with tracer.span("serialize") as attrs:
+                    body = builder.build(payload)
+                    attrs["bytes"] = len(body)
+                resp = post_to_lm(payload, endpoint, timeout, gzip_requests, body)
+                msg = resp["choices"][0]["message"]
+                usage, timings, metrics = resp.get("usage"), resp.get("timings"), {}
+            timing = lmclient.get_client(endpoint, timeout, gzip_requests).last_timing
+            trace_llm(tracer, timing, usage, timings, metrics.get("ttft_ms"))
+            for key in tokens:
+                tokens[key] += (usage or {}).get(key) or 0
+            context.observe(step, usage)
+            recorder.event(
+                "llm",
+                step=step,
+                ms=timing.get("total_ms"),
+                bytes=len(body),
+                messages=len(payload["messages"]),
+                usage=usage,
+                message=msg,
+            )
+            if log_http:
+                print(f"[payload] {json.dumps(builder.last_stats)}", file=sys.stderr)
+                print(f"[http] {json.dumps(timing)}", file=sys.stderr)
+
+            history.append(msg)
+
+            tool_calls = msg.get("tool_calls") or []
+            if not tool_calls:
+                tracer.record("step", (time.perf_counter() - t_step) * 1000.0)
+                finished = True
+                final = msg.get("content", "")
+                return final
+
+            results = run_tool_calls(tools, tool_calls, early, call_policy)
+
+            # Observe-mode frames settle and encode during this delay. The
+            # adaptive settler has already waited for the screen instead.
+            if not tools.settler.adaptive:
+                with tracer.span("sleep"):
+                    time.sleep(step_delay)
+
+            # Tool results go in first, as one block after the assistant
+            # message; of several screens only the newest is worth sending.
+            resolved = []
+            for tc, content, image in results:
+                content, image_msg = tools.resolve(content, image)
+                if content.startswith("error"):
+                    tools.dumps.mark_failed()
+                resolved.append((tc, content, image_msg))
+            screens = [
+                i
+                for i, (tc, _, image_msg) in enumerate(resolved)
+                if image_msg is not None and tc["function"]["name"] != "zoom_region"
+            ]
+            for i in screens[:-1]:
+                tc, content, _ = resolved[i]
+                resolved[i] = (tc, f"{content} Superseded by a later screen below.", None)
+            for tc, content, _ in resolved:
+                history.append(
                     {
                         "role": "tool",
-                        "tool_call_id": call_id,
-                        "name": name,
+                        "tool_call_id": tc["id"],
+                        "name": tc["function"]["name"],
                         "content": content,
                     }
                 )
-
-        time.sleep(step_delay)
+            for _, _, image_msg in resolved:
+                if image_msg is not None:
+                    history.append(image_msg)
+            tracer.record("step", (time.perf_counter() - t_step) * 1000.0)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
+        dump_stats = tools.close()
+        if tools.log_frames:
+            print(f"[dump] {json.dumps(dump_stats)}", file=sys.stderr)
+        run_stats = dict(
+            tools.counts,
+            mode="observe" if tools.observe else "explicit",
+            requests=requests,
+            settle=tools.settler.summary(),
+        )
+        if cfg.get("log_run", True):
+            print(f"[run] {json.dumps(run_stats)}", file=sys.stderr)
+        summary = tracer.close()
+        archived = recorder.close(finished=finished, steps=steps, final=final, run=run_stats)
+        if report is not None:
+            report.update(run_stats, steps=steps, finished=finished, trace=summary, **tokens)
+            report["context"] = context.summary()
+            if archived:
+                report["archive"] = archived
+        if cfg.get("log_trace", True) and summary:
+            print(f"[trace]\n{tracing.format_summary(summary)}", file=sys.stderr)
 
     return ""
@@ -0,0 +1,530 @@
+# Run with: python archive.py list <archive_dir>
+#           python archive.py replay <archive_dir> <session> [--config overrides.json]
+#                                    [--speed 0] [--reps 1] [--verbose]
+# Example: python archive.py replay archive 20260105_233612_4242_1
+# Records agent sessions (set cfg["archive_dir"]) into a content-addressed
+# frame store plus a step log, and replays them through run_agent with no
+# model or desktop attached.
+
+# archive.py
+from __future__ import annotations
+import hashlib
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import backends
+import encoders
+import tracing
+
+# Frames are stored unfiltered: still ordinary PNGs, and a replay decodes
+# them with one zlib pass instead of undoing per-row filters in Python.
+BLOB_LEVEL = 6
+
+
+def frame_hash(rgb: Any, w: int, h: int) -> str:
+    digest = hashlib.sha256(b"%dx%d:" % (w, h))
+    digest.update(rgb)
+    return digest.hexdigest()
+
+
+def blob_path(root: str, key: str) -> str:
+    return os.path.join(root, "objects", key[:2], key + ".png")
+
+
+def session_path(root: str, session: str) -> str:
+    return os.path.join(root, "sessions", session + ".jsonl")
+
+
+def decode_png(data: bytes) -> Tuple[bytes, int, int]:
+    # Only what blob frames use: 8-bit RGB, no interlace, filter None rows.
+    if data[:8] != encoders.PNG_SIG:
+        raise ValueError("not a PNG")
+    pos, w, h, idat = 8, 0, 0, []
+    while pos < len(data):
+        n, kind = struct.unpack(">I4s", data[pos : pos + 8])
+        body = data[pos + 8 : pos + 8 + n]
+        if kind == b"IHDR":
+            w, h, depth, color, _, _, interlace = struct.unpack(">IIBBBBB", body)
+            if depth != 8 or color != encoders.COLOR_RGB or interlace:
+                raise ValueError("unsupported PNG layout")
+        elif kind == b"IDAT":
+            idat.append(body)
+        elif kind == b"IEND":
+            break
+        pos += 12 + n
+    raw = zlib.decompress(b"".join(idat))
+    row = w * 3 + 1
+    if len(raw) != row * h or any(raw[y * row] for y in range(h)):
+        raise ValueError("unsupported PNG filter")
+    mv = memoryview(raw)
+    return b"".join(mv[y * row + 1 : (y + 1) * row] for y in range(h)), w, h
+
+
+def _jsonable(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    out = {}
+    for key, value in cfg.items():
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            continue
+        out[key] = value
+    return out
+
+
+class SessionRecorder:
+    # Appends one JSON line per event to sessions/<id>.jsonl and stores each
+    # distinct frame once under objects/, keyed by the hash of its pixels, so
+    # a run of identical screens costs one blob. Blobs are encoded and written
+    # on a background thread; with no root the recorder does nothing.
+    def __init__(self, root: Optional[str], session: Optional[str] = None) -> None:
+        self.root = root
+        self.session = session or tracing.new_run_id()
+        self.stats = {"frames": 0, "stored": 0, "stored_bytes": 0, "deduped": 0, "events": 0}
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._known: set = set()
+        self._file = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        if root:
+            os.makedirs(os.path.join(root, "sessions"), exist_ok=True)
+            self._file = open(session_path(root, self.session), "w", encoding="utf-8")
+            self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive")
+
+    @property
+    def enabled(self) -> bool:
+        return self._file is not None
+
+    def event(self, kind: str, **fields: Any) -> None:
+        if self._file is None:
+            return
+        entry = {"ev": kind, "t_ms": round((time.perf_counter() - self._t0) * 1000.0, 1)}
+        entry.update(fields)
+        line = json.dumps(entry, separators=(",", ":"), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self.stats["events"] += 1
+
+    def start(
+        self,
+        system: str,
+        task: str,
+        tools: List[Dict[str, Any]],
+        cfg: Dict[str, Any],
+        screen: Tuple[int, int],
+    ) -> None:
+        # Everything a replay needs to call run_agent the same way again.
+        self.event(
+            "start", system=system, task=task, tools=tools, cfg=_jsonable(cfg), screen=screen
+        )
+
+    def frame(self, rgb: Any, w: int, h: int) -> Optional[str]:
+        if self._file is None:
+            return None
+        key = frame_hash(rgb, w, h)
+        with self._lock:
+            self.stats["frames"] += 1
+            new = key not in self._known and not os.path.exists(blob_path(self.root, key))
+            self._known.add(key)
+            if not new:
+                self.stats["deduped"] += 1
+        if new:
+            self._pool.submit(self._store, key, bytes(rgb), w, h)
+        return key
+
+    def _store(self, key: str, rgb: bytes, w: int, h: int) -> None:
+        path = blob_path(self.root, key)
+        data = encoders.encode_png(rgb, w, h, level=BLOB_LEVEL, filter="none")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[archive] error: {e}", file=sys.stderr)
+            return
+        with self._lock:
+            self.stats["stored"] += 1
+            self.stats["stored_bytes"] += len(data)
+
+    def wrap(
+        self, backend: backends.Backend, skip: Tuple[Tuple[int, int], ...] = ()
+    ) -> backends.Backend:
+        return RecordingBackend(backend, self, skip) if self.enabled else backend
+
+    def close(self, **fields: Any) -> Dict[str, Any]:
+        if self._file is None:
+            return {}
+        self._pool.shutdown(wait=True)
+        self.event("end", **fields, archive=dict(self.stats))
+        self._file.close()
+        self._file = None
+        return dict(self.stats, session=self.session)
+
+
+class RecordingBackend(backends.Backend):
+    # Passes every call through to the real backend and logs it: frames by
+    # hash (probe sizes in skip, i.e. settle polls, are not kept), actions
+    # with their arguments and duration, and focus tokens.
+    def __init__(
+        self,
+        inner: backends.Backend,
+        recorder: SessionRecorder,
+        skip: Tuple[Tuple[int, int], ...] = (),
+    ) -> None:
+        self.inner = inner
+        self.recorder = recorder
+        self.skip = set(skip)
+        self.name = inner.name
+
+    def init(self) -> None:
+        self.inner.init()
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        return self.inner.get_screen_size()
+
+    def capture_frame(self, target_w: int, target_h: int) -> Tuple[bytes, int, int]:
+        t0 = time.perf_counter()
+        rgb, screen_w, screen_h = self.inner.capture_frame(target_w, target_h)
+        if (target_w, target_h) not in self.skip:
+            ms = (time.perf_counter() - t0) * 1000.0
+            key = self.recorder.frame(rgb, target_w, target_h)
+            self.recorder.event(
+                "frame",
+                size=[target_w, target_h],
+                screen=[screen_w, screen_h],
+                hash=key,
+                ms=round(ms, 2),
+            )
+        return rgb, screen_w, screen_h
+
+    def capture_region(
+        self, x: int, y: int, w: int, h: int, target_w: int, target_h: int
+    ) -> bytes:
+        t0 = time.perf_counter()
+        rgb = self.inner.capture_region(x, y, w, h, target_w, target_h)
+        ms = (time.perf_counter() - t0) * 1000.0
+        key = self.recorder.frame(rgb, target_w, target_h)
+        self.recorder.event(
+            "region", rect=[x, y, w, h], size=[target_w, target_h], hash=key, ms=round(ms, 2)
+        )
+        return rgb
+
+    def _act(self, name: str, args: List[Any], fn: Any) -> Any:
+        t0 = time.perf_counter()
+        result = fn(*args)
+        ms = (time.perf_counter() - t0) * 1000.0
+        self.recorder.event("action", name=name, args=args, ms=round(ms, 2))
+        return result
+
+    def move_mouse_norm(self, xn: float, yn: float) -> Tuple[int, int]:
+        return self._act("move_mouse_norm", [xn, yn], self.inner.move_mouse_norm)
+
+    def click_mouse(self) -> None:
+        self._act("click_mouse", [], self.inner.click_mouse)
+
+    def type_text(self, text: str) -> None:
+        self._act("type_text", [text], self.inner.type_text)
+
+    def scroll_down(self, notches: int = 1) -> None:
+        self._act("scroll_down", [notches], self.inner.scroll_down)
+
+    def focus_token(self) -> Any:
+        token = self.inner.focus_token()
+        self.recorder.event("focus", token=token)
+        return token
+
+
+def from_cfg(cfg: Dict[str, Any]) -> SessionRecorder:
+    return SessionRecorder(cfg.get("archive_dir"))
+
+
+def load_session(root: str, session: str) -> List[Dict[str, Any]]:
+    with open(session_path(root, session), "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def list_sessions(root: str) -> List[Dict[str, Any]]:
+    out = []
+    sessions_dir = os.path.join(root, "sessions")
+    for name in sorted(os.listdir(sessions_dir)) if os.path.isdir(sessions_dir) else []:
+        if not name.endswith(".jsonl"):
+            continue
+        events = load_session(root, name[: -len(".jsonl")])
+        start = next((e for e in events if e["ev"] == "start"), {})
+        end = next((e for e in events if e["ev"] == "end"), {})
+        frames = [e["hash"] for e in events if e["ev"] in ("frame", "region")]
+        out.append(
+            {
+                "session": name[: -len(".jsonl")],
+                "steps": sum(1 for e in events if e["ev"] == "llm"),
+                "actions": sum(1 for e in events if e["ev"] == "action"),
+                "frames": len(frames),
+                "unique": len(set(frames)),
+                "finished": end.get("finished"),
+                "run_s": round(end.get("t_ms", 0.0) / 1000.0, 1),
+                "task": (start.get("task") or "")[:40],
+            }
+        )
+    return out
+
+
+class ReplayBackend(backends.Backend):
+    # Serves a recorded session's frames back in order, one queue per
+    # capture size (regions separately), and checks each action against the
+    # recording. Sizes that were never recorded (settle polls) get a blank
+    # frame, which the settle detector sees as already stable.
+    name = "replay"
+
+    def __init__(self, root: str, events: List[Dict[str, Any]]) -> None:
+        self.root = root
+        self.frames: Dict[Tuple[str, int, int], List[Dict[str, Any]]] = {}
+        self.actions = [e for e in events if e["ev"] == "action"]
+        self.focus = [e["token"] for e in events if e["ev"] == "focus"]
+        for e in events:
+            if e["ev"] in ("frame", "region"):
+                self.frames.setdefault((e["ev"], *e["size"]), []).append(e)
+        start = next((e for e in events if e["ev"] == "start"), {})
+        self.screen = tuple(start.get("screen") or (1920, 1080))
+        self.stats = {
+            "frames": 0,
+            "missing_frames": 0,
+            "overruns": 0,
+            "actions": 0,
+            "mismatched_actions": 0,
+        }
+        self._pos: Dict[Any, int] = {}
+        self._cache: Dict[str, bytes] = {}
+
+    def _next(self, key: Any, items: List[Any]) -> Optional[Any]:
+        i = self._pos.get(key, 0)
+        self._pos[key] = i + 1
+        if i < len(items):
+            return items[i]
+        # Past the end the run has diverged; keep showing the last state.
+        self.stats["overruns"] += 1
+        return items[-1] if items else None
+
+    def _pixels(self, entry: Optional[Dict[str, Any]], w: int, h: int) -> bytes:
+        if entry is None:
+            self.stats["missing_frames"] += 1
+            return bytes(w * h * 3)
+        self.stats["frames"] += 1
+        key = entry["hash"]
+        if key not in self._cache:
+            with open(blob_path(self.root, key), "rb") as f:
+                rgb, _, _ = decode_png(f.read())
+            # Consecutive repeats are the common case; one frame is enough.
+            self._cache = {key: rgb}
+        return self._cache[key]
+
+    def unused(self) -> int:
+        # Recorded frames and actions the replay never asked for.
+        streams = list(self.frames.items()) + [("action", self.actions)]
+        return sum(max(0, len(items) - self._pos.get(k, 0)) for k, items in streams)
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        return self.screen
+
+    def capture_frame(self, target_w: int, target_h: int) -> Tuple[bytes, int, int]:
+        key = ("frame", target_w, target_h)
+        if key not in self.frames:
+            return bytes(target_w * target_h * 3), self.screen[0], self.screen[1]
+        entry = self._next(key, self.frames[key])
+        self.screen = tuple(entry["screen"])
+        return self._pixels(entry, target_w, target_h), self.screen[0], self.screen[1]
+
+    def capture_region(
+        self, x: int, y: int, w: int, h: int, target_w: int, target_h: int
+    ) -> bytes:
+        key = ("region", target_w, target_h)
+        entry = self._next(key, self.frames.get(key, []))
+        return self._pixels(entry, target_w, target_h)
+
+    def _act(self, name: str, args: List[Any]) -> None:
+        self.stats["actions"] += 1
+        i = self._pos.get("action", 0)
+        self._pos["action"] = i + 1
+        rec = self.actions[i] if i < len(self.actions) else None
+        if rec is None or rec["name"] != name or rec["args"] != args:
+            self.stats["mismatched_actions"] += 1
+
+    def move_mouse_norm(self, xn: float, yn: float) -> Tuple[int, int]:
+        self._act("move_mouse_norm", [xn, yn])
+        return backends.norm_to_screen_px(xn, yn, *self.screen)
+
+    def click_mouse(self) -> None:
+        self._act("click_mouse", [])
+
+    def type_text(self, text: str) -> None:
+        self._act("type_text", [text])
+
+    def scroll_down(self, notches: int = 1) -> None:
+        self._act("scroll_down", [notches])
+
+    def focus_token(self) -> Any:
+        return self._next("focus", self.focus)
+
+
+class ArchivePolicy:
+    # The recorded assistant messages by turn, for lmstub (the same interface
+    # as lmstub.Policy; lmstub is only loaded once a replay starts).
+    name = "archive"
+
+    def __init__(self, llm: List[Dict[str, Any]]) -> None:
+        self.llm = llm
+        self.missing = 0
+
+    def respond(self, request: Dict[str, Any], turn: int) -> Dict[str, Any]:
+        if turn < len(self.llm):
+            return self.llm[turn]["message"]
+        self.missing += 1
+        return {"role": "assistant", "content": ""}
+
+    def usage(self, request: Dict[str, Any], turn: int) -> Optional[Dict[str, Any]]:
+        return self.llm[turn].get("usage") if turn < len(self.llm) else None
+
+
+# Replays are for regression and perf runs: no real UI to wait for, and
+# nothing worth writing out again.
+REPLAY_CFG = {
+    "step_delay": 0.0,
+    "action_gap": 0.0,
+    "settle_interval": 0.0,
+    "settle_min_wait": 0.0,
+    "dump_format": "none",
+    "archive_dir": None,
+    "log_http": False,
+    "log_history": False,
+    "log_budget": False,
+    "log_frames": False,
+    "log_settle": False,
+    "log_trace": False,
+    "log_run": False,
+    "metrics_file": None,
+}
+
+
+def replay(
+    root: str,
+    session: str,
+    overrides: Optional[Dict[str, Any]] = None,
+    speed: float = 0.0,
+    verbose: bool = False,
+) -> Dict[str, Any]:
+    # Runs the recorded task again: the recorded model responses come from an
+    # in-process stub server (delayed by lmstub's latency model unless speed
+    # is 0) and the recorded frames from a ReplayBackend.
+    import lmstub
+    import main as main_mod
+    import vision
+    from agent import run_agent
+
+    events = load_session(root, session)
+    start = next((e for e in events if e["ev"] == "start"), None)
+    if start is None:
+        raise ValueError(f"{session}: no start record")
+    llm = [e for e in events if e["ev"] == "llm"]
+    end = next((e for e in events if e["ev"] == "end"), {})
+
+    backend = ReplayBackend(root, events)
+    cfg = main_mod.default_cfg(backend)
+    cfg.update(start.get("cfg") or {})
+    cfg.update(REPLAY_CFG)
+    if verbose:
+        cfg.update(log_http=True, log_history=True, log_frames=True)
+    cfg.update(overrides or {})
+    cfg["backend"] = backend
+
+    policy = ArchivePolicy(llm)
+    latency = lmstub.LatencyModel(vision.from_cfg(cfg), speed=speed)
+    stub = lmstub.start(policy, latency)
+    cfg["endpoint"] = stub.endpoint
+    report: Dict[str, Any] = {}
+    t0 = time.perf_counter()
+    try:
+        final = run_agent(start["system"], start["task"], start["tools"], cfg, report)
+        run_s = time.perf_counter() - t0
+    finally:
+        stub.shutdown()
+        stub.server_close()
+    backend.stats["unused"] = backend.unused()
+    diverged = (
+        backend.stats["missing_frames"]
+        + backend.stats["overruns"]
+        + backend.stats["mismatched_actions"]
+        + backend.stats["unused"]
+        + policy.missing
+        + int(report.get("steps", 0) != len(llm))
+    )
+    return {
+        "session": session,
+        "recorded": {
+            "steps": len(llm),
+            "finished": end.get("finished"),
+            "run_s": round(end.get("t_ms", 0.0) / 1000.0, 3),
+        },
+        "replayed": {
+            "steps": report.get("steps", 0),
+            "finished": report.get("finished", False),
+            "run_s": round(run_s, 3),
+        },
+        "final_matches": final == end.get("final"),
+        "diverged": diverged,
+        "backend": backend.stats,
+        "missing_responses": policy.missing,
+        "trace": report.get("trace", {}),
+    }
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    if len(args) < (3 if args[:1] == ["replay"] else 2) or args[0] not in ("list", "replay"):
+        sys.exit(
+            "Usage: python archive.py list <archive_dir>\n"
+            "       python archive.py replay <archive_dir> <session> [--config overrides.json]"
+            " [--speed 0] [--reps 1] [--verbose]"
+        )
+    if args[0] == "list":
+        for entry in list_sessions(args[1]):
+            print(json.dumps(entry))
+        return
+    root, session, rest = args[1], args[2], args[3:]
+    opts: Dict[str, Any] = {"config": None, "speed": "0", "reps": "1"}
+    verbose = False
+    i = 0
+    while i < len(rest):
+        key = rest[i][2:] if rest[i].startswith("--") else ""
+        if key == "verbose":
+            verbose = True
+            i += 1
+            continue
+        if key not in opts or i + 1 >= len(rest):
+            sys.exit(f"unknown argument: {rest[i]}")
+        opts[key] = rest[i + 1]
+        i += 2
+    overrides = None
+    if opts["config"]:
+        with open(opts["config"], "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+    diverged = 0
+    for rep in range(1, max(1, int(opts["reps"])) + 1):
+        result = replay(root, session, overrides, float(opts["speed"]), verbose)
+        trace = result.pop("trace")
+        print(json.dumps(dict(result, rep=rep)))
+        if trace:
+            print(tracing.format_summary(trace), file=sys.stderr)
+        diverged += result["diverged"]
+    if diverged:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# backends.py
+from __future__ import annotations
+from typing import Any, Dict, Optional, Tuple
+
+from encoders import FrameEncoder, encode_png
+
+
+def norm_to_screen_px(
+    xn: float, yn: float, screen_w: int, screen_h: int
+) -> Tuple[int, int]:
+    x = int(round((xn / 1000.0) * (screen_w - 1)))
+    y = int(round((yn / 1000.0) * (screen_h - 1)))
+    return x, y
+
+
+class Backend:
+    name = "base"
+
+    def init(self) -> None:
+        pass
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        raise NotImplementedError
+
+    def capture_frame(self, target_w: int, target_h: int) -> Tuple[bytes, int, int]:
+        raise NotImplementedError
+
+    def capture_region(
+        self, x: int, y: int, w: int, h: int, target_w: int, target_h: int
+    ) -> bytes:
+        # The w x h screen-pixel rectangle at (x, y), scaled to target_w x target_h.
+        raise NotImplementedError
+
+    def capture_screenshot_png(
+        self, target_w: int, target_h: int, encoder: Optional[FrameEncoder] = None
+    ) -> Tuple[bytes, int, int]:
+        rgb, screen_w, screen_h = self.capture_frame(target_w, target_h)
+        if encoder is None:
+            return encode_png(rgb, target_w, target_h), screen_w, screen_h
+        return encoder.encode(rgb, target_w, target_h), screen_w, screen_h
+
+    def move_mouse_norm(self, xn: float, yn: float) -> Tuple[int, int]:
+        raise NotImplementedError
+
+    def click_mouse(self) -> None:
+        raise NotImplementedError
+
+    def type_text(self, text: str) -> None:
+        raise NotImplementedError
+
+    def focus_token(self) -> Any:
+        # Identifies the focused window, or None when the backend cannot tell.
+        return None
+
+    def scroll_down(self, notches: int = 1) -> None:
+        raise NotImplementedError
+
+
+class WinApiBackend(Backend):
+    name = "winapi"
+
+    def __init__(
+        self, input_chunk: int = 512, input_rate: float = 0.0, cursor: str = "sprite"
+    ) -> None:
+        import winapi
+
+        if cursor not in winapi.CURSOR_MODES:
+            raise ValueError(f"unknown cursor mode: {cursor}")
+        self.api = winapi
+        winapi.input_engine.chunk = max(2, input_chunk)
+        winapi.input_engine.rate = input_rate
+        winapi.cursor_mode = cursor
+
+    def init(self) -> None:
+        self.api.init_dpi()
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        return self.api.get_screen_size()
+
+    def capture_frame(self, target_w: int, target_h: int) -> Tuple[bytes, int, int]:
+        return self.api.capture_frame(target_w, target_h)
+
+    def capture_region(
+        self, x: int, y: int, w: int, h: int, target_w: int, target_h: int
+    ) -> bytes:
+        return self.api.capture_region(x, y, w, h, target_w, target_h)
+
+    def move_mouse_norm(self, xn: float, yn: float) -> Tuple[int, int]:
+        return self.api.move_mouse_norm(xn, yn)
+
+    def click_mouse(self) -> None:
+        self.api.click_mouse()
+
+    def type_text(self, text: str) -> None:
+        self.api.type_text(text)
+
+    def focus_token(self) -> Any:
+        return self.api.get_foreground_window()
+
+    def scroll_down(self, notches: int = 1) -> None:
+        self.api.scroll_down(notches)
+
+
+BACKENDS = ("winapi", "virtual")
+
+
+def create_backend(name: str, options: Optional[Dict[str, Any]] = None) -> Backend:
+    if name == "winapi":
+        return WinApiBackend(**(options or {}))
+    if name == "virtual":
+        from virtual_desktop import VirtualDesktop
+
+        return VirtualDesktop(**(options or {}))
+    raise ValueError(f"unknown backend: {name}")
+
+
+def from_cfg(cfg: Dict[str, Any]) -> Backend:
+    backend = cfg.get("backend", "winapi")
+    if isinstance(backend, Backend):
+        return backend
+    return create_backend(backend, cfg.get("backend_options"))
@@ -0,0 +1,322 @@
+# Run with: python batch.py scenarios.json [--scenarios 1,3-5] [--reps 3] [--concurrency 4]
+#                           [--config overrides.json ...] [--backend virtual]
+#                           [--stub observe|random|done|<script.json>|<log>] [--stub-speed 1.0]
+#                           [--out report.json] [--verbose]
+# Example: python batch.py scenarios.json --reps 3 --concurrency 4
+#          python batch.py scenarios.json --stub random --config fast.json --config small.json
+# Runs every selected scenario reps times per configuration, concurrently on
+# separate virtual desktops, and reports success, steps, time, tokens and
+# tasks/hour for each configuration.
+
+# batch.py
+from __future__ import annotations
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+import backends
+import lmclient
+import main as main_mod
+import tracing
+from agent import run_agent
+
+# Per-step logging from a dozen agents at once is unreadable; --verbose
+# keeps it.
+QUIET = {
+    "log_http": False,
+    "log_history": False,
+    "log_budget": False,
+    "log_frames": False,
+    "log_settle": False,
+    "log_trace": False,
+    "log_run": False,
+    "metrics_file": None,
+}
+
+COUNTERS = ("steps", "requests", "tool_calls", "screenshots", "prompt_tokens", "completion_tokens")
+
+
+def parse_selection(spec: str, count: int) -> List[int]:
+    # "1,3-5" -> [1, 3, 4, 5]; scenario numbers are 1-based as in main.py.
+    out: List[int] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        for n in range(int(lo), int(hi or lo) + 1):
+            if not 1 <= n <= count:
+                raise ValueError(f"no scenario {n} (file has {count})")
+            if n not in out:
+                out.append(n)
+    return out
+
+
+def load_config(spec: str) -> Tuple[str, Dict[str, Any]]:
+    # "name=path.json" or "path.json" (named after the file).
+    name, sep, path = spec.partition("=")
+    if not sep:
+        path = spec
+        name = os.path.splitext(os.path.basename(spec))[0]
+    with open(path, "r", encoding="utf-8") as f:
+        overrides = json.load(f)
+    if not isinstance(overrides, dict):
+        raise ValueError(f"{path}: expected an object of cfg overrides")
+    return name, overrides
+
+
+def run_one(
+    base: Dict[str, Any],
+    backend_name: str,
+    run_dir: str,
+    scenario: int,
+    rep: int,
+    system_prompt: str,
+    task_prompt: str,
+    tools_schema: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    cfg = dict(base)
+    backend = backends.create_backend(backend_name, cfg.get("backend_options"))
+    backend.init()
+    cfg["backend"] = backend
+    cfg["dump_dir"] = os.path.join(run_dir, f"s{scenario}_r{rep}")
+    report: Dict[str, Any] = {}
+    result: Dict[str, Any] = {"scenario": scenario, "rep": rep}
+    t0 = time.perf_counter()
+    try:
+        result["final"] = run_agent(system_prompt, task_prompt, tools_schema, cfg, report)
+        result["error"] = None
+    except Exception as e:
+        result["final"] = ""
+        result["error"] = f"{type(e).__name__}: {e}"
+        if base.get("log_http"):
+            traceback.print_exc()
+    result["run_s"] = round(time.perf_counter() - t0, 3)
+    result["success"] = bool(report.get("finished")) and result["error"] is None
+    for key in COUNTERS:
+        result[key] = report.get(key, 0)
+    return result
+
+
+def summarize(runs: List[Dict[str, Any]], wall_s: float) -> Dict[str, Any]:
+    n = len(runs)
+    ok = [r for r in runs if r["success"]]
+    run_s = sorted(r["run_s"] for r in runs)
+    steps = sorted(r["steps"] for r in runs)
+    prompt = sum(r["prompt_tokens"] for r in runs)
+    completion = sum(r["completion_tokens"] for r in runs)
+    return {
+        "runs": n,
+        "succeeded": len(ok),
+        "success_rate": round(len(ok) / n, 3) if n else 0.0,
+        "errors": sum(1 for r in runs if r["error"]),
+        "steps_mean": round(statistics.mean(steps), 2) if n else 0.0,
+        "steps_max": steps[-1] if n else 0,
+        "run_s_p50": round(tracing.percentile(run_s, 0.5), 3),
+        "run_s_p90": round(tracing.percentile(run_s, 0.9), 3),
+        "wall_s": round(wall_s, 3),
+        "requests": sum(r["requests"] for r in runs),
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "tokens_per_run": round((prompt + completion) / n, 1) if n else 0.0,
+        "tasks_per_hour": round(n * 3600.0 / wall_s, 1) if wall_s > 0 else 0.0,
+        "successes_per_hour": round(len(ok) * 3600.0 / wall_s, 1) if wall_s > 0 else 0.0,
+    }
+
+
+def by_scenario(runs: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    groups: Dict[int, List[Dict[str, Any]]] = {}
+    for r in runs:
+        groups.setdefault(r["scenario"], []).append(r)
+    return {
+        str(n): {
+            "runs": len(rs),
+            "succeeded": sum(1 for r in rs if r["success"]),
+            "steps_mean": round(statistics.mean(r["steps"] for r in rs), 2),
+            "run_s_mean": round(statistics.mean(r["run_s"] for r in rs), 3),
+        }
+        for n, rs in sorted(groups.items())
+    }
+
+
+def format_report(configs: Dict[str, Dict[str, Any]]) -> str:
+    cols = [
+        ("runs", 6),
+        ("success_rate", 9),
+        ("steps_mean", 8),
+        ("run_s_p50", 10),
+        ("run_s_p90", 10),
+        ("wall_s", 9),
+        ("tokens_per_run", 11),
+        ("tasks_per_hour", 11),
+    ]
+    heads = ["runs", "success", "steps", "run_p50", "run_p90", "wall_s", "tok/run", "tasks/h"]
+    lines = [f"{'config':<20}" + "".join(f"{h:>{w}}" for h, (_, w) in zip(heads, cols))]
+    for name, entry in configs.items():
+        s = entry["summary"]
+        lines.append(f"{name:<20}" + "".join(f"{s[k]:>{w}}" for k, w in cols))
+    return "\n".join(lines)
+
+
+def run_batch(
+    data: Dict[str, Any],
+    selected: List[int],
+    configs: List[Tuple[str, Dict[str, Any]]],
+    reps: int = 1,
+    concurrency: int = 1,
+    backend_name: str = "virtual",
+    endpoint: Optional[str] = None,
+    verbose: bool = False,
+    out_dir: str = "batches",
+) -> Dict[str, Any]:
+    batch_dir = os.path.join(out_dir, time.strftime("%Y%m%d_%H%M%S"))
+    result: Dict[str, Any] = {"dir": batch_dir, "configs": {}}
+    lock = threading.Lock()
+    for name, overrides in configs:
+        base = main_mod.default_cfg(None)
+        base["trace_dir"] = os.path.join(batch_dir, "traces")
+        if not verbose:
+            base.update(QUIET)
+        base.update(overrides)
+        if endpoint:
+            base["endpoint"] = endpoint
+        # One keep-alive pool per endpoint, shared by every agent thread;
+        # it must hold a socket per concurrent request to avoid reconnects.
+        client = lmclient.get_client(
+            base["endpoint"], base["timeout"], base.get("gzip_requests", False)
+        )
+        client.max_idle = max(client.max_idle, concurrency)
+        opened = client.connections
+        jobs = [(n, rep) for rep in range(1, reps + 1) for n in selected]
+        runs: List[Dict[str, Any]] = []
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="agent") as pool:
+            futures = [
+                pool.submit(
+                    run_one,
+                    base,
+                    backend_name,
+                    os.path.join(batch_dir, name),
+                    n,
+                    rep,
+                    data["shared_system_prompt"],
+                    data["scenarios"][n - 1]["task_prompt"],
+                    data["tools"],
+                )
+                for n, rep in jobs
+            ]
+            for fut in as_completed(futures):
+                r = fut.result()
+                with lock:
+                    runs.append(r)
+                    line = {k: v for k, v in r.items() if k != "final"}
+                    print(f"[batch] {json.dumps(dict(line, config=name))}", file=sys.stderr)
+        wall_s = time.perf_counter() - t0
+        runs.sort(key=lambda r: (r["rep"], r["scenario"]))
+        summary = summarize(runs, wall_s)
+        summary["connections"] = client.connections - opened
+        summary["concurrency"] = concurrency
+        result["configs"][name] = {
+            "overrides": overrides,
+            "summary": summary,
+            "scenarios": by_scenario(runs),
+            "runs": runs,
+        }
+    return result
+
+
+def main() -> None:
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python batch.py <scenario_file> [--scenarios 1,3-5] [--reps N] ...")
+    opts: Dict[str, Any] = {
+        "scenarios": None,
+        "reps": "1",
+        "concurrency": "1",
+        "backend": "virtual",
+        "endpoint": None,
+        "stub": None,
+        "stub-speed": "1.0",
+        "out": None,
+    }
+    config_specs: List[str] = []
+    verbose = False
+    args = sys.argv[2:]
+    i = 0
+    while i < len(args):
+        key = args[i][2:] if args[i].startswith("--") else ""
+        if key == "verbose":
+            verbose = True
+            i += 1
+            continue
+        if (key not in opts and key != "config") or i + 1 >= len(args):
+            sys.exit(f"unknown argument: {args[i]}")
+        if key == "config":
+            config_specs.append(args[i + 1])
+        else:
+            opts[key] = args[i + 1]
+        i += 2
+
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        data = json.load(f)
+    count = len(data["scenarios"])
+    try:
+        selected = parse_selection(opts["scenarios"] or f"1-{count}", count)
+        configs = [load_config(spec) for spec in config_specs] or [("default", {})]
+    except (OSError, ValueError) as e:
+        sys.exit(str(e))
+
+    backend_name = opts["backend"]
+    if backend_name not in backends.BACKENDS:
+        sys.exit(f"Unknown backend (choose from {', '.join(backends.BACKENDS)})")
+    concurrency = max(1, int(opts["concurrency"]))
+    if backend_name == "winapi":
+        # There is one real desktop; agents on it would fight over the mouse.
+        if os.name != "nt":
+            sys.exit("Windows required")
+        concurrency = 1
+
+    endpoint = opts["endpoint"]
+    stub = None
+    if opts["stub"]:
+        import lmstub
+        import vision
+
+        spec = opts["stub"]
+        replay = [spec] if spec.endswith((".txt", ".jsonl")) else []
+        latency = lmstub.LatencyModel(
+            vision.from_cfg(main_mod.default_cfg(None)), speed=float(opts["stub-speed"])
+        )
+        stub = lmstub.start(lmstub.make_policy(spec, replay, 5, 0), latency)
+        endpoint = stub.endpoint
+        print(f"[batch] {stub.policy.name} stub on {endpoint}", file=sys.stderr)
+
+    try:
+        result = run_batch(
+            data,
+            selected,
+            configs,
+            reps=max(1, int(opts["reps"])),
+            concurrency=concurrency,
+            backend_name=backend_name,
+            endpoint=endpoint,
+            verbose=verbose,
+        )
+    finally:
+        if stub is not None:
+            stub.shutdown()
+            stub.server_close()
+
+    print(format_report(result["configs"]))
+    if opts["out"]:
+        with open(opts["out"], "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Run with: python bench_bgra_to_rgb.py [width] [height] [repeats]
+# Example: python bench_bgra_to_rgb.py 1344 756 5
+
+# bench_bgra_to_rgb.py
+from __future__ import annotations
+import sys
+import time
+import random
+import ctypes
+from typing import List
+
+import imaging
+
+
+def synthetic_bgra(w: int, h: int, seed: int = 0) -> bytes:
+    rnd = random.Random(seed)
+    row = bytearray(w * 4)
+    for x in range(w):
+        row[x * 4] = (x * 255) // max(1, w - 1)
+        row[x * 4 + 1] = rnd.randrange(256)
+        row[x * 4 + 2] = 255 - row[x * 4]
+        row[x * 4 + 3] = 255
+    out = bytearray()
+    for y in range(h):
+        shift = (y * 4 * 7) % len(row)
+        out += row[shift:] + row[:shift]
+    return bytes(out)
+
+
+def timed(fn, src, w: int, h: int, repeats: int) -> List[float]:
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn(src, w, h)
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def main() -> None:
+    w = int(sys.argv[1]) if len(sys.argv) > 1 else 1344
+    h = int(sys.argv[2]) if len(sys.argv) > 2 else 756
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    frame = synthetic_bgra(w, h)
+    # Same bytes behind a ctypes buffer, the way capture_screenshot_png sees the DIB.
+    dib = ctypes.create_string_buffer(frame, len(frame))
+    view = imaging.dib_view(ctypes.addressof(dib), len(frame))
+
+    expected = imaging.bgra_to_rgb_loop(frame, w, h)
+    print(f"frame {w}x{h}, {len(frame)} bytes BGRA, {repeats} repeats")
+    base = None
+    for name, fn in imaging.ENGINES.items():
+        for label, src in (("bytes", frame), ("dib", view)):
+            if fn(src, w, h) != expected:
+                sys.exit(f"{name}/{label}: output mismatch")
+            best = min(timed(fn, src, w, h, 1 if name == "loop" else repeats))
+            if base is None:
+                base = best
+            print(
+                f"{name:>7} {label:>5}: {best * 1000.0:9.2f} ms"
+                f"  x{base / best:7.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# Run with: python bench_png_threads.py [width] [height] [level] [repeats]
+# Example: python bench_png_threads.py 1344 756 6 5
+
+# bench_png_threads.py
+from __future__ import annotations
+import os
+import sys
+import time
+import zlib
+
+import encoders
+import imaging
+from bench_bgra_to_rgb import synthetic_bgra
+
+
+def main() -> None:
+    w = int(sys.argv[1]) if len(sys.argv) > 1 else 1344
+    h = int(sys.argv[2]) if len(sys.argv) > 2 else 756
+    level = int(sys.argv[3]) if len(sys.argv) > 3 else 6
+    repeats = int(sys.argv[4]) if len(sys.argv) > 4 else 5
+
+    rgb = imaging.bgra_to_rgb(synthetic_bgra(w, h), w, h)
+    raw = encoders.filter_none(rgb, w * 3, h)
+    print(f"frame {w}x{h}, {len(raw)} raw bytes, level {level}, {os.cpu_count()} cpus")
+
+    base = None
+    for threads in (1, 2, 4, 8):
+        comp = encoders.compress_parallel(raw, level, threads, w * 3 + 1)
+        if zlib.decompress(comp) != raw:
+            sys.exit(f"threads={threads}: decoded scanlines differ")
+        samples = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            encoders.compress_parallel(raw, level, threads, w * 3 + 1)
+            samples.append(time.perf_counter() - t0)
+        best = min(samples)
+        if base is None:
+            base = best
+        print(
+            f"threads={threads}: {best * 1000.0:8.2f} ms  x{base / best:5.2f}"
+            f"  {len(comp)} bytes"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+# Run with: python bench_suite.py [--quick] [--only NAME] [--out results.json]
+#                                 [--baseline base.json] [--threshold 0.15]
+# Example: python bench_suite.py --out base.json
+#          python bench_suite.py --baseline base.json   (exit status 1 on regression)
+
+# bench_suite.py
+from __future__ import annotations
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import agent
+import encoders
+import history as history_mod
+import imaging
+import lmclient
+import payload as payload_mod
+
+RESOLUTIONS = [(1344, 756), (1920, 1080), (2560, 1440)]
+QUICK_RESOLUTIONS = [(1344, 756)]
+KINDS = ("flat", "text", "photo")
+STEPS = range(1, 16)
+QUICK_STEPS = (1, 5, 10, 15)
+
+# Per-sample floor: fast cases loop until one sample takes at least this long,
+# so timer resolution never dominates. Slow cases drop repeats (never below
+# MIN_REPEATS) to stay near CASE_BUDGET seconds each.
+MIN_SAMPLE = 0.005
+MIN_REPEATS = 3
+CASE_BUDGET = 1.0
+
+_frames: Dict[Tuple[str, int, int], bytes] = {}
+
+
+def _rows_to_frame(rows: List[bytes], h: int, rnd: random.Random) -> bytes:
+    # Rotating rows by a random pixel offset keeps a small row pool from
+    # compressing as one repeated line.
+    out = bytearray()
+    for _ in range(h):
+        row = rows[rnd.randrange(len(rows))]
+        shift = rnd.randrange(len(row) // 4) * 4
+        out += row[shift:] + row[:shift]
+    return bytes(out)
+
+
+def _flat(w: int, h: int, rnd: random.Random) -> bytes:
+    # Solid desktop, two window frames and a taskbar: long runs of one colour.
+    desk = bytes((160, 110, 40, 255)) * w
+    out = bytearray(desk * h)
+    windows = ((w // 10, h // 8, w // 2, h // 2), (w // 3, h // 3, w * 4 // 5, h * 4 // 5))
+    for x0, y0, x1, y1 in windows:
+        body = bytes((240, 240, 240, 255)) * (x1 - x0)
+        title = bytes((120, 70, 30, 255)) * (x1 - x0)
+        for y in range(y0, y1):
+            out[(y * w + x0) * 4 : (y * w + x1) * 4] = title if y < y0 + 30 else body
+    bar = bytes((48, 48, 48, 255)) * w
+    for y in range(h - 40, h):
+        out[y * w * 4 : (y + 1) * w * 4] = bar
+    return bytes(out)
+
+
+def _text(w: int, h: int, rnd: random.Random) -> bytes:
+    # Editor page: white lines with dark glyph runs, blank leading between.
+    white = bytes((255, 255, 255, 255))
+    ink = bytes((30, 30, 30, 255))
+    blank = white * w
+    glyph_rows = []
+    for _ in range(64):
+        row = bytearray()
+        x = rnd.randrange(8, 60)
+        row += white * x
+        while x < w:
+            run = min(w - x, rnd.randrange(1, 4))
+            gap = min(w - x - run, rnd.randrange(1, 9))
+            row += ink * run + white * gap
+            x += run + gap
+        glyph_rows.append(bytes(row[: w * 4]))
+    out = bytearray()
+    for y in range(h):
+        if y % 18 < 12:
+            out += glyph_rows[rnd.randrange(len(glyph_rows))]
+        else:
+            out += blank
+    return bytes(out)
+
+
+def _photo(w: int, h: int, rnd: random.Random) -> bytes:
+    # Wallpaper: smooth gradients with sensor-like noise on every channel.
+    rows = []
+    for k in range(64):
+        row = bytearray(w * 4)
+        for x in range(w):
+            base = (x * 255) // max(1, w - 1)
+            row[x * 4] = (base + k * 3 + rnd.randrange(24)) & 0xFF
+            row[x * 4 + 1] = (128 + (base >> 1) - k + rnd.randrange(24)) & 0xFF
+            row[x * 4 + 2] = (255 - base + rnd.randrange(24)) & 0xFF
+            row[x * 4 + 3] = 255
+        rows.append(bytes(row))
+    return _rows_to_frame(rows, h, rnd)
+
+
+GENERATORS: Dict[str, Callable[[int, int, random.Random], bytes]] = {
+    "flat": _flat,
+    "text": _text,
+    "photo": _photo,
+}
+
+
+def synthetic_frame(kind: str, w: int, h: int, seed: int = 0) -> bytes:
+    # BGRA, top-down, the layout a DIB section hands to bgra_to_rgb.
+    key = (kind, w, h)
+    if key not in _frames:
+        _frames[key] = GENERATORS[kind](w, h, random.Random(seed))
+    return _frames[key]
+
+
+def measure(
+    fn: Callable[[], Any],
+    repeats: int = 7,
+    setup: Optional[Callable[[], None]] = None,
+) -> Dict[str, Any]:
+    # With a setup, every sample is one call after an untimed setup;
+    # otherwise the loop count is calibrated up to MIN_SAMPLE.
+    loops = 1
+    if setup is not None:
+        setup()
+    t0 = time.perf_counter()
+    fn()
+    first = time.perf_counter() - t0
+    if first > 0:
+        repeats = max(MIN_REPEATS, min(repeats, int(CASE_BUDGET / first)))
+    if setup is None:
+        while True:
+            t0 = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            if time.perf_counter() - t0 >= MIN_SAMPLE or loops >= 1 << 16:
+                break
+            loops *= 4
+    samples = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - t0) * 1000.0 / loops)
+    return {
+        "median_ms": round(statistics.median(samples), 4),
+        "min_ms": round(min(samples), 4),
+        "repeats": repeats,
+        "loops": loops,
+    }
+
+
+def bench_bgra(resolutions: List[Tuple[int, int]], repeats: int) -> Dict[str, Any]:
+    out = {}
+    engine = imaging.get_engine()
+    for w, h in resolutions:
+        for kind in KINDS:
+            frame = synthetic_frame(kind, w, h)
+            row = measure(lambda: imaging.bgra_to_rgb(frame, w, h), repeats)
+            row["engine"] = engine
+            out[f"bgra_to_rgb/{kind}/{w}x{h}"] = row
+    return out
+
+
+def bench_encode(
+    resolutions: List[Tuple[int, int]], profiles: List[str], repeats: int
+) -> Dict[str, Any]:
+    # The "default" profile is what encode_rgb_to_png does on every capture.
+    out = {}
+    for w, h in resolutions:
+        for kind in KINDS:
+            rgb = imaging.bgra_to_rgb(synthetic_frame(kind, w, h), w, h)
+            for profile in profiles:
+                enc = encoders.FrameEncoder(profile)
+                row = measure(lambda: enc.encode(rgb, w, h), repeats)
+                row["bytes"] = len(enc.encode(rgb, w, h))
+                out[f"encode_png[{profile}]/{kind}/{w}x{h}"] = row
+    return out
+
+
+def screenshot_png(w: int = 1344, h: int = 756) -> bytes:
+    return encoders.encode_png(imaging.bgra_to_rgb(synthetic_frame("text", w, h), w, h), w, h)
+
+
+def step_messages(step: int, png: bytes) -> List[Dict[str, Any]]:
+    # One agent step as run_agent appends it: the assistant's tool call, the
+    # tool result and the screenshot that follows it.
+    call_id = f"call_{step}"
+    return [
+        {
+            "role": "assistant",
+            "content": "",
+            "tool_calls": [
+                {
+                    "id": call_id,
+                    "type": "function",
+                    "function": {"name": "take_screenshot", "arguments": "{}"},
+                }
+            ],
+        },
+        {
+            "role": "tool",
+            "tool_call_id": call_id,
+            "name": "take_screenshot",
+            "content": "Screenshot captured.",
+        },
+        agent.image_message("Screen after step:", png),
+    ]
+
+
+def histories(max_steps: int, png: bytes) -> List[List[Dict[str, Any]]]:
+    # Request messages for steps 1..max_steps of one run, sharing message
+    # objects between steps the way the live History does.
+    h = history_mod.History(
+        [
+            {"role": "system", "content": "You control a Windows desktop. " * 20},
+            {"role": "user", "content": "Open Notepad and type a short note."},
+        ]
+    )
+    out = []
+    for step in range(1, max_steps + 1):
+        for msg in step_messages(step, png):
+            h.append(msg)
+        out.append(list(h.for_request()))
+    return out
+
+
+def request(messages: List[Dict[str, Any]], tools: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "model": "bench",
+        "messages": messages,
+        "tools": tools,
+        "tool_choice": "auto",
+        "temperature": 0.0,
+        "max_tokens": 512,
+    }
+
+
+def load_tools() -> List[Dict[str, Any]]:
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data[0]["tools"] if isinstance(data, list) else data["tools"]
+    except (OSError, KeyError, IndexError, ValueError):
+        return []
+
+
+def bench_history(steps: List[int], repeats: int) -> Dict[str, Any]:
+    out = {}
+    png = screenshot_png()
+    for n in steps:
+        # Every screenshot still in place: the input prune sees when the
+        # policy is "prune".
+        messages = [{"role": "system", "content": "sys"}, {"role": "user", "content": "task"}]
+        for step in range(1, n + 1):
+            messages.extend(step_messages(step, png))
+        row = measure(lambda: agent.prune_old_screenshots(messages), repeats)
+        row["messages"] = len(messages)
+        out[f"prune_old_screenshots/step{n:02d}"] = row
+    return out
+
+
+def bench_payload(steps: List[int], repeats: int) -> Dict[str, Any]:
+    out = {}
+    tools = load_tools()
+    reqs = [request(m, tools) for m in histories(max(steps), screenshot_png())]
+    for n in steps:
+        cur = reqs[n - 1]
+        prev = reqs[n - 2] if n > 1 else None
+        row = measure(lambda: lmclient.dumps_compact(cur), repeats)
+        row["bytes"] = len(lmclient.dumps_compact(cur))
+        out[f"payload/dumps/step{n:02d}"] = row
+
+        cold = payload_mod.PayloadBuilder()
+        out[f"payload/builder_cold/step{n:02d}"] = measure(
+            lambda: cold.build(cur), repeats * 3, setup=lambda: cold.__init__()
+        )
+
+        # Steady state: the builder already holds the previous step's body.
+        warm = payload_mod.PayloadBuilder()
+
+        def prime() -> None:
+            warm.__init__()
+            if prev is not None:
+                warm.build(prev)
+
+        row = measure(lambda: warm.build(cur), repeats * 3, setup=prime)
+        row["reused_bytes"] = warm.last_stats["reused_bytes"]
+        out[f"payload/builder_warm/step{n:02d}"] = row
+    return out
+
+
+SUITES = ("bgra_to_rgb", "encode_png", "prune_old_screenshots", "payload")
+
+
+def run(quick: bool = False, only: Optional[str] = None) -> Dict[str, Any]:
+    resolutions = QUICK_RESOLUTIONS if quick else RESOLUTIONS
+    steps = list(QUICK_STEPS if quick else STEPS)
+    repeats = 3 if quick else 7
+    profiles = ["default"] if quick else list(encoders.PROFILES)
+    results: Dict[str, Any] = {}
+    for suite in SUITES:
+        if only and only != suite:
+            continue
+        t0 = time.perf_counter()
+        if suite == "bgra_to_rgb":
+            results.update(bench_bgra(resolutions, repeats))
+        elif suite == "encode_png":
+            results.update(bench_encode(resolutions, profiles, repeats))
+        elif suite == "prune_old_screenshots":
+            results.update(bench_history(steps, repeats))
+        else:
+            results.update(bench_payload(steps, repeats))
+        print(f"[bench] {suite}: {time.perf_counter() - t0:.1f} s", file=sys.stderr)
+    return {"meta": meta(quick), "results": results}
+
+
+def meta(quick: bool) -> Dict[str, Any]:
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "numpy": encoders.np.__version__ if encoders.np is not None else None,
+        "bgra_engine": imaging.get_engine(),
+        "quick": quick,
+    }
+
+
+def compare(
+    results: Dict[str, Any], baseline: Dict[str, Any], threshold: float
+) -> List[Dict[str, Any]]:
+    # A case regresses when its best time, or its output size where one is
+    # recorded, grows by more than threshold over the baseline. The minimum is
+    # compared rather than the median: noise from other processes only ever
+    # adds time.
+    rows = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if base is None:
+            rows.append({"case": name, "status": "new"})
+            continue
+        ratio = cur["min_ms"] / base["min_ms"] if base["min_ms"] else 1.0
+        row = {"case": name, "ratio": round(ratio, 3), "status": "ok"}
+        if ratio > 1.0 + threshold:
+            row["status"] = "slower"
+        elif ratio < 1.0 / (1.0 + threshold):
+            row["status"] = "faster"
+        if "bytes" in cur and base.get("bytes"):
+            size = cur["bytes"] / base["bytes"]
+            row["size_ratio"] = round(size, 3)
+            if size > 1.0 + threshold:
+                row["status"] = "larger"
+        rows.append(row)
+    return rows
+
+
+def format_results(results: Dict[str, Any], diff: Optional[List[Dict[str, Any]]]) -> str:
+    by_case = {r["case"]: r for r in diff or []}
+    head = f"{'case':<44}{'median_ms':>12}{'min_ms':>12}{'bytes':>12}"
+    lines = [head + ("     vs base" if diff else "")]
+    for name, row in results.items():
+        line = f"{name:<44}{row['median_ms']:>12.3f}{row['min_ms']:>12.3f}"
+        line += f"{row.get('bytes', ''):>12}"
+        d = by_case.get(name)
+        if d is not None:
+            line += f"  x{d['ratio']:<6} {d['status']}" if "ratio" in d else f"  {d['status']}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    opts: Dict[str, Any] = {
+        "quick": False,
+        "only": None,
+        "out": None,
+        "baseline": None,
+        "threshold": 0.15,
+    }
+    i = 0
+    while i < len(args):
+        a = args[i]
+        if a == "--quick":
+            opts["quick"] = True
+        elif a in ("--only", "--out", "--baseline", "--threshold") and i + 1 < len(args):
+            opts[a[2:]] = args[i + 1]
+            i += 1
+        else:
+            sys.exit(f"unknown argument: {a}")
+        i += 1
+    if opts["only"] and opts["only"] not in SUITES:
+        sys.exit(f"--only takes one of: {', '.join(SUITES)}")
+
+    report = run(opts["quick"], opts["only"])
+    diff = None
+    if opts["baseline"]:
+        with open(opts["baseline"], "r", encoding="utf-8") as f:
+            base = json.load(f)
+        diff = compare(report["results"], base["results"], float(opts["threshold"]))
+        report["baseline"] = {"path": opts["baseline"], "meta": base.get("meta"), "cases": diff}
+    print(format_results(report["results"], diff))
+    if opts["out"]:
+        with open(opts["out"], "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if diff is not None:
+        bad = [d["case"] for d in diff if d["status"] in ("slower", "larger")]
+        if bad:
+            print(f"[bench] {len(bad)} regression(s): {', '.join(bad)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# budget.py
+from __future__ import annotations
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+import history as history_mod
+
+POLICIES = ("images", "tool_results", "assistant_text", "turns")
+
+TOOL_SUMMARY_CHARS = 80
+TURNS_NOTE = "{} earlier steps omitted to stay within the context budget."
+
+
+def summarize_tool_result(content: str) -> str:
+    # First sentence, capped; enough to remember what a call did.
+    text = content.strip()
+    cut = text.find(". ")
+    if 0 <= cut < TOOL_SUMMARY_CHARS:
+        return text[: cut + 1]
+    return text if len(text) <= TOOL_SUMMARY_CHARS else text[: TOOL_SUMMARY_CHARS - 3] + "..."
+
+
+def omitted_turns(messages: List[Dict[str, Any]]) -> int:
+    # Steps the turns policy dropped, read back from its note (right after
+    # the task), for anything that numbers turns by counting assistant messages.
+    suffix = TURNS_NOTE.split("{}", 1)[1]
+    for msg in messages[:4]:
+        content = msg.get("content")
+        if msg.get("role") == "user" and isinstance(content, str) and content.endswith(suffix):
+            head = content[: -len(suffix)]
+            if head.isdigit():
+                return int(head)
+    return 0
+
+
+class ContextBudget:
+    # Keeps each request's prompt under budget tokens (context_length less
+    # the completion reserve by default). The estimate is History's per-
+    # message count (vision-planned tokens per image, ~4 characters per text
+    # token) plus an overhead learned from each response's usage.prompt_tokens,
+    # which covers the tool schemas and the chat template. When a request
+    # would go over, policies run in order on everything but the system
+    # prompt, the task and the newest keep_turns turns, until the estimate
+    # is back under low_water * budget. Compacting well below the limit
+    # means the prompt prefix (and the server's cache of it) changes once
+    # every few steps rather than at every step from then on.
+    def __init__(
+        self,
+        history: history_mod.History,
+        context_length: int = 0,
+        reserve: int = 0,
+        budget: int = 0,
+        low_water: float = 0.6,
+        policies: Optional[List[str]] = None,
+        keep_turns: int = 2,
+        overhead: int = 0,
+        log: bool = True,
+    ) -> None:
+        policies = list(POLICIES if policies is None else policies)
+        for p in policies:
+            if p not in POLICIES:
+                raise ValueError(f"unknown context policy: {p}")
+        self.history = history
+        self.context_length = context_length
+        self.budget = budget or max(0, context_length - reserve)
+        self.low_water = min(1.0, max(0.1, low_water))
+        self.policies = policies
+        self.keep_turns = max(1, keep_turns)
+        self.overhead = overhead
+        self.log = log
+        self.steps: List[Dict[str, Any]] = []
+        self.compactions = 0
+        # Tokens the current prompt no longer carries; every later request
+        # is that much shorter to prefill.
+        self.removed = 0
+        self.saved = 0
+        self._sent = 0
+        self._applied: Dict[str, int] = {}
+        self._note: Optional[Dict[str, Any]] = None
+        self._omitted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    def _tokens(self, msg: Dict[str, Any]) -> int:
+        return history_mod.estimate_tokens(msg, self.history.image_tokens)
+
+    def estimate(self) -> int:
+        return self.overhead + sum(self._tokens(m) for m in self.history.messages)
+
+    def _protected(self) -> int:
+        # Index of the first message compaction may not touch.
+        msgs = self.history.messages
+        turns = [i for i, m in enumerate(msgs) if m.get("role") == "assistant"]
+        if len(turns) < self.keep_turns:
+            return 2
+        return max(2, turns[-self.keep_turns])
+
+    def _images(self) -> None:
+        msgs = self.history.messages
+        for i in self.history.surplus_images():
+            msgs[i] = {"role": "user", "content": history_mod.IMAGE_STUB}
+
+    def _tool_results(self) -> None:
+        msgs = self.history.messages
+        for i in range(2, self._protected()):
+            m = msgs[i]
+            if m.get("role") == "tool" and isinstance(m.get("content"), str):
+                short = summarize_tool_result(m["content"])
+                if short != m["content"]:
+                    msgs[i] = dict(m, content=short)
+
+    def _assistant_text(self) -> None:
+        msgs = self.history.messages
+        for i in range(2, self._protected()):
+            m = msgs[i]
+            if m.get("role") == "assistant" and m.get("tool_calls") and m.get("content"):
+                msgs[i] = dict(m, content="")
+
+    def _turns(self) -> None:
+        # Whole steps go, each assistant message with the tool results and
+        # screens after it, so every tool result still follows its call.
+        msgs = self.history.messages
+        end = self._protected()
+        start = 3 if len(msgs) > 2 and msgs[2] is self._note else 2
+        dropped = sum(1 for m in msgs[start:end] if m.get("role") == "assistant")
+        if not dropped:
+            return
+        self._omitted += dropped
+        self._note = {"role": "user", "content": TURNS_NOTE.format(self._omitted)}
+        self.history.messages = msgs[:2] + [self._note] + msgs[end:]
+
+    def fit(self, step: int) -> List[Dict[str, Any]]:
+        # The messages for this step's request, compacted first if needed.
+        messages = self.history.for_request()
+        before = self.estimate()
+        self._applied = {}
+        if self.enabled and before > self.budget:
+            target = int(self.budget * self.low_water)
+            est = before
+            for policy in self.policies:
+                getattr(self, "_" + policy)()
+                now = self.estimate()
+                if now < est:
+                    self._applied[policy] = est - now
+                    est = now
+                if est <= target:
+                    break
+            if self._applied:
+                self.compactions += 1
+                self.removed += before - est
+            messages = self.history.messages
+        self._sent = self.estimate()
+        self.saved += self.removed
+        return messages
+
+    def observe(self, step: int, usage: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        usage = usage or {}
+        prompt = usage.get("prompt_tokens")
+        if prompt:
+            # Moves halfway toward what this response says the estimate missed.
+            self.overhead += (prompt - self._sent) // 2
+        entry = {
+            "step": step,
+            "prompt_tokens": prompt,
+            "completion_tokens": usage.get("completion_tokens"),
+            "estimate": self._sent,
+            "budget": self.budget,
+            "images": len(self.history.live_images()),
+            "image_tokens": len(self.history.live_images()) * self.history.image_tokens,
+            "saved_tokens": self.removed,
+        }
+        if self._applied:
+            entry["compacted"] = self._applied
+        self.steps.append(entry)
+        if self.log:
+            print(f"[budget] {json.dumps(entry)}", file=sys.stderr)
+        return entry
+
+    def summary(self) -> Dict[str, Any]:
+        prompts = [s["prompt_tokens"] for s in self.steps if s["prompt_tokens"]]
+        return {
+            "budget": self.budget,
+            "compactions": self.compactions,
+            "peak_prompt_tokens": max(prompts) if prompts else None,
+            "last_prompt_tokens": prompts[-1] if prompts else None,
+            "saved_prefill_tokens": self.saved,
+        }
+
+
+def from_cfg(
+    cfg: Dict[str, Any], history: history_mod.History, tools_schema: List[Dict[str, Any]]
+) -> ContextBudget:
+    return ContextBudget(
+        history,
+        context_length=cfg.get("context_length", 0) or 0,
+        reserve=cfg.get("max_tokens", 0),
+        budget=cfg.get("context_budget", 0) or 0,
+        low_water=cfg.get("context_low_water", 0.6),
+        policies=cfg.get("context_policies"),
+        keep_turns=cfg.get("context_keep_turns", 2),
+        overhead=len(json.dumps(tools_schema)) // 4,
+        log=cfg.get("log_budget", True),
+    )
@@ -8,6 +8,26 @@ files_to_combine = [
     "agent.py",
     "main.py",
     "winapi.py",
+    "backends.py",
+    "virtual_desktop.py",
+    "imaging.py",
+    "sendinput.py",
+    "actions.py",
+    "encoders.py",
+    "framediff.py",
+    "lmclient.py",
+    "streaming.py",
+    "history.py",
+    "payload.py",
+    "dumpwriter.py",
+    "settle.py",
+    "vision.py",
+    "tracing.py",
+    "archive.py",
+    "lmstub.py",
+    "lmlog.py",
+    "cursor.py",
+    "budget.py",
     "scenarios.json",
     # Add more files here as needed
 ]
@@ -0,0 +1,209 @@
+# cursor.py
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Arrow used when the real cursor shape cannot be read (and by the virtual
+# desktop): X is outline, o is fill, anything else transparent.
+ARROW_ROWS = (
+    "X...........",
+    "XX..........",
+    "XoX.........",
+    "XooX........",
+    "XoooX.......",
+    "XooooX......",
+    "XoooooX.....",
+    "XooooooX....",
+    "XoooooooX...",
+    "XooooooooX..",
+    "XoooooooooX.",
+    "XooooooXXXXX",
+    "XoooXooX....",
+    "XooXXooX....",
+    "XoX..XooX...",
+    "XX...XooX...",
+    "X.....XooX..",
+    "......XooX..",
+    ".......XX...",
+)
+
+
+class Sprite:
+    # Straight (not premultiplied) RGBA rows, with the hotspot in sprite pixels.
+    __slots__ = ("w", "h", "rgba", "hot_x", "hot_y")
+
+    def __init__(self, w: int, h: int, rgba: bytes, hot_x: int = 0, hot_y: int = 0) -> None:
+        if len(rgba) != w * h * 4:
+            raise ValueError(f"sprite data is {len(rgba)} bytes, expected {w * h * 4}")
+        self.w = w
+        self.h = h
+        self.rgba = bytes(rgba)
+        self.hot_x = hot_x
+        self.hot_y = hot_y
+
+
+def sprite_from_rows(
+    rows: Tuple[str, ...],
+    colors: Optional[Dict[str, Tuple[int, int, int]]] = None,
+    hot_x: int = 0,
+    hot_y: int = 0,
+) -> Sprite:
+    colors = colors or {"X": (0, 0, 0), "o": (255, 255, 255)}
+    w = max(len(r) for r in rows)
+    out = bytearray(w * len(rows) * 4)
+    for y, row in enumerate(rows):
+        for x, ch in enumerate(row):
+            if ch in colors:
+                out[(y * w + x) * 4 : (y * w + x + 1) * 4] = bytes(colors[ch]) + b"\xff"
+    return Sprite(w, len(rows), bytes(out), hot_x, hot_y)
+
+
+ARROW = sprite_from_rows(ARROW_ROWS)
+
+
+def scale_sprite(sprite: Sprite, sx: float, sy: float) -> Sprite:
+    # Nearest neighbour; a cursor is a few hundred pixels, done once per cache miss.
+    w = max(1, int(round(sprite.w * sx)))
+    h = max(1, int(round(sprite.h * sy)))
+    if (w, h) == (sprite.w, sprite.h):
+        return sprite
+    src = sprite.rgba
+    out = bytearray(w * h * 4)
+    cols = [min(sprite.w - 1, int(x * sprite.w / w)) * 4 for x in range(w)]
+    for y in range(h):
+        base = min(sprite.h - 1, int(y * sprite.h / h)) * sprite.w * 4
+        row = y * w * 4
+        for x, c in enumerate(cols):
+            out[row + x * 4 : row + x * 4 + 4] = src[base + c : base + c + 4]
+    hot_x = int(round(sprite.hot_x * w / sprite.w))
+    hot_y = int(round(sprite.hot_y * h / sprite.h))
+    return Sprite(w, h, bytes(out), hot_x, hot_y)
+
+
+class Prepared:
+    # A sprite split for compositing: runs of opaque pixels become RGB byte
+    # strings copied with one slice assignment, and only the few partially
+    # transparent (antialiased edge) pixels are blended one by one.
+    __slots__ = ("w", "h", "hot_x", "hot_y", "runs", "blends")
+
+    def __init__(self, sprite: Sprite) -> None:
+        self.w, self.h = sprite.w, sprite.h
+        self.hot_x, self.hot_y = sprite.hot_x, sprite.hot_y
+        self.runs: List[Tuple[int, int, bytes]] = []
+        self.blends: List[Tuple[int, int, int, int, int, int]] = []
+        px = sprite.rgba
+        for y in range(sprite.h):
+            run_x, run = -1, bytearray()
+            for x in range(sprite.w + 1):
+                a = px[(y * sprite.w + x) * 4 + 3] if x < sprite.w else 0
+                if a == 255:
+                    if run_x < 0:
+                        run_x = x
+                    i = (y * sprite.w + x) * 4
+                    run += px[i : i + 3]
+                    continue
+                if run_x >= 0:
+                    self.runs.append((y, run_x, bytes(run)))
+                    run_x, run = -1, bytearray()
+                if a:
+                    i = (y * sprite.w + x) * 4
+                    self.blends.append((y, x, px[i], px[i + 1], px[i + 2], a))
+
+
+def composite(fb: bytearray, fw: int, fh: int, sprite: Prepared, left: int, top: int) -> None:
+    # Draws sprite into the RGB frame fb with its top-left at (left, top),
+    # clipped to the frame.
+    for y, x, rgb in sprite.runs:
+        fy = top + y
+        if not 0 <= fy < fh:
+            continue
+        x0, x1 = left + x, left + x + len(rgb) // 3
+        c0, c1 = max(0, x0), min(fw, x1)
+        if c0 >= c1:
+            continue
+        off = (fy * fw + c0) * 3
+        fb[off : off + (c1 - c0) * 3] = rgb[(c0 - x0) * 3 : (c1 - x0) * 3]
+    for y, x, r, g, b, a in sprite.blends:
+        fx, fy = left + x, top + y
+        if 0 <= fx < fw and 0 <= fy < fh:
+            off = (fy * fw + fx) * 3
+            na = 255 - a
+            fb[off] = (r * a + fb[off] * na + 127) // 255
+            fb[off + 1] = (g * a + fb[off + 1] * na + 127) // 255
+            fb[off + 2] = (b * a + fb[off + 2] * na + 127) // 255
+
+
+class CursorOverlay:
+    # Composites the mouse cursor into captured frames. Sprites come from
+    # loader(handle) once per handle and are cached pre-scaled per frame
+    # scale, so drawing a frame costs only the copy into the buffer. A handle
+    # the loader cannot read (or no handle, for a showing pointer that has
+    # none) gets the fallback arrow; whether to draw at all is the caller's
+    # call. The sprite is never scaled below min_scale, which keeps it
+    # findable in small frames.
+    def __init__(
+        self,
+        loader: Optional[Callable[[Any], Optional[Sprite]]] = None,
+        fallback: Sprite = ARROW,
+        min_scale: float = 0.5,
+        max_entries: int = 32,
+    ) -> None:
+        self.loader = loader
+        self.fallback = fallback
+        self.min_scale = min_scale
+        self.max_entries = max(1, max_entries)
+        self._sprites: Dict[Any, Sprite] = {}
+        self._cache: "OrderedDict[Tuple[Any, float, float], Prepared]" = OrderedDict()
+        # Capture and settle polls can draw from different threads.
+        self._lock = threading.Lock()
+        self.stats = {"drawn": 0, "hits": 0, "misses": 0, "load_failures": 0}
+
+    def sprite(self, handle: Any) -> Sprite:
+        if handle not in self._sprites:
+            sprite = None
+            if self.loader is not None and handle:
+                sprite = self.loader(handle)
+                if sprite is None:
+                    self.stats["load_failures"] += 1
+            self._sprites[handle] = sprite or self.fallback
+        return self._sprites[handle]
+
+    def prepared(self, handle: Any, sx: float, sy: float) -> Prepared:
+        key = (handle, round(max(sx, self.min_scale), 4), round(max(sy, self.min_scale), 4))
+        with self._lock:
+            prep = self._cache.get(key)
+            if prep is not None:
+                self.stats["hits"] += 1
+                self._cache.move_to_end(key)
+                return prep
+            self.stats["misses"] += 1
+            prep = Prepared(scale_sprite(self.sprite(handle), key[1], key[2]))
+            self._cache[key] = prep
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            return prep
+
+    def draw(
+        self,
+        fb: bytearray,
+        fw: int,
+        fh: int,
+        handle: Any,
+        x: float,
+        y: float,
+        sx: float = 1.0,
+        sy: float = 1.0,
+    ) -> None:
+        # (x, y) is the pointer position in frame pixels; sx, sy the
+        # frame-to-screen scale the sprite is shrunk (or grown) by.
+        prep = self.prepared(handle, sx, sy)
+        composite(fb, fw, fh, prep, int(round(x)) - prep.hot_x, int(round(y)) - prep.hot_y)
+        self.stats["drawn"] += 1
+
+    def forget(self, handle: Any) -> None:
+        # For a handle that may now hold a different shape.
+        with self._lock:
+            self._sprites.pop(handle, None)
+            for key in [k for k in self._cache if k[0] == handle]:
+                del self._cache[key]
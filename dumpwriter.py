@@ -0,0 +1,195 @@
+# dumpwriter.py
+from __future__ import annotations
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import encoders
+
+RETENTION = ("all", "count", "bytes", "failed")
+
+
+def ppm_bytes(rgb: bytes, w: int, h: int) -> bytes:
+    # Binary PPM: a text header in front of the untouched RGB rows, so the
+    # frame costs nothing to dump and still opens in ordinary image viewers.
+    return b"P6\n%d %d\n255\n" % (w, h) + rgb
+
+
+class DumpWriter:
+    # Writes screenshot dumps on a background thread so disk I/O overlaps the
+    # next model request. The queue is bounded: when the disk falls behind,
+    # submit() blocks (and counts the stall) rather than buffering frames
+    # without limit.
+    def __init__(
+        self,
+        dump_dir: str,
+        prefix: str = "screen_",
+        start: int = 1,
+        fmt: str = "png",
+        retention: str = "all",
+        keep: int = 50,
+        max_bytes: int = 0,
+        queue_size: int = 8,
+        threaded: bool = True,
+    ) -> None:
+        if retention not in RETENTION:
+            raise ValueError(f"unknown dump retention: {retention}")
+        if fmt not in ("png", "raw", "none") and fmt not in encoders.PROFILES:
+            raise ValueError(f"unknown dump format: {fmt}")
+        self.dump_dir = dump_dir
+        self.prefix = prefix
+        self.idx = start
+        self.fmt = fmt
+        self.retention = retention
+        self.keep = max(1, keep)
+        self.max_bytes = max_bytes
+        # A profile name re-encodes the dump separately from the model's copy.
+        self._encoder = encoders.FrameEncoder(fmt) if fmt in encoders.PROFILES else None
+        self._files: List[Tuple[str, int]] = []
+        self._failed: set = set()
+        self._total = 0
+        self.stats = {
+            "written": 0,
+            "bytes": 0,
+            "deleted": 0,
+            "errors": 0,
+            "write_ms": 0.0,
+            "stall_ms": 0.0,
+            "queue_peak": 0,
+        }
+        # Called from the writer thread with (write_ms, bytes) per frame.
+        self.on_write: Optional[Callable[[float, int], None]] = None
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        if fmt != "none":
+            os.makedirs(dump_dir, exist_ok=True)
+        if threaded and fmt != "none":
+            self._queue = queue.Queue(maxsize=max(1, queue_size))
+            self._thread = threading.Thread(target=self._run, name="dumpwriter", daemon=True)
+            self._thread.start()
+
+    def _put(self, item: Tuple[Any, ...]) -> None:
+        if self._queue is None:
+            self._handle(item)
+            return
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            t0 = time.perf_counter()
+            self._queue.put(item)
+            self.stats["stall_ms"] += (time.perf_counter() - t0) * 1000.0
+        self.stats["queue_peak"] = max(self.stats["queue_peak"], self._queue.qsize())
+
+    def submit(self, png: bytes, rgb: bytes, w: int, h: int) -> Optional[str]:
+        # Returns the path the frame will land at.
+        if self.fmt == "none":
+            return None
+        ext = "ppm" if self.fmt == "raw" else "png"
+        path = os.path.join(self.dump_dir, f"{self.prefix}{self.idx:04d}.{ext}")
+        self.idx += 1
+        self._put(("write", path, png, rgb, w, h))
+        return path
+
+    def mark_failed(self) -> None:
+        # The newest frame is what the model acted on when the step failed.
+        if self.fmt != "none":
+            self._put(("failed",))
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item[0] == "stop":
+                    return
+                self._handle(item)
+            finally:
+                self._queue.task_done()
+
+    def _handle(self, item: Tuple[Any, ...]) -> None:
+        if item[0] == "failed":
+            if self._files:
+                self._failed.add(self._files[-1][0])
+            return
+        _, path, png, rgb, w, h = item
+        t0 = time.perf_counter()
+        if self.fmt == "raw":
+            data = ppm_bytes(rgb, w, h)
+        elif self._encoder is not None:
+            data = self._encoder.encode(rgb, w, h)
+        else:
+            data = png
+        try:
+            with open(path, "wb") as f:
+                f.write(data)
+        except OSError as e:
+            self.stats["errors"] += 1
+            print(f"[dump] error: {e}", file=sys.stderr)
+            return
+        ms = (time.perf_counter() - t0) * 1000.0
+        if self.on_write is not None:
+            self.on_write(ms, len(data))
+        self.stats["write_ms"] += ms
+        self.stats["written"] += 1
+        self.stats["bytes"] += len(data)
+        self._files.append((path, len(data)))
+        self._total += len(data)
+        self._retain()
+
+    def _retain(self) -> None:
+        files = self._files
+        if self.retention == "count":
+            drop = files[: max(0, len(files) - self.keep)]
+        elif self.retention == "bytes" and self.max_bytes > 0:
+            drop = []
+            total = self._total
+            for path, size in files[:-1]:
+                if total <= self.max_bytes:
+                    break
+                drop.append((path, size))
+                total -= size
+        elif self.retention == "failed":
+            # Hold the newest frame until the next one shows its step passed.
+            drop = [f for f in files[:-1] if f[0] not in self._failed]
+        else:
+            return
+        for path, size in drop:
+            self._delete(path, size)
+
+    def _delete(self, path: str, size: int) -> None:
+        self._files.remove((path, size))
+        self._total -= size
+        try:
+            os.remove(path)
+            self.stats["deleted"] += 1
+        except OSError:
+            pass
+
+    def close(self) -> Dict[str, Any]:
+        if self._thread is not None:
+            self._queue.put(("stop",))
+            self._thread.join()
+            self._thread = None
+        if self.retention == "failed":
+            for path, size in list(self._files):
+                if path not in self._failed:
+                    self._delete(path, size)
+        self.stats["write_ms"] = round(self.stats["write_ms"], 2)
+        self.stats["stall_ms"] = round(self.stats["stall_ms"], 2)
+        return dict(self.stats, kept=len(self._files), kept_bytes=self._total)
+
+
+def from_cfg(cfg: Dict[str, Any]) -> DumpWriter:
+    return DumpWriter(
+        cfg["dump_dir"],
+        cfg["dump_prefix"],
+        cfg["dump_start"],
+        fmt=cfg.get("dump_format", "png"),
+        retention=cfg.get("dump_retention", "all"),
+        keep=cfg.get("dump_keep", 50),
+        max_bytes=cfg.get("dump_max_bytes", 0),
+        queue_size=cfg.get("dump_queue", 8),
+        threaded=cfg.get("dump_async", True),
+    )
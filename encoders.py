@@ -0,0 +1,284 @@
+# encoders.py
+from __future__ import annotations
+import time
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PNG_SIG = b"\x89PNG\r\n\x1a\n"
+
+COLOR_RGB = 2
+COLOR_PALETTE = 3
+
+FILTER_NONE = 0
+FILTER_SUB = 1
+FILTER_UP = 2
+FILTER_PAETH = 4
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {"filter": "none", "level": 6, "palette": False, "threads": 1},
+    "fast": {"filter": "none", "level": 1, "palette": False, "threads": 1},
+    "small": {"filter": "adaptive", "level": 9, "palette": False, "threads": 1},
+    "palette": {"filter": "none", "level": 9, "palette": True, "threads": 1},
+}
+
+WINDOW = 32768
+MIN_STRIP = 64 * 1024
+
+_pools: Dict[int, ThreadPoolExecutor] = {}
+
+
+def png_chunk(t: bytes, d: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(d))
+        + t
+        + d
+        + struct.pack(">I", zlib.crc32(d, zlib.crc32(t)) & 0xFFFFFFFF)
+    )
+
+
+def assemble_png(
+    idat: bytes, w: int, h: int, color_type: int = COLOR_RGB, plte: bytes = b""
+) -> bytes:
+    ihdr = struct.pack(">IIBBBBB", w, h, 8, color_type, 0, 0, 0)
+    parts = [PNG_SIG, png_chunk(b"IHDR", ihdr)]
+    if plte:
+        parts.append(png_chunk(b"PLTE", plte))
+    parts.append(png_chunk(b"IDAT", idat))
+    parts.append(png_chunk(b"IEND", b""))
+    return b"".join(parts)
+
+
+def _rows(pixels: Any, row: int, h: int) -> List[memoryview]:
+    mv = memoryview(pixels)
+    return [mv[y * row : (y + 1) * row] for y in range(h)]
+
+
+def filter_none(pixels: Any, row: int, h: int) -> bytes:
+    return b"\x00" + b"\x00".join(_rows(pixels, row, h))
+
+
+# Byte-wise (x - y) mod 256 over whole buffers, done as SWAR arithmetic on
+# Python big ints so the pure-Python Sub/Up filters stay out of per-pixel loops.
+def _sub_bytes(x: bytes, y: bytes) -> bytes:
+    n = len(x)
+    m = (1 << (8 * n)) - 1
+    hi = int.from_bytes(b"\x80" * n, "big")
+    lo = m ^ hi
+    xi = int.from_bytes(x, "big")
+    yi = int.from_bytes(y, "big")
+    return ((((xi | hi) - (yi & lo)) ^ ((xi ^ (yi ^ m)) & hi)) & m).to_bytes(n, "big")
+
+
+def _left_of(pixels: bytes, row: int, bpp: int) -> bytes:
+    left = bytearray(bytes(bpp) + pixels[:-bpp])
+    for k in range(bpp):
+        left[k::row] = bytes(len(left[k::row]))
+    return bytes(left)
+
+
+def _filter_adaptive_py(pixels: bytes, row: int, h: int, bpp: int) -> bytes:
+    # Without NumPy there is no cheap per-row cost sum, so pick between
+    # None/Sub/Up by which leaves the most zero bytes in the row.
+    pixels = bytes(pixels)
+    sub = _sub_bytes(pixels, _left_of(pixels, row, bpp))
+    up = _sub_bytes(pixels, bytes(row) + pixels[:-row])
+    out = []
+    for y in range(h):
+        a, b = y * row, (y + 1) * row
+        best = (pixels.count(0, a, b), FILTER_NONE, pixels)
+        for ftype, data in ((FILTER_SUB, sub), (FILTER_UP, up)):
+            zeros = data.count(0, a, b)
+            if zeros > best[0]:
+                best = (zeros, ftype, data)
+        out.append(bytes((best[1],)))
+        out.append(best[2][a:b])
+    return b"".join(out)
+
+
+def _filter_adaptive_np(pixels: Any, row: int, h: int, bpp: int) -> bytes:
+    x = np.frombuffer(pixels, dtype=np.uint8, count=row * h).reshape(h, row)
+    a = np.zeros_like(x)
+    a[:, bpp:] = x[:, :-bpp]
+    b = np.zeros_like(x)
+    b[1:] = x[:-1]
+    c = np.zeros_like(x)
+    c[1:, bpp:] = x[:-1, :-bpp]
+
+    ai = a.astype(np.int16)
+    bi = b.astype(np.int16)
+    ci = c.astype(np.int16)
+    pa = np.abs(bi - ci)
+    pb = np.abs(ai - ci)
+    pc = np.abs(ai + bi - 2 * ci)
+    pred = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+
+    candidates = np.stack([x, x - a, x - b, x - pred])
+    ftypes = np.array([FILTER_NONE, FILTER_SUB, FILTER_UP, FILTER_PAETH], dtype=np.uint8)
+    # Standard heuristic: minimum sum of absolute differences, bytes read as signed.
+    cost = np.abs(candidates.view(np.int8).astype(np.int32)).sum(axis=2)
+    choice = cost.argmin(axis=0)
+    out = np.empty((h, row + 1), dtype=np.uint8)
+    out[:, 0] = ftypes[choice]
+    out[:, 1:] = candidates[choice, np.arange(h)]
+    return out.tobytes()
+
+
+def filter_adaptive(pixels: Any, row: int, h: int, bpp: int = 3) -> bytes:
+    if np is not None:
+        return _filter_adaptive_np(pixels, row, h, bpp)
+    return _filter_adaptive_py(pixels, row, h, bpp)
+
+
+def _deflate_strip(
+    data: memoryview, start: int, end: int, level: int, last: bool
+) -> bytes:
+    # Priming with the previous 32 KiB keeps back-references across the strip
+    # boundary, so the split costs almost nothing in ratio.
+    zdict = bytes(data[max(0, start - WINDOW) : start])
+    if zdict:
+        c = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict)
+    else:
+        c = zlib.compressobj(level, zlib.DEFLATED, -15)
+    out = c.compress(data[start:end])
+    return out + c.flush(zlib.Z_FINISH if last else zlib.Z_FULL_FLUSH)
+
+
+def _pool(threads: int) -> ThreadPoolExecutor:
+    pool = _pools.get(threads)
+    if pool is None:
+        pool = _pools[threads] = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="png-deflate"
+        )
+    return pool
+
+
+def compress_parallel(raw: bytes, level: int, threads: int, stride: int) -> bytes:
+    # Strips end on scanline boundaries and with a full flush, so the raw
+    # deflate pieces concatenate into one zlib stream; zlib drops the GIL
+    # while compressing, which lets the strips run on separate cores.
+    n = len(raw)
+    if threads <= 1 or n < 2 * MIN_STRIP:
+        return zlib.compress(raw, level)
+    rows = n // stride
+    strips = min(threads, max(1, n // MIN_STRIP), rows)
+    bounds = [(rows * k // strips) * stride for k in range(strips)] + [n]
+    data = memoryview(raw)
+    pool = _pool(threads)
+    futures = [
+        pool.submit(
+            _deflate_strip, data, bounds[k], bounds[k + 1], level, k == strips - 1
+        )
+        for k in range(strips)
+    ]
+    adler = zlib.adler32(raw)
+    # Any valid zlib header works; reuse the one zlib writes for this level.
+    header = zlib.compress(b"", level)[:2]
+    return b"".join([header] + [f.result() for f in futures] + [struct.pack(">I", adler)])
+
+
+def _palette_332() -> bytes:
+    plte = bytearray()
+    for i in range(256):
+        plte += bytes(
+            (((i >> 5) & 7) * 255 // 7, ((i >> 2) & 7) * 255 // 7, (i & 3) * 255 // 3)
+        )
+    return bytes(plte)
+
+
+PALETTE_332 = _palette_332()
+_Q_R = bytes(v & 0xE0 for v in range(256))
+_Q_G = bytes((v & 0xE0) >> 3 for v in range(256))
+_Q_B = bytes(v >> 6 for v in range(256))
+
+
+def quantize_332(rgb: Any, n: int) -> bytes:
+    rgb = bytes(rgb[: n * 3])
+    r = int.from_bytes(rgb[0::3].translate(_Q_R), "big")
+    g = int.from_bytes(rgb[1::3].translate(_Q_G), "big")
+    b = int.from_bytes(rgb[2::3].translate(_Q_B), "big")
+    return (r | g | b).to_bytes(n, "big")
+
+
+def quantize(rgb: Any, w: int, h: int) -> Tuple[bytes, bytes]:
+    # Screens usually carry few distinct colours; NumPy can find an exact
+    # palette cheaply, otherwise fall back to a fixed 3-3-2 colour cube.
+    n = w * h
+    if np is not None:
+        px = np.frombuffer(rgb, dtype=np.uint8, count=n * 3).reshape(n, 3)
+        packed = (
+            (px[:, 0].astype(np.uint32) << 16)
+            | (px[:, 1].astype(np.uint32) << 8)
+            | px[:, 2]
+        )
+        colors, inverse = np.unique(packed, return_inverse=True)
+        if len(colors) <= 256:
+            plte = np.empty((len(colors), 3), dtype=np.uint8)
+            plte[:, 0] = colors >> 16
+            plte[:, 1] = (colors >> 8) & 0xFF
+            plte[:, 2] = colors & 0xFF
+            return inverse.astype(np.uint8).tobytes(), plte.tobytes()
+    return quantize_332(rgb, n), PALETTE_332
+
+
+def encode_png(
+    rgb: Any,
+    w: int,
+    h: int,
+    level: int = 6,
+    filter: str = "none",
+    palette: bool = False,
+    threads: int = 1,
+) -> bytes:
+    if palette:
+        indices, plte = quantize(rgb, w, h)
+        raw = filter_none(indices, w, h)
+        comp = compress_parallel(raw, level, threads, w + 1)
+        return assemble_png(comp, w, h, COLOR_PALETTE, plte)
+    row = w * 3
+    if filter == "adaptive":
+        raw = filter_adaptive(rgb, row, h, 3)
+    elif filter == "none":
+        raw = filter_none(rgb, row, h)
+    else:
+        raise ValueError(f"unknown png filter: {filter}")
+    return assemble_png(compress_parallel(raw, level, threads, row + 1), w, h)
+
+
+class FrameEncoder:
+    def __init__(
+        self, profile: str = "default", options: Optional[Dict[str, Any]] = None
+    ) -> None:
+        if profile not in PROFILES:
+            raise ValueError(f"unknown encoder profile: {profile}")
+        self.profile = profile
+        self.params = dict(PROFILES[profile])
+        self.params.update(options or {})
+        self.last_stats: Dict[str, Any] = {}
+
+    def encode(self, rgb: Any, w: int, h: int) -> bytes:
+        t0 = time.perf_counter()
+        png = encode_png(rgb, w, h, **self.params)
+        encode_ms = (time.perf_counter() - t0) * 1000.0
+        self.last_stats = {
+            "profile": self.profile,
+            "threads": self.params.get("threads", 1),
+            "width": w,
+            "height": h,
+            "encode_ms": round(encode_ms, 2),
+            "bytes": len(png),
+            "b64_bytes": 4 * ((len(png) + 2) // 3),
+        }
+        return png
+
+
+def from_cfg(cfg: Dict[str, Any]) -> FrameEncoder:
+    return FrameEncoder(
+        cfg.get("encoder_profile", "default"), cfg.get("encoder_options")
+    )
@@ -0,0 +1,92 @@
+# framediff.py
+from __future__ import annotations
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def tile_digests(
+    pixels: Any, w: int, h: int, tile: int, bpp: int = 3
+) -> List[List[int]]:
+    mv = memoryview(pixels)
+    row = w * bpp
+    span = tile * bpp
+    cols = (w + tile - 1) // tile
+    grid = []
+    for ty in range(0, h, tile):
+        crcs = [0] * cols
+        for y in range(ty, min(h, ty + tile)):
+            base = y * row
+            for tx in range(cols):
+                a = base + tx * span
+                crcs[tx] = zlib.crc32(mv[a : min(base + row, a + span)], crcs[tx])
+        grid.append(crcs)
+    return grid
+
+
+class TileChangeDetector:
+    def __init__(self, tile: int = 32, bpp: int = 3) -> None:
+        self.tile = tile
+        self.bpp = bpp
+        self.size: Optional[Tuple[int, int]] = None
+        self.frame_crc: Optional[int] = None
+        self.digests: List[List[int]] = []
+
+    def reset(self) -> None:
+        self.size = None
+        self.frame_crc = None
+        self.digests = []
+
+    def update(self, pixels: Any, w: int, h: int) -> Dict[str, Any]:
+        rows = (h + self.tile - 1) // self.tile
+        cols = (w + self.tile - 1) // self.tile
+        total = rows * cols
+        frame_crc = zlib.crc32(pixels)
+        if self.size == (w, h) and frame_crc == self.frame_crc:
+            return {"changed": False, "dirty_tiles": 0, "total_tiles": total, "bbox": None}
+
+        digests = tile_digests(pixels, w, h, self.tile, self.bpp)
+        prev = self.digests if self.size == (w, h) else None
+        self.size = (w, h)
+        self.frame_crc = frame_crc
+        self.digests = digests
+
+        dirty = 0
+        x0, y0, x1, y1 = cols, rows, -1, -1
+        if prev is not None:
+            for ty in range(rows):
+                cur, old = digests[ty], prev[ty]
+                for tx in range(cols):
+                    if cur[tx] != old[tx]:
+                        dirty += 1
+                        x0 = min(x0, tx)
+                        x1 = max(x1, tx)
+                        y0 = min(y0, ty)
+                        y1 = max(y1, ty)
+        if not dirty:
+            # No previous frame, or the frame CRC moved while every tile CRC
+            # matched (a collision): report the whole frame as dirty.
+            return {
+                "changed": True,
+                "dirty_tiles": total,
+                "total_tiles": total,
+                "bbox": (0, 0, w, h),
+            }
+        t = self.tile
+        return {
+            "changed": True,
+            "dirty_tiles": dirty,
+            "total_tiles": total,
+            "bbox": (x0 * t, y0 * t, min(w, (x1 + 1) * t), min(h, (y1 + 1) * t)),
+        }
+
+
+def bbox_to_norm(
+    bbox: Tuple[int, int, int, int], w: int, h: int
+) -> Tuple[int, int, int, int]:
+    x0, y0, x1, y1 = bbox
+    return (
+        int(round(x0 * 1000.0 / w)),
+        int(round(y0 * 1000.0 / h)),
+        int(round(x1 * 1000.0 / w)),
+        int(round(y1 * 1000.0 / h)),
+    )
@@ -0,0 +1,136 @@
+# history.py
+from __future__ import annotations
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+IMAGE_STUB = "Earlier screen omitted."
+
+# Caption of zoom_region crops; a crop is detail, not a view of the screen.
+ZOOM_PREFIX = "Zoomed region"
+
+POLICIES = ("checkpoint", "append", "prune")
+
+
+def is_image_message(msg: Dict[str, Any]) -> bool:
+    return msg.get("role") == "user" and isinstance(msg.get("content"), list) and any(
+        part.get("type") == "image_url" for part in msg["content"]
+    )
+
+
+def is_zoom_message(msg: Dict[str, Any]) -> bool:
+    if not is_image_message(msg):
+        return False
+    first = msg["content"][0]
+    return first.get("type") == "text" and first.get("text", "").startswith(ZOOM_PREFIX)
+
+
+def estimate_tokens(msg: Dict[str, Any], image_tokens: int) -> int:
+    # Rough prefill cost: ~4 characters per text token plus a fixed cost per
+    # image; good enough to compare one request against the next.
+    n = 4
+    content = msg.get("content")
+    if isinstance(content, str):
+        n += len(content) // 4
+    elif isinstance(content, list):
+        for part in content:
+            if part.get("type") == "image_url":
+                n += image_tokens
+            else:
+                n += len(part.get("text", "")) // 4
+    if msg.get("tool_calls"):
+        n += len(json.dumps(msg["tool_calls"])) // 4
+    return n
+
+
+class History:
+    def __init__(
+        self,
+        messages: List[Dict[str, Any]],
+        policy: str = "checkpoint",
+        keep_images: int = 1,
+        compact_every: int = 4,
+        image_tokens: int = 1000,
+        prune: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"unknown history policy: {policy}")
+        self.messages: List[Dict[str, Any]] = list(messages)
+        self.policy = policy
+        self.keep_images = max(1, keep_images)
+        self.compact_every = max(1, compact_every)
+        self.image_tokens = image_tokens
+        self.prune = prune
+        self.compactions = 0
+        self._sent: List[Dict[str, Any]] = []
+        self._tokens: Dict[int, int] = {}
+
+    def append(self, msg: Dict[str, Any]) -> None:
+        self.messages.append(msg)
+        if self.policy == "prune" and self.prune is not None and is_image_message(msg):
+            self.messages = self.prune(self.messages)
+
+    def live_images(self) -> List[int]:
+        return [i for i, m in enumerate(self.messages) if is_image_message(m)]
+
+    def surplus_images(self) -> List[int]:
+        # Images older than the newest keep_images full screens. Zoom crops
+        # do not count toward keep_images, so a zoom never leaves the model
+        # without the overview it was taken from; crops after the oldest
+        # kept screen stay with it.
+        images = self.live_images()
+        screens = [i for i in images if not is_zoom_message(self.messages[i])]
+        if len(screens) < self.keep_images:
+            return []
+        first_kept = screens[-self.keep_images]
+        return [i for i in images if i < first_kept]
+
+    def compact(self) -> int:
+        # Stub out every image but the newest keep_images screens, and only
+        # once a full batch of compact_every surplus images has built up, so
+        # the prompt prefix changes rarely and the server's cache survives in
+        # between.
+        if self.policy != "checkpoint":
+            return 0
+        surplus = self.surplus_images()
+        if len(surplus) < self.compact_every:
+            return 0
+        for i in surplus:
+            self.messages[i] = {"role": "user", "content": IMAGE_STUB}
+        self.compactions += 1
+        return len(surplus)
+
+    def _cost(self, msg: Dict[str, Any]) -> int:
+        key = id(msg)
+        n = self._tokens.get(key)
+        if n is None:
+            n = self._tokens[key] = estimate_tokens(msg, self.image_tokens)
+        return n
+
+    def for_request(self) -> List[Dict[str, Any]]:
+        self.compact()
+        return self.messages
+
+    def prefix_stats(self) -> Dict[str, Any]:
+        # Compare with the previous request: messages are never mutated once
+        # appended, so identity marks the unchanged prefix.
+        cur = self.messages
+        common = 0
+        for prev_msg, msg in zip(self._sent, cur):
+            if prev_msg is not msg:
+                break
+            common += 1
+        costs = [self._cost(m) for m in cur]
+        total = sum(costs)
+        reused = sum(costs[:common])
+        self._sent = list(cur)
+        live = {id(m) for m in cur}
+        self._tokens = {k: v for k, v in self._tokens.items() if k in live}
+        return {
+            "messages": len(cur),
+            "images": len(self.live_images()),
+            "prefix_messages": common,
+            "reused_tokens": reused,
+            "total_tokens": total,
+            "prefix_reuse": round(reused / total, 3) if total else 0.0,
+            "compactions": self.compactions,
+        }
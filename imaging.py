@@ -0,0 +1,90 @@
+# imaging.py
+from __future__ import annotations
+import ctypes
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Union
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Converted RGB frames: the pure-Python engines return their bytearray
+# uncopied, NumPy returns bytes.
+Frame = Union[bytes, bytearray]
+
+
+def dib_view(address: int, size: int) -> Any:
+    # Zero-copy view over DIB section memory; strided slices of a c_char array
+    # come back as bytes, so the conversion reads the bitmap in place.
+    return (ctypes.c_char * size).from_address(address)
+
+
+def bgra_to_rgb_loop(bgra: Any, w: int, h: int) -> bytearray:
+    src = memoryview(bgra).cast("B")
+    rgb = bytearray(w * h * 3)
+    j = 0
+    for i in range(0, w * h * 4, 4):
+        rgb[j] = src[i + 2]
+        rgb[j + 1] = src[i + 1]
+        rgb[j + 2] = src[i]
+        j += 3
+    return rgb
+
+
+def bgra_to_rgb_slices(bgra: Any, w: int, h: int) -> bytearray:
+    n = w * h * 4
+    rgb = bytearray(w * h * 3)
+    rgb[0::3] = bgra[2:n:4]
+    rgb[1::3] = bgra[1:n:4]
+    rgb[2::3] = bgra[0:n:4]
+    return rgb
+
+
+def bgra_to_rgb_numpy(bgra: Any, w: int, h: int) -> bytes:
+    a = np.frombuffer(bgra, dtype=np.uint8, count=w * h * 4).reshape(h, w, 4)
+    return a[:, :, 2::-1].tobytes()
+
+
+ENGINES: Dict[str, Callable[[Any, int, int], Frame]] = {
+    "loop": bgra_to_rgb_loop,
+    "slices": bgra_to_rgb_slices,
+}
+if np is not None:
+    ENGINES["numpy"] = bgra_to_rgb_numpy
+
+# Strided slices measure at or ahead of NumPy's gather+tobytes on capture-sized
+# frames (see bench_bgra_to_rgb.py), so they stay the default either way.
+_engine = "slices"
+
+
+def set_engine(name: str) -> None:
+    global _engine
+    if name not in ENGINES:
+        raise ValueError(f"unknown bgra_to_rgb engine: {name}")
+    _engine = name
+
+
+def get_engine() -> str:
+    return _engine
+
+
+_timing = threading.local()
+
+
+def bgra_to_rgb(bgra: Any, w: int, h: int) -> Frame:
+    # The pure-Python engines hand back their bytearray uncopied, so the
+    # cursor overlay can draw into the frame in place.
+    t0 = time.perf_counter()
+    rgb = ENGINES[_engine](bgra, w, h)
+    _timing.ms = (time.perf_counter() - t0) * 1000.0
+    return rgb
+
+
+def take_convert_ms() -> Optional[float]:
+    # Duration of this thread's last bgra_to_rgb, once; None if none ran.
+    ms = getattr(_timing, "ms", None)
+    _timing.ms = None
+    return ms
@@ -0,0 +1,242 @@
+# lmclient.py
+from __future__ import annotations
+import gzip
+import http.client
+import json
+import socket
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from payload import json_default
+
+_STALE = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+
+
+def dumps_compact(payload: Any) -> bytes:
+    # ASCII escapes, so a lone surrogate in a tool argument still serializes.
+    return json.dumps(payload, separators=(",", ":"), default=json_default).encode("ascii")
+
+
+def rejects_encoding(status: int, data: bytes) -> bool:
+    # 415, or a 400 that names the encoding: a 400 alone is just as likely a
+    # bad request or a context overflow, which resending will not fix.
+    if status == 415:
+        return True
+    text = data[:500].decode("utf-8", "replace").lower()
+    return status == 400 and ("encoding" in text or "gzip" in text)
+
+
+def http_error(status: int, data: bytes) -> RuntimeError:
+    return RuntimeError(f"HTTP {status}: {data[:200].decode('utf-8', 'replace')}")
+
+
+class LMClient:
+    def __init__(
+        self,
+        endpoint: str,
+        timeout: float = 240,
+        gzip_body: bool = False,
+        max_idle: int = 4,
+    ) -> None:
+        parts = urlsplit(endpoint)
+        self.endpoint = endpoint
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if self.scheme == "https" else 80)
+        self.path = parts.path or "/"
+        if parts.query:
+            self.path += "?" + parts.query
+        self.timeout = timeout
+        self.gzip_body = gzip_body
+        self.max_idle = max_idle
+        self._local = threading.local()
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self.connections = 0
+
+    @property
+    def last_timing(self) -> Dict[str, Any]:
+        # Per thread, so agents sharing one client each see their own request.
+        return getattr(self._local, "timing", {})
+
+    def _new_conn(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+            self.connections += 1
+        return self._new_conn(), False
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def _open(
+        self, body: bytes, headers: Dict[str, str], retry: bool = True
+    ) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse, Dict[str, Any]]:
+        conn, reused = self._acquire()
+        try:
+            t0 = time.perf_counter()
+            if conn.sock is None:
+                conn.connect()
+                # Headers and a large body go out as separate writes; without
+                # NODELAY the body can stall behind a delayed ACK.
+                conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            t1 = time.perf_counter()
+            conn.request("POST", self.path, body=body, headers=headers)
+            t2 = time.perf_counter()
+            resp = conn.getresponse()
+            t3 = time.perf_counter()
+        except _STALE:
+            conn.close()
+            if not (reused and retry):
+                raise
+            # The server dropped an idle keep-alive socket; retry once fresh.
+            self.close()
+            return self._open(body, headers, retry=False)
+        except Exception:
+            conn.close()
+            raise
+        timing = {
+            "reused": reused,
+            "connect_ms": round((t1 - t0) * 1000.0, 2),
+            "send_ms": round((t2 - t1) * 1000.0, 2),
+            "ttfb_ms": round((t3 - t2) * 1000.0, 2),
+            "status": resp.status,
+            "_t0": t0,
+        }
+        return conn, resp, timing
+
+    def _done(self, conn: http.client.HTTPConnection, resp: http.client.HTTPResponse) -> None:
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+
+    def _request(
+        self, body: bytes, headers: Dict[str, str]
+    ) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse, Dict[str, Any]]:
+        sent = body
+        if self.gzip_body:
+            sent = gzip.compress(body, 6)
+            headers = dict(headers, **{"Content-Encoding": "gzip"})
+        conn, resp, timing = self._open(sent, headers)
+        if "Content-Encoding" in headers and resp.status in (400, 415):
+            data = resp.read()
+            self._done(conn, resp)
+            if not rejects_encoding(resp.status, data):
+                raise http_error(resp.status, data)
+            # Server does not take compressed bodies; stop trying for this client.
+            self.gzip_body = False
+            del headers["Content-Encoding"]
+            sent = body
+            conn, resp, timing = self._open(sent, headers)
+        timing.update(body_bytes=len(body), sent_bytes=len(sent))
+        if resp.status >= 400:
+            data = resp.read()
+            self._done(conn, resp)
+            raise http_error(resp.status, data)
+        return conn, resp, timing
+
+    def _record(self, timing: Dict[str, Any], t_read: float, recv: int) -> None:
+        t_end = time.perf_counter()
+        t0 = timing.pop("_t0")
+        timing.update(
+            read_ms=round((t_end - t_read) * 1000.0, 2),
+            total_ms=round((t_end - t0) * 1000.0, 2),
+            recv_bytes=recv,
+        )
+        self._local.timing = timing
+
+    def post(self, payload: Dict[str, Any], body: Optional[bytes] = None) -> Dict[str, Any]:
+        if body is None:
+            body = dumps_compact(payload)
+        headers = {
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip",
+            "Connection": "keep-alive",
+        }
+        conn, resp, timing = self._request(body, headers)
+        t_read = time.perf_counter()
+        try:
+            data = resp.read()
+        except Exception:
+            conn.close()
+            raise
+        self._done(conn, resp)
+        self._record(timing, t_read, len(data))
+        if resp.getheader("Content-Encoding", "") == "gzip":
+            data = gzip.decompress(data)
+        return json.loads(data.decode("utf-8"))
+
+    def stream(
+        self, payload: Dict[str, Any], body: Optional[bytes] = None
+    ) -> Iterator[Dict[str, Any]]:
+        # Server-sent events from a stream=true completion, one parsed chunk
+        # per "data:" line, until [DONE].
+        if body is None:
+            body = dumps_compact(dict(payload, stream=True))
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+            "Connection": "keep-alive",
+        }
+        conn, resp, timing = self._request(body, headers)
+        t_read = time.perf_counter()
+        recv = 0
+        clean = False
+        try:
+            while True:
+                line = resp.readline()
+                if not line:
+                    break
+                recv += len(line)
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                yield json.loads(data.decode("utf-8"))
+            recv += len(resp.read())
+            clean = True
+        finally:
+            if clean:
+                self._done(conn, resp)
+            else:
+                conn.close()
+            self._record(timing, t_read, recv)
+
+
+_clients: Dict[Tuple[str, bool], LMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(endpoint: str, timeout: float = 240, gzip_body: bool = False) -> LMClient:
+    key = (endpoint, gzip_body)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = LMClient(endpoint, timeout, gzip_body)
+        client.timeout = timeout
+        return client
@@ -0,0 +1,297 @@
+# Run with: python lmlog.py <server.log> [--follow] [--out cleaned.txt]
+# Example: python lmlog.py ~/.lmstudio/server-logs/2026-01/2026-01-05.1.log --follow
+# Streams an LM Studio server log (or an already cleaned log) into the
+# REQUEST TO MODEL / RESPONSE FROM MODEL format with image data truncated.
+
+# lmlog.py
+from __future__ import annotations
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Dict, IO, Iterator, List, Optional, Tuple
+
+# Raw server log markers first, then the cleaned format this module writes,
+# so both can be read back.
+MARKERS: List[Tuple[str, str]] = [
+    ("Received request: POST to /v1/chat/completions with body ", "request"),
+    ("Generated prediction: ", "response"),
+    ("REQUEST TO MODEL:", "request"),
+    ("RESPONSE FROM MODEL:", "response"),
+]
+
+HEADERS = {"request": "REQUEST TO MODEL:", "response": "RESPONSE FROM MODEL:"}
+
+IMAGE_MARKER = "data:image"
+# Long enough for "data:image/png;base64," plus the base64 of the PNG
+# signature and IHDR, so width and height survive truncation.
+IMAGE_KEEP = 54
+# Filled with the length of the whole data: URL. Strings within
+# IMAGE_SLACK of IMAGE_KEEP (already truncated ones among them) stay whole.
+TRUNCATED = "...[truncated {} chars]"
+IMAGE_SLACK = 64
+
+CHUNK = 1 << 20
+# A JSON body still failing to parse after this many characters (images
+# already cut down) is treated as corrupt rather than incomplete.
+MAX_OBJECT = 64 << 20
+# Unmatched text kept between reads, enough for a marker and its timestamp.
+MAX_TAIL = 4096
+
+_TIMESTAMP = re.compile(r"\[([^\]]+)\]")
+
+
+class ImageTruncator:
+    # Cuts every "data:image..." string down to its first IMAGE_KEEP
+    # characters as text streams through, before anything is parsed, so a
+    # log full of base64 never has to sit in memory. Base64 holds no quotes,
+    # so an image string ends at the next '"'.
+    def __init__(self, keep: int = IMAGE_KEEP) -> None:
+        self.keep = keep
+        self.pending = ""
+        self.skipping = False
+        self.cut = 0
+        self.images = 0
+        self.dropped = 0
+
+    def feed(self, text: str) -> str:
+        text = self.pending + text
+        self.pending = ""
+        out: List[str] = []
+        i = 0
+        n = len(text)
+        while i < n:
+            if self.skipping:
+                q = text.find('"', i)
+                if q < 0:
+                    self.cut += n - i
+                    break
+                self.cut += q - i
+                self.dropped += self.cut
+                out.append(TRUNCATED.format(self.keep + self.cut))
+                self.skipping = False
+                i = q
+                continue
+            j = text.find(IMAGE_MARKER, i)
+            if j < 0:
+                # Hold back a tail that could be the start of a marker.
+                k = max(i, n - len(IMAGE_MARKER) + 1)
+                while k < n and not IMAGE_MARKER.startswith(text[k:]):
+                    k += 1
+                out.append(text[i:k])
+                self.pending = text[k:]
+                break
+            limit = j + self.keep + IMAGE_SLACK
+            q = text.find('"', j, limit)
+            if q >= 0:
+                out.append(text[i:q])
+                i = q
+                continue
+            if limit > n:
+                out.append(text[i:j])
+                self.pending = text[j:]
+                break
+            out.append(text[i : j + self.keep])
+            i = j + self.keep
+            self.skipping = True
+            self.cut = 0
+            self.images += 1
+        return "".join(out)
+
+    def flush(self) -> str:
+        rest, self.pending = self.pending, ""
+        return rest
+
+
+def _find_marker(buf: str, start: int = 0) -> Tuple[int, str, str]:
+    best = (-1, "", "")
+    for marker, kind in MARKERS:
+        pos = buf.find(marker, start)
+        if pos >= 0 and (best[0] < 0 or pos < best[0]):
+            best = (pos, marker, kind)
+    return best
+
+
+def _timestamp(buf: str, pos: int) -> str:
+    line = buf[buf.rfind("\n", 0, pos) + 1 : pos]
+    m = _TIMESTAMP.match(line)
+    return m.group(1) if m else "TIMESTAMP"
+
+
+def iter_events(
+    f: IO[str],
+    follow: bool = False,
+    chunk: int = CHUNK,
+    poll: float = 0.5,
+    stats: Optional[Dict[str, Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    # Yields {"kind", "timestamp", "body"} per logged request or response;
+    # body is None when the JSON after a marker would not parse. Memory is
+    # one (truncated) body plus one read, whatever the size of the log.
+    # With follow, waits at end of file for more lines (and starts over if
+    # the file is truncated) instead of stopping.
+    decoder = json.JSONDecoder()
+    trunc = ImageTruncator()
+    stats = stats if stats is not None else {}
+    stats.update(read_chars=0, requests=0, responses=0, errors=0)
+    buf = ""
+    need = 0
+    eof = False
+
+    def read() -> bool:
+        nonlocal buf, eof
+        data = f.read(chunk)
+        if data:
+            stats["read_chars"] += len(data)
+            buf += trunc.feed(data)
+            return True
+        if follow:
+            try:
+                if os.fstat(f.fileno()).st_size < f.tell():
+                    f.seek(0)
+                    buf = ""
+            except (OSError, ValueError):
+                pass
+            return False
+        if not eof:
+            eof = True
+            buf += trunc.flush()
+        return False
+
+    while True:
+        pos, marker, kind = _find_marker(buf)
+        if pos < 0:
+            tail = buf[buf.rfind("\n") + 1 :]
+            buf = tail[-MAX_TAIL:]
+        else:
+            start = buf.find("{", pos + len(marker))
+            nxt = _find_marker(buf, pos + len(marker))[0]
+            if nxt >= 0 and (start < 0 or nxt < start):
+                # Nothing parseable before the next entry began.
+                stats["errors"] += 1
+                yield {"kind": kind, "timestamp": _timestamp(buf, pos), "body": None}
+                buf = buf[max(pos + len(marker), buf.rfind("\n", 0, nxt) + 1) :]
+                need = 0
+                continue
+            if start >= 0 and len(buf) - start >= need:
+                try:
+                    body, end = decoder.raw_decode(buf, start)
+                except json.JSONDecodeError as e:
+                    # Incomplete until proven otherwise: a later marker past
+                    # the error, end of file or MAX_OBJECT means it is broken.
+                    later = _find_marker(buf, max(e.pos, start + 1))[0] >= 0
+                    if later or eof or len(buf) - start > MAX_OBJECT:
+                        stats["errors"] += 1
+                        yield {"kind": kind, "timestamp": _timestamp(buf, pos), "body": None}
+                        buf = buf[pos + len(marker) :]
+                        need = 0
+                        continue
+                    # Re-parse only once the buffer has doubled, so a body
+                    # spread over many reads is not decoded over and over.
+                    need = 2 * (len(buf) - start)
+                else:
+                    stats[kind + "s"] += 1
+                    yield {"kind": kind, "timestamp": _timestamp(buf, pos), "body": body}
+                    buf = buf[end:]
+                    need = 0
+                    continue
+            elif eof:
+                if start >= 0:
+                    need = 0
+                    continue
+                stats["errors"] += 1
+                yield {"kind": kind, "timestamp": _timestamp(buf, pos), "body": None}
+                buf = buf[pos + len(marker) :]
+                continue
+        if read():
+            continue
+        if not follow:
+            if eof and _find_marker(buf)[0] < 0:
+                break
+            continue
+        time.sleep(poll)
+
+    stats["images_truncated"] = trunc.images
+    stats["image_chars_dropped"] = trunc.dropped
+
+
+def format_event(event: Dict[str, Any]) -> str:
+    lines = [
+        f"\n{'=' * 80}",
+        f"[{event['timestamp']}] {HEADERS[event['kind']]}",
+        "=" * 80,
+    ]
+    if event["body"] is None:
+        lines.append("[ERROR: Could not parse JSON]")
+    else:
+        lines.append(json.dumps(event["body"], indent=2))
+    return "\n".join(lines)
+
+
+def exchanges(path: str) -> Iterator[Tuple[Optional[Dict[str, Any]], Dict[str, Any]]]:
+    # (request, response) pairs in log order; a response with no request
+    # logged before it gets None.
+    request = None
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for event in iter_events(f):
+            if event["body"] is None:
+                continue
+            if event["kind"] == "request":
+                request = event["body"]
+            else:
+                yield request, event["body"]
+                request = None
+
+
+def clean_output_name(input_filename: str) -> str:
+    output_filename = input_filename.rsplit(".", 1)[0] + "_clean"
+    if "." in input_filename:
+        output_filename += "." + input_filename.rsplit(".", 1)[1]
+    else:
+        output_filename += ".txt"
+    return output_filename
+
+
+def clean_log(
+    input_filename: str, follow: bool = False, output_filename: Optional[str] = None
+) -> Dict[str, Any]:
+    output_filename = output_filename or clean_output_name(input_filename)
+    stats: Dict[str, Any] = {"output": output_filename}
+    with open(input_filename, "r", encoding="utf-8", errors="replace") as src, open(
+        output_filename, "w", encoding="utf-8"
+    ) as dst:
+        first = True
+        try:
+            for event in iter_events(src, follow=follow, stats=stats):
+                dst.write(("" if first else "\n") + format_event(event))
+                first = False
+                if follow:
+                    dst.flush()
+        except KeyboardInterrupt:
+            pass
+    return stats
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    follow = "--follow" in args
+    if follow:
+        args.remove("--follow")
+    out = None
+    if "--out" in args:
+        i = args.index("--out")
+        if i + 1 >= len(args):
+            sys.exit("--out needs a path")
+        out = args[i + 1]
+        del args[i : i + 2]
+    if len(args) != 1:
+        sys.exit("Usage: python lmlog.py <log_filename> [--follow] [--out path]")
+    stats = clean_log(args[0], follow, out)
+    print(f"Cleaned log written to: {stats['output']}")
+    print(f"Extracted {stats['requests']} requests and {stats['responses']} responses")
+    print(f"[lmlog] {json.dumps(stats)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,591 @@
+# Run with: python lmstub.py [--port 1234] [--policy observe|done|random|<script.json>]
+#                            [--replay <log or jsonl> ...] [--log requests.jsonl]
+#                            [--prefill-tps 500] [--decode-tps 25] [--image-ms 150]
+#                            [--speed 1.0] [--turns 5] [--slots 1] [--seed 0]
+# Example: python lmstub.py --replay scenario-1-execution-log.txt
+#          python main.py scenarios.json 1 virtual
+# Stands in for LM Studio's /v1/chat/completions so the agent loop can be
+# load- and latency-tested offline.
+
+# lmstub.py
+from __future__ import annotations
+import binascii
+import gzip
+import hashlib
+import json
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import budget
+import history as history_mod
+import lmlog
+import vision
+
+FINAL = "Task complete."
+
+
+def message_images(msg: Dict[str, Any]) -> List[str]:
+    content = msg.get("content")
+    if not isinstance(content, list):
+        return []
+    return [
+        part["image_url"]["url"]
+        for part in content
+        if part.get("type") == "image_url" and isinstance(part.get("image_url"), dict)
+    ]
+
+
+def png_size(url: str) -> Optional[Tuple[int, int]]:
+    # The IHDR width and height sit in the first 24 bytes, so only the head
+    # of the base64 needs decoding.
+    head = url.partition(",")[2][:32]
+    try:
+        raw = binascii.a2b_base64(head)
+    except binascii.Error:
+        return None
+    if len(raw) < 24 or raw[:8] != b"\x89PNG\r\n\x1a\n" or raw[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", raw[16:24])
+
+
+def strip_images(value: Any) -> Any:
+    # Copy for the request log with every data: URL cut down to its size.
+    if isinstance(value, dict):
+        return {k: strip_images(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [strip_images(v) for v in value]
+    if isinstance(value, str) and value.startswith("data:image/"):
+        size = png_size(value)
+        return f"data:image/...[{size[0]}x{size[1]}]" if size else "data:image/...[truncated]"
+    return value
+
+
+def task_of(messages: List[Dict[str, Any]]) -> str:
+    for msg in messages:
+        if msg.get("role") == "user" and isinstance(msg.get("content"), str):
+            return msg["content"]
+    return ""
+
+
+def turn_of(messages: List[Dict[str, Any]]) -> int:
+    # The assistant messages, plus any the context budget dropped, number
+    # the turn without any per-session state in the server.
+    n = sum(1 for m in messages if m.get("role") == "assistant")
+    return n + budget.omitted_turns(messages)
+
+
+def completion_tokens(msg: Dict[str, Any]) -> int:
+    n = len(msg.get("content") or "") // 4
+    for call in msg.get("tool_calls") or []:
+        n += 4 + len(json.dumps(call.get("function", {}))) // 4
+    return max(1, n)
+
+
+class Policy:
+    name = "done"
+
+    def respond(self, request: Dict[str, Any], turn: int) -> Dict[str, Any]:
+        return {"role": "assistant", "content": FINAL}
+
+    def usage(self, request: Dict[str, Any], turn: int) -> Optional[Dict[str, Any]]:
+        # Recorded token counts where the policy has them.
+        return None
+
+
+def tool_message(calls: List[Tuple[str, Dict[str, Any]]], turn: int) -> Dict[str, Any]:
+    return {
+        "role": "assistant",
+        "content": "",
+        "tool_calls": [
+            {
+                "id": f"call_{turn}_{i}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(args)},
+            }
+            for i, (name, args) in enumerate(calls)
+        ],
+    }
+
+
+class ObservePolicy(Policy):
+    # A screenshot every turn until the last: the heaviest image load a run
+    # of the given length can produce.
+    name = "observe"
+
+    def __init__(self, turns: int = 5) -> None:
+        self.turns = turns
+
+    def respond(self, request: Dict[str, Any], turn: int) -> Dict[str, Any]:
+        if turn >= self.turns:
+            return super().respond(request, turn)
+        return tool_message([("take_screenshot", {})], turn)
+
+
+class RandomPolicy(Policy):
+    # Seeded per task and turn, so a rerun (or a retried request) sees the
+    # same action whatever order concurrent agents arrive in.
+    name = "random"
+
+    def __init__(self, turns: int = 5, seed: int = 0) -> None:
+        self.turns = turns
+        self.seed = seed
+
+    def _args(self, params: Dict[str, Any], rnd: random.Random) -> Optional[Dict[str, Any]]:
+        args: Dict[str, Any] = {}
+        for key, spec in (params.get("properties") or {}).items():
+            kind = spec.get("type")
+            if kind == "number":
+                args[key] = rnd.randrange(1001)
+            elif kind == "integer":
+                args[key] = 1
+            elif kind == "string":
+                args[key] = rnd.choice(("hello", "notepad", "test 123"))
+            elif key in (params.get("required") or []):
+                return None
+        return args
+
+    def respond(self, request: Dict[str, Any], turn: int) -> Dict[str, Any]:
+        if turn >= self.turns:
+            return super().respond(request, turn)
+        rnd = random.Random(f"{self.seed}:{task_of(request['messages'])}:{turn}")
+        options = []
+        for tool in request.get("tools") or []:
+            fn = tool.get("function") or {}
+            args = self._args(fn.get("parameters") or {}, rnd)
+            if args is not None:
+                options.append((fn.get("name", ""), args))
+        if not options:
+            return super().respond(request, turn)
+        return tool_message([rnd.choice(options)], turn)
+
+
+class ScriptPolicy(Policy):
+    # Turns from a JSON list: a string is the final answer, a list holds
+    # {"name": ..., "arguments": {...}} calls for that turn.
+    name = "script"
+
+    def __init__(self, turns: List[Any]) -> None:
+        self.turns = turns
+
+    def respond(self, request: Dict[str, Any], turn: int) -> Dict[str, Any]:
+        if turn >= len(self.turns) or isinstance(self.turns[turn], str):
+            content = self.turns[turn] if turn < len(self.turns) else FINAL
+            return {"role": "assistant", "content": content}
+        calls = [(c["name"], c.get("arguments") or {}) for c in self.turns[turn]]
+        return tool_message(calls, turn)
+
+
+def load_exchanges(path: str) -> List[Tuple[Optional[Dict[str, Any]], Dict[str, Any]]]:
+    # (request, response) pairs from a JSONL written by --log, or from an
+    # LM Studio server log, raw or cleaned (the scenario execution logs).
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(4096).lstrip()
+        if not head.startswith("{"):
+            return list(lmlog.exchanges(path))
+        f.seek(0)
+        pairs: List[Tuple[Optional[Dict[str, Any]], Dict[str, Any]]] = []
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                if "response" in entry:
+                    pairs.append((entry.get("request"), entry["response"]))
+        return pairs
+
+
+class ReplayPolicy(Policy):
+    # Recorded responses, picked by the task prompt and the turn number.
+    name = "replay"
+
+    def __init__(self, paths: List[str]) -> None:
+        self.sessions: List[Tuple[str, List[Dict[str, Any]]]] = []
+        for path in paths:
+            pairs = load_exchanges(path)
+            if not pairs:
+                continue
+            first = pairs[0][0] or {}
+            responses = [resp for _, resp in pairs]
+            self.sessions.append((task_of(first.get("messages") or []), responses))
+        if not self.sessions:
+            raise ValueError("no recorded responses in replay files")
+
+    def _recorded(self, request: Dict[str, Any], turn: int) -> Optional[Dict[str, Any]]:
+        task = task_of(request["messages"])
+        responses = next((r for t, r in self.sessions if t == task), None)
+        if responses is None:
+            responses = self.sessions[0][1] if len(self.sessions) == 1 else []
+        return responses[turn] if turn < len(responses) else None
+
+    def respond(self, request: Dict[str, Any], turn: int) -> Dict[str, Any]:
+        resp = self._recorded(request, turn)
+        if resp is None:
+            return super().respond(request, turn)
+        return resp["choices"][0]["message"]
+
+    def usage(self, request: Dict[str, Any], turn: int) -> Optional[Dict[str, Any]]:
+        return (self._recorded(request, turn) or {}).get("usage")
+
+
+def make_policy(spec: str, replay: List[str], turns: int, seed: int) -> Policy:
+    if replay:
+        return ReplayPolicy(replay)
+    if spec == "done":
+        return Policy()
+    if spec == "observe":
+        return ObservePolicy(turns)
+    if spec == "random":
+        return RandomPolicy(turns, seed)
+    with open(spec, "r", encoding="utf-8") as f:
+        return ScriptPolicy(json.load(f))
+
+
+class LatencyModel:
+    # Prefill runs at prefill_tps over the prompt tokens not already in a
+    # slot's cache plus image_ms per new image; decode runs at decode_tps.
+    # speed scales every delay (and the timings reported), 0 disables them.
+    # Slots mirror llama.cpp's: each keeps the message hashes of the last
+    # request it served, and a request takes the slot sharing its longest
+    # prefix (or the least recently used one).
+    def __init__(
+        self,
+        params: vision.VisionParams,
+        prefill_tps: float = 500.0,
+        decode_tps: float = 25.0,
+        image_ms: float = 150.0,
+        base_ms: float = 20.0,
+        speed: float = 1.0,
+        slots: int = 1,
+    ) -> None:
+        self.params = params
+        self.prefill_tps = prefill_tps
+        self.decode_tps = decode_tps
+        self.image_ms = image_ms
+        self.base_ms = base_ms
+        self.speed = speed
+        self.slots: List[Tuple[float, List[str]]] = [(0.0, []) for _ in range(max(1, slots))]
+        self._lock = threading.Lock()
+
+    def _message_cost(self, msg: Dict[str, Any]) -> Tuple[int, int]:
+        images = message_images(msg)
+        tokens = history_mod.estimate_tokens(msg, 0)
+        for url in images:
+            size = png_size(url)
+            tokens += self.params.tokens(*size) if size else 1000
+        return tokens, len(images)
+
+    def prefill(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        messages = request.get("messages") or []
+        keys = [hashlib.sha1(json.dumps(request.get("tools") or []).encode()).hexdigest()]
+        keys += [
+            hashlib.sha1(json.dumps(m, sort_keys=True).encode("utf-8")).hexdigest()
+            for m in messages
+        ]
+        costs = [(len(json.dumps(request.get("tools") or [])) // 4, 0)]
+        costs += [self._message_cost(m) for m in messages]
+        with self._lock:
+            best, common = 0, -1
+            for i, (_, prev) in enumerate(self.slots):
+                n = 0
+                for a, b in zip(prev, keys):
+                    if a != b:
+                        break
+                    n += 1
+                if n > common or (n == common and self.slots[i][0] < self.slots[best][0]):
+                    best, common = i, n
+            if common == 0:
+                best = min(range(len(self.slots)), key=lambda i: self.slots[i][0])
+            self.slots[best] = (time.monotonic(), keys)
+        prompt = sum(t for t, _ in costs)
+        cached = sum(t for t, _ in costs[:common])
+        new_images = sum(n for _, n in costs[common:])
+        ms = self.base_ms + (prompt - cached) / self.prefill_tps * 1000.0
+        ms = (ms + new_images * self.image_ms) * self.speed
+        return {
+            "prompt_tokens": prompt,
+            "cached_tokens": cached,
+            "images": sum(n for _, n in costs),
+            "new_images": new_images,
+            "slot": best,
+            "prompt_ms": round(ms, 2),
+        }
+
+    def decode_ms(self, tokens: int) -> float:
+        return round(tokens / self.decode_tps * 1000.0 * self.speed, 2)
+
+    def sleep(self, ms: float) -> None:
+        if ms > 0:
+            time.sleep(ms / 1000.0)
+
+
+def stream_deltas(msg: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # Content in ~4-character tokens, each tool call's id and name first and
+    # its arguments in pieces, the way llama.cpp streams them.
+    deltas: List[Dict[str, Any]] = [{"role": "assistant", "content": ""}]
+    content = msg.get("content") or ""
+    for i in range(0, len(content), 4):
+        deltas.append({"content": content[i : i + 4]})
+    for idx, call in enumerate(msg.get("tool_calls") or []):
+        fn = call.get("function") or {}
+        head = {"index": idx, "id": call.get("id", ""), "type": "function"}
+        head["function"] = {"name": fn.get("name", ""), "arguments": ""}
+        deltas.append({"tool_calls": [head]})
+        args = fn.get("arguments") or ""
+        for i in range(0, len(args), 8):
+            part = {"index": idx, "function": {"arguments": args[i : i + 8]}}
+            deltas.append({"tool_calls": [part]})
+    return deltas
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        policy: Policy,
+        latency: LatencyModel,
+        log_path: Optional[str] = None,
+        quiet: bool = False,
+    ) -> None:
+        super().__init__(address, StubHandler)
+        self.policy = policy
+        self.latency = latency
+        self.quiet = quiet
+        self.requests = 0
+        self._log = open(log_path, "a", encoding="utf-8") if log_path else None
+        self._lock = threading.Lock()
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def record(
+        self, entry: Dict[str, Any], request: Dict[str, Any], response: Dict[str, Any]
+    ) -> None:
+        with self._lock:
+            self.requests += 1
+            if not self.quiet:
+                print(f"[stub] {json.dumps(entry)}", file=sys.stderr)
+            if self._log is not None:
+                line = {"stats": entry, "request": strip_images(request), "response": response}
+                self._log.write(json.dumps(line) + "\n")
+                self._log.flush()
+
+    def server_close(self) -> None:
+        super().server_close()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StubServer
+
+    def setup(self) -> None:
+        super().setup()
+        # SSE events are small separate writes; Nagle would hold each one
+        # back behind the client's delayed ACK.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, obj: Any) -> None:
+        data = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": f"no route for GET {self.path}"})
+
+    def do_POST(self) -> None:
+        t0 = time.perf_counter()
+        wire = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        body = wire
+        if self.headers.get("Content-Encoding", "") == "gzip":
+            body = gzip.decompress(wire)
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._send_json(404, {"error": f"no route for POST {self.path}"})
+            return
+        try:
+            request = json.loads(body.decode("utf-8"))
+            messages = request["messages"]
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": f"bad request: {e}"})
+            return
+        server = self.server
+        turn = turn_of(messages)
+        msg = server.policy.respond(request, turn)
+        prefill = server.latency.prefill(request)
+        recorded = server.policy.usage(request, turn) or {}
+        completion = recorded.get("completion_tokens") or completion_tokens(msg)
+        decode_ms = server.latency.decode_ms(completion)
+        timings = {
+            "cache_n": prefill["cached_tokens"],
+            "prompt_n": prefill["prompt_tokens"] - prefill["cached_tokens"],
+            "prompt_ms": prefill["prompt_ms"],
+            "predicted_n": completion,
+            "predicted_ms": decode_ms,
+        }
+        usage = {
+            "prompt_tokens": prefill["prompt_tokens"],
+            "completion_tokens": completion,
+            "total_tokens": prefill["prompt_tokens"] + completion,
+        }
+        finish = "tool_calls" if msg.get("tool_calls") else "stop"
+        head = {
+            "id": f"chatcmpl-stub-{server.requests + 1}",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+        }
+        # Logged in this shape for streamed requests too, so --log output
+        # replays either way.
+        response = dict(head, object="chat.completion")
+        response["choices"] = [{"index": 0, "message": msg, "finish_reason": finish}]
+        response.update(usage=usage, timings=timings)
+        server.latency.sleep(prefill["prompt_ms"])
+        stream = bool(request.get("stream"))
+        if stream:
+            include_usage = (request.get("stream_options") or {}).get("include_usage", False)
+            self._stream(head, msg, finish, decode_ms, usage if include_usage else None, timings)
+        else:
+            server.latency.sleep(decode_ms)
+            self._send_json(200, response)
+        entry = {
+            "turn": turn,
+            "policy": server.policy.name,
+            "stream": stream,
+            "bytes": len(body),
+            "wire_bytes": len(wire),
+            "gzip": len(wire) != len(body),
+            "messages": len(messages),
+            "images": prefill["images"],
+            "new_images": prefill["new_images"],
+            "prompt_tokens": prefill["prompt_tokens"],
+            "cached_tokens": prefill["cached_tokens"],
+            "completion_tokens": completion,
+            "slot": prefill["slot"],
+            "prefill_ms": prefill["prompt_ms"],
+            "decode_ms": decode_ms,
+            "total_ms": round((time.perf_counter() - t0) * 1000.0, 2),
+        }
+        server.record(entry, request, response)
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def _event(self, obj: Any) -> None:
+        self._chunk(b"data: " + json.dumps(obj).encode("utf-8") + b"\n\n")
+
+    def _stream(
+        self,
+        head: Dict[str, Any],
+        msg: Dict[str, Any],
+        finish: str,
+        decode_ms: float,
+        usage: Optional[Dict[str, Any]],
+        timings: Dict[str, Any],
+    ) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        base = dict(head, object="chat.completion.chunk")
+        deltas = stream_deltas(msg)
+        per = decode_ms / len(deltas)
+        for delta in deltas:
+            self._event(dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}]))
+            self.wfile.flush()
+            self.server.latency.sleep(per)
+        last = dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": finish}])
+        last["timings"] = timings
+        self._event(last)
+        if usage is not None:
+            self._event(dict(base, choices=[], usage=usage))
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+        self.wfile.flush()
+
+
+def start(
+    policy: Policy,
+    latency: Optional[LatencyModel] = None,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    log_path: Optional[str] = None,
+    quiet: bool = True,
+) -> StubServer:
+    # In-process server on a background thread; port 0 picks a free port.
+    server = StubServer(
+        (host, port), policy, latency or LatencyModel(vision.VisionParams()), log_path, quiet
+    )
+    threading.Thread(target=server.serve_forever, name="lmstub", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    opts: Dict[str, Any] = {
+        "host": "127.0.0.1",
+        "port": "1234",
+        "policy": "observe",
+        "log": None,
+        "prefill-tps": "500",
+        "decode-tps": "25",
+        "image-ms": "150",
+        "speed": "1.0",
+        "turns": "5",
+        "slots": "1",
+        "seed": "0",
+        "hparams": "model-load-params-Intel-iGPU.txt",
+    }
+    replay: List[str] = []
+    args = sys.argv[1:]
+    i = 0
+    while i < len(args):
+        key = args[i][2:] if args[i].startswith("--") else ""
+        if key == "replay":
+            i += 1
+            while i < len(args) and not args[i].startswith("--"):
+                replay.append(args[i])
+                i += 1
+            continue
+        if key not in opts or i + 1 >= len(args):
+            sys.exit(f"unknown argument: {args[i]}")
+        opts[key] = args[i + 1]
+        i += 2
+
+    policy = make_policy(opts["policy"], replay, int(opts["turns"]), int(opts["seed"]))
+    latency = LatencyModel(
+        vision.from_cfg({"vision_hparams": opts["hparams"]}),
+        prefill_tps=float(opts["prefill-tps"]),
+        decode_tps=float(opts["decode-tps"]),
+        image_ms=float(opts["image-ms"]),
+        speed=float(opts["speed"]),
+        slots=int(opts["slots"]),
+    )
+    server = StubServer((opts["host"], int(opts["port"])), policy, latency, opts["log"])
+    print(f"[stub] {policy.name} policy on {server.endpoint}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,487 @@
+# Run with: python logdb.py ingest <index.db> <log> [<log> ...] [--force]
+#           python logdb.py report <index.db> sessions|latency|payload|slowest|tools
+#                                  [--since TS] [--until TS] [--task TEXT] [--limit N] [--json]
+#           python logdb.py sql <index.db> "<SELECT ...>"
+# Example: python logdb.py ingest logs.db scenario-*-execution-log.txt
+#          python logdb.py report logs.db latency --since "2026-01-05"
+# Indexes LM Studio server logs (raw or cleaned) into SQLite for reports
+# across sessions.
+
+# logdb.py
+from __future__ import annotations
+import binascii
+import json
+import os
+import re
+import sqlite3
+import struct
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import lmlog
+import tracing
+import vision
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    ingested TEXT,
+    requests INTEGER,
+    errors INTEGER
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    task TEXT,
+    model TEXT,
+    started TEXT,
+    ended TEXT,
+    requests INTEGER,
+    finished INTEGER
+);
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    source TEXT NOT NULL,
+    seq INTEGER,
+    step INTEGER,
+    ts TEXT,
+    response_ts TEXT,
+    latency_s REAL,
+    model TEXT,
+    stream INTEGER,
+    messages INTEGER,
+    images INTEGER,
+    image_bytes INTEGER,
+    image_tokens INTEGER,
+    payload_chars INTEGER,
+    finish_reason TEXT,
+    tool_calls INTEGER,
+    content_chars INTEGER,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER
+);
+CREATE TABLE IF NOT EXISTS images (
+    request_id INTEGER NOT NULL REFERENCES requests(id),
+    idx INTEGER,
+    message INTEGER,
+    width INTEGER,
+    height INTEGER,
+    chars INTEGER,
+    bytes INTEGER,
+    tokens INTEGER
+);
+CREATE TABLE IF NOT EXISTS tool_calls (
+    request_id INTEGER NOT NULL REFERENCES requests(id),
+    idx INTEGER,
+    name TEXT,
+    arguments TEXT
+);
+CREATE INDEX IF NOT EXISTS requests_session ON requests(session_id);
+CREATE INDEX IF NOT EXISTS requests_ts ON requests(ts);
+CREATE INDEX IF NOT EXISTS requests_source ON requests(source);
+CREATE INDEX IF NOT EXISTS sessions_source ON sessions(source);
+CREATE INDEX IF NOT EXISTS images_request ON images(request_id);
+CREATE INDEX IF NOT EXISTS tool_calls_request ON tool_calls(request_id);
+CREATE INDEX IF NOT EXISTS tool_calls_name ON tool_calls(name);
+"""
+
+_TRUNCATED = re.compile(r"\.\.\.\[truncated(?: (\d+) chars)?\]$")
+
+TS_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S")
+
+
+def connect(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+    db.executescript(SCHEMA)
+    return db
+
+
+def parse_ts(ts: Optional[str]) -> Optional[datetime]:
+    for fmt in TS_FORMATS:
+        try:
+            return datetime.strptime(ts or "", fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def image_info(url: str) -> Dict[str, Optional[int]]:
+    # Size of one (possibly truncated) data: URL. Logs cleaned by lmlog keep
+    # enough base64 for the IHDR and record the full length; older cleaned
+    # logs kept 50 characters, which still covers the width.
+    head, _, data = url.partition(",")
+    m = _TRUNCATED.search(data)
+    if m:
+        data = data[: m.start()]
+        chars = int(m.group(1)) if m.group(1) else None
+    else:
+        chars = len(url)
+    b64 = data[:32]
+    raw = b""
+    try:
+        raw = binascii.a2b_base64(b64[: len(b64) // 4 * 4])
+    except binascii.Error:
+        pass
+    width = height = None
+    if raw[:8] == b"\x89PNG\r\n\x1a\n" and raw[12:16] == b"IHDR":
+        if len(raw) >= 20:
+            width = struct.unpack(">I", raw[16:20])[0]
+        if len(raw) >= 24:
+            height = struct.unpack(">I", raw[20:24])[0]
+    size = (chars - len(head) - 1) * 3 // 4 if chars is not None else None
+    return {"width": width, "height": height, "chars": chars, "bytes": size}
+
+
+def request_images(body: Dict[str, Any]) -> Iterator[Tuple[int, str]]:
+    for i, msg in enumerate(body.get("messages") or []):
+        content = msg.get("content")
+        if not isinstance(content, list):
+            continue
+        for part in content:
+            if part.get("type") == "image_url" and isinstance(part.get("image_url"), dict):
+                yield i, part["image_url"].get("url", "")
+
+
+def task_of(body: Dict[str, Any]) -> str:
+    for msg in body.get("messages") or []:
+        if msg.get("role") == "user" and isinstance(msg.get("content"), str):
+            return msg["content"]
+    return ""
+
+
+def _delete_source(db: sqlite3.Connection, path: str) -> None:
+    ids = "SELECT id FROM requests WHERE source = ?"
+    db.execute(f"DELETE FROM images WHERE request_id IN ({ids})", (path,))
+    db.execute(f"DELETE FROM tool_calls WHERE request_id IN ({ids})", (path,))
+    db.execute("DELETE FROM requests WHERE source = ?", (path,))
+    db.execute("DELETE FROM sessions WHERE source = ?", (path,))
+    db.execute("DELETE FROM sources WHERE path = ?", (path,))
+
+
+def ingest(
+    db: sqlite3.Connection,
+    path: str,
+    params: Optional[vision.VisionParams] = None,
+    force: bool = False,
+) -> Dict[str, Any]:
+    # One log into the index, replacing whatever an earlier ingest of the
+    # same path stored; unchanged files (size and mtime) are skipped. A new
+    # session starts at a request with no assistant turns yet, or when the
+    # task prompt or model changes.
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    row = db.execute("SELECT size, mtime FROM sources WHERE path = ?", (path,)).fetchone()
+    if row is not None and not force and row["size"] == st.st_size and row["mtime"] == st.st_mtime:
+        return {"path": path, "skipped": True}
+    params = params or vision.VisionParams()
+    counts = {"path": path, "sessions": 0, "requests": 0, "images": 0, "tool_calls": 0}
+    parse_stats: Dict[str, Any] = {}
+    with db:
+        _delete_source(db, path)
+        session: Optional[Dict[str, Any]] = None
+        pending: Optional[Tuple[str, Dict[str, Any]]] = None
+        seq = 0
+
+        def close_session() -> None:
+            if session is not None:
+                db.execute(
+                    "UPDATE sessions SET ended = ?, requests = ?, finished = ? WHERE id = ?",
+                    (session["ended"], session["requests"], session["finished"], session["id"]),
+                )
+
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for event in lmlog.iter_events(f, stats=parse_stats):
+                if event["kind"] == "request":
+                    pending = (event["timestamp"], event["body"]) if event["body"] else None
+                    continue
+                if pending is None or event["body"] is None:
+                    pending = None
+                    continue
+                ts, body = pending
+                pending = None
+                messages = body.get("messages") or []
+                step = 1 + sum(1 for m in messages if m.get("role") == "assistant")
+                task, model = task_of(body), body.get("model")
+                if (
+                    session is None
+                    or step == 1
+                    or task != session["task"]
+                    or model != session["model"]
+                ):
+                    close_session()
+                    cur = db.execute(
+                        "INSERT INTO sessions (source, task, model, started) VALUES (?, ?, ?, ?)",
+                        (path, task, model, ts),
+                    )
+                    session = {"id": cur.lastrowid, "task": task, "model": model, "requests": 0}
+                    counts["sessions"] += 1
+                seq += 1
+                resp = event["body"]
+                choice = (resp.get("choices") or [{}])[0]
+                msg = choice.get("message") or {}
+                calls = msg.get("tool_calls") or []
+                usage = resp.get("usage") or {}
+                t_req, t_resp = parse_ts(ts), parse_ts(event["timestamp"])
+                latency = (t_resp - t_req).total_seconds() if t_req and t_resp else None
+
+                images = []
+                payload = len(json.dumps(body, separators=(",", ":")))
+                for msg_idx, url in request_images(body):
+                    info = image_info(url)
+                    if info["width"] and info["height"]:
+                        info["tokens"] = params.tokens(info["width"], info["height"])
+                    else:
+                        info["tokens"] = None
+                    if info["chars"] is not None:
+                        payload += info["chars"] - len(url)
+                    images.append((msg_idx, info))
+
+                def total(key: str) -> Optional[int]:
+                    vals = [info[key] for _, info in images]
+                    return sum(vals) if vals and None not in vals else None
+
+                cur = db.execute(
+                    "INSERT INTO requests (session_id, source, seq, step, ts, response_ts,"
+                    " latency_s, model, stream, messages, images, image_bytes, image_tokens,"
+                    " payload_chars, finish_reason, tool_calls, content_chars, prompt_tokens,"
+                    " completion_tokens) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,"
+                    " ?, ?, ?, ?)",
+                    (
+                        session["id"],
+                        path,
+                        seq,
+                        step,
+                        ts,
+                        event["timestamp"],
+                        latency,
+                        model,
+                        int(bool(body.get("stream"))),
+                        len(messages),
+                        len(images),
+                        total("bytes") if images else 0,
+                        total("tokens") if images else 0,
+                        payload,
+                        choice.get("finish_reason"),
+                        len(calls),
+                        len(msg.get("content") or ""),
+                        usage.get("prompt_tokens"),
+                        usage.get("completion_tokens"),
+                    ),
+                )
+                request_id = cur.lastrowid
+                db.executemany(
+                    "INSERT INTO images (request_id, idx, message, width, height, chars, bytes,"
+                    " tokens) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            request_id,
+                            i,
+                            msg_idx,
+                            info["width"],
+                            info["height"],
+                            info["chars"],
+                            info["bytes"],
+                            info["tokens"],
+                        )
+                        for i, (msg_idx, info) in enumerate(images)
+                    ],
+                )
+                db.executemany(
+                    "INSERT INTO tool_calls (request_id, idx, name, arguments)"
+                    " VALUES (?, ?, ?, ?)",
+                    [
+                        (
+                            request_id,
+                            i,
+                            (c.get("function") or {}).get("name"),
+                            (c.get("function") or {}).get("arguments"),
+                        )
+                        for i, c in enumerate(calls)
+                    ],
+                )
+                session["requests"] += 1
+                session["ended"] = event["timestamp"]
+                session["finished"] = int(not calls)
+                counts["requests"] += 1
+                counts["images"] += len(images)
+                counts["tool_calls"] += len(calls)
+            close_session()
+        db.execute(
+            "INSERT INTO sources (path, size, mtime, ingested, requests, errors)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                path,
+                st.st_size,
+                st.st_mtime,
+                time.strftime("%Y-%m-%d %H:%M:%S"),
+                counts["requests"],
+                parse_stats.get("errors", 0),
+            ),
+        )
+    counts["errors"] = parse_stats.get("errors", 0)
+    return counts
+
+
+def _filters(opts: Dict[str, Any], *extra: str) -> Tuple[str, List[Any]]:
+    where, args = list(extra), []
+    if opts.get("since"):
+        where.append("r.ts >= ?")
+        args.append(opts["since"])
+    if opts.get("until"):
+        where.append("r.ts <= ?")
+        args.append(opts["until"])
+    if opts.get("task"):
+        where.append("s.task LIKE ?")
+        args.append(f"%{opts['task']}%")
+    return (" WHERE " + " AND ".join(where)) if where else "", args
+
+
+def _rows(db: sqlite3.Connection, sql: str, args: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+    return [dict(r) for r in db.execute(sql, args)]
+
+
+def _by_step(rows: List[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+    out: Dict[int, List[Dict[str, Any]]] = {}
+    for r in rows:
+        out.setdefault(r["step"], []).append(r)
+    return dict(sorted(out.items()))
+
+
+def _mean(values: List[Any]) -> Optional[float]:
+    values = [v for v in values if v is not None]
+    return round(sum(values) / len(values), 1) if values else None
+
+
+def report(db: sqlite3.Connection, name: str, opts: Dict[str, Any]) -> List[Dict[str, Any]]:
+    where, args = _filters(opts)
+    limit = int(opts.get("limit") or 20)
+    base = f"FROM requests r JOIN sessions s ON s.id = r.session_id{where}"
+    if name == "sessions":
+        return _rows(
+            db,
+            "SELECT s.id AS session, s.started, s.ended, COUNT(r.id) AS requests,"
+            " SUM(r.images) AS images, SUM(r.prompt_tokens) AS prompt_tokens,"
+            " SUM(r.completion_tokens) AS completion_tokens, SUM(r.latency_s) AS latency_s,"
+            f" s.finished, substr(s.task, 1, 40) AS task {base}"
+            " GROUP BY s.id ORDER BY s.started DESC LIMIT ?",
+            args + [limit],
+        )
+    if name in ("latency", "payload"):
+        rows = _rows(db, f"SELECT r.* {base}", args)
+        out = []
+        for step, rs in _by_step(rows).items():
+            if name == "latency":
+                lat = sorted(r["latency_s"] for r in rs if r["latency_s"] is not None)
+                out.append(
+                    {
+                        "step": step,
+                        "n": len(rs),
+                        "p50_s": tracing.percentile(lat, 0.5) if lat else None,
+                        "p90_s": tracing.percentile(lat, 0.9) if lat else None,
+                        "max_s": lat[-1] if lat else None,
+                        "prompt_tokens": _mean([r["prompt_tokens"] for r in rs]),
+                        "completion_tokens": _mean([r["completion_tokens"] for r in rs]),
+                    }
+                )
+            else:
+                out.append(
+                    {
+                        "step": step,
+                        "n": len(rs),
+                        "messages": _mean([r["messages"] for r in rs]),
+                        "images": _mean([r["images"] for r in rs]),
+                        "image_kb": _mean(
+                            [r["image_bytes"] / 1024 for r in rs if r["image_bytes"] is not None]
+                        ),
+                        "image_tokens": _mean([r["image_tokens"] for r in rs]),
+                        "payload_kb": _mean([r["payload_chars"] / 1024 for r in rs]),
+                        "prompt_tokens": _mean([r["prompt_tokens"] for r in rs]),
+                    }
+                )
+        return out
+    if name == "slowest":
+        where, args = _filters(opts, "r.latency_s IS NOT NULL")
+        return _rows(
+            db,
+            "SELECT r.session_id AS session, r.step, r.ts, r.latency_s, r.images,"
+            " r.prompt_tokens, r.completion_tokens, r.finish_reason,"
+            " substr(s.task, 1, 40) AS task"
+            f" FROM requests r JOIN sessions s ON s.id = r.session_id{where}"
+            " ORDER BY r.latency_s DESC LIMIT ?",
+            args + [limit],
+        )
+    if name == "tools":
+        return _rows(
+            db,
+            "SELECT t.name, COUNT(*) AS calls, COUNT(DISTINCT r.session_id) AS sessions"
+            f" FROM tool_calls t JOIN requests r ON r.id = t.request_id"
+            f" JOIN sessions s ON s.id = r.session_id{where}"
+            " GROUP BY t.name ORDER BY calls DESC",
+            args,
+        )
+    raise ValueError(f"unknown report: {name}")
+
+
+REPORTS = ("sessions", "latency", "payload", "slowest", "tools")
+
+
+def format_rows(rows: List[Dict[str, Any]]) -> str:
+    if not rows:
+        return "(no rows)"
+    cols = list(rows[0])
+    cells = [[("" if r[c] is None else str(r[c])) for c in cols] for r in rows]
+    widths = [max(len(c), *(len(row[i]) for row in cells)) for i, c in enumerate(cols)]
+    lines = ["  ".join(c.rjust(w) for c, w in zip(cols, widths))]
+    lines.extend("  ".join(v.rjust(w) for v, w in zip(row, widths)) for row in cells)
+    return "\n".join(lines)
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    if len(args) < 3 or args[0] not in ("ingest", "report", "sql"):
+        sys.exit(
+            "Usage: python logdb.py ingest <db> <log> [...] [--force]\n"
+            f"       python logdb.py report <db> {'|'.join(REPORTS)} [--since TS] [--until TS]"
+            " [--task TEXT] [--limit N] [--json]\n"
+            '       python logdb.py sql <db> "<SELECT ...>"'
+        )
+    cmd, db_path, rest = args[0], args[1], args[2:]
+    db = connect(db_path)
+    if cmd == "ingest":
+        force = "--force" in rest
+        params = vision.from_cfg(
+            {"vision_hparams": os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                            "model-load-params-Intel-iGPU.txt")}
+        )
+        for path in (p for p in rest if p != "--force"):
+            print(f"[logdb] {json.dumps(ingest(db, path, params, force))}", file=sys.stderr)
+        return
+    if cmd == "sql":
+        print(format_rows(_rows(db, rest[0])))
+        return
+    name, opts = rest[0], {"json": False}
+    i = 1
+    while i < len(rest):
+        key = rest[i][2:] if rest[i].startswith("--") else ""
+        if key == "json":
+            opts["json"] = True
+            i += 1
+        elif key in ("since", "until", "task", "limit") and i + 1 < len(rest):
+            opts[key] = rest[i + 1]
+            i += 2
+        else:
+            sys.exit(f"unknown argument: {rest[i]}")
+    if name not in REPORTS:
+        sys.exit(f"unknown report (choose from {', '.join(REPORTS)})")
+    rows = report(db, name, opts)
+    print(json.dumps(rows, indent=2) if opts["json"] else format_rows(rows))
+
+
+if __name__ == "__main__":
+    main()
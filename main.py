@@ -1,27 +1,96 @@
-# Run with: python main.py scenarios.json <scenario_number>
+# Run with: python main.py scenarios.json <scenario_number> [backend]
 # Example: python main.py scenarios.json 1
+# Example: python main.py scenarios.json 5 virtual
 
 # main.py
 from __future__ import annotations
 import os
 import sys
 import json
+from typing import Any, Dict
 
-import winapi
+import backends
 from agent import run_agent
 
 
-def main() -> None:
-    if os.name != "nt":
-        sys.exit("Windows required")
+def default_cfg(backend: Any) -> Dict[str, Any]:
+    return {
+        "endpoint": "http://localhost:1234/v1/chat/completions",
+        "model_id": "qwen/qwen3-vl-2b-instruct",
+        "timeout": 240,
+        "gzip_requests": False,
+        "log_http": True,
+        "stream": False,
+        "stream_include_usage": True,
+        "observe_after_act": False,
+        "tool_call_policy": "sequential",
+        "temperature": 0.2,
+        "max_tokens": 2048,
+        "target_w": None,
+        "target_h": None,
+        "vision_hparams": "model-load-params-Intel-iGPU.txt",
+        "vision_token_budget": 1000,
+        "vision_zoom_budget": 1024,
+        "backend": backend,
+        "encoder_profile": "default",
+        "encoder_options": {},
+        "log_frames": True,
+        "change_detection": True,
+        "change_tile": 32,
+        "dirty_report_max": 0.25,
+        "dump_dir": "dumps",
+        "dump_prefix": "screen_",
+        "dump_start": 1,
+        "dump_format": "png",
+        "dump_retention": "all",
+        "dump_keep": 50,
+        "dump_max_bytes": 0,
+        "dump_queue": 8,
+        "dump_async": True,
+        "archive_dir": None,
+        "max_steps": 15,
+        "history_policy": "checkpoint",
+        "history_keep_images": 1,
+        "history_compact_every": 4,
+        "log_history": True,
+        "context_length": 8192,
+        "context_budget": 0,
+        "context_low_water": 0.6,
+        "context_policies": ["images", "tool_results", "assistant_text", "turns"],
+        "context_keep_turns": 2,
+        "log_budget": True,
+        "trace_dir": "traces",
+        "metrics_file": None,
+        "metrics_interval": 5.0,
+        "log_trace": True,
+        "log_run": True,
+        "step_delay": 0.4,
+        "action_gap": 0.03,
+        "settle_mode": "adaptive",
+        "settle_polls": 2,
+        "settle_interval": 0.02,
+        "settle_max_wait": 0.5,
+        "settle_min_wait": 0.0,
+        "settle_size": [192, 108],
+        "log_settle": True,
+    }
 
-    winapi.init_dpi()
 
+def main() -> None:
     if len(sys.argv) < 3:
-        sys.exit("Usage: python main.py <scenario_file> <scenario_num>")
+        sys.exit("Usage: python main.py <scenario_file> <scenario_num> [backend]")
 
     scenario_file = sys.argv[1]
     scenario_num = int(sys.argv[2])
+    backend_name = sys.argv[3] if len(sys.argv) > 3 else "winapi"
+
+    if backend_name not in backends.BACKENDS:
+        sys.exit(f"Unknown backend (choose from {', '.join(backends.BACKENDS)})")
+    if backend_name == "winapi" and os.name != "nt":
+        sys.exit("Windows required")
+
+    backend = backends.create_backend(backend_name)
+    backend.init()
 
     with open(scenario_file, "r", encoding="utf-8") as f:
         data = json.load(f)
@@ -35,20 +104,7 @@ def main() -> None:
 
     task_prompt = scenarios[scenario_num - 1]["task_prompt"]
 
-    cfg = {
-        "endpoint": "http://localhost:1234/v1/chat/completions",
-        "model_id": "qwen/qwen3-vl-2b-instruct",
-        "timeout": 240,
-        "temperature": 0.2,
-        "max_tokens": 2048,
-        "target_w": 1344,
-        "target_h": 756,
-        "dump_dir": "dumps",
-        "dump_prefix": "screen_",
-        "dump_start": 1,
-        "max_steps": 15,
-        "step_delay": 0.4,
-    }
+    cfg = default_cfg(backend)
 
     final_response = run_agent(system_prompt, task_prompt, tools_schema, cfg)
     print(final_response)
@@ -0,0 +1,130 @@
+# payload.py
+from __future__ import annotations
+import binascii
+import json
+from typing import Any, Dict, List, Tuple
+
+
+class ImageData:
+    # PNG bytes standing in for a data: URL inside a message. The request body
+    # gets the base64 written straight from the bytes; nothing builds the
+    # equivalent str unless something asks for to_json().
+    __slots__ = ("data", "mime")
+
+    def __init__(self, data: bytes, mime: str = "image/png") -> None:
+        self.data = data
+        self.mime = mime
+
+    def to_json(self) -> str:
+        return f"data:{self.mime};base64," + binascii.b2a_base64(
+            self.data, newline=False
+        ).decode("ascii")
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+def json_default(obj: Any) -> Any:
+    if hasattr(obj, "to_json"):
+        return obj.to_json()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _scalar(value: Any) -> bytes:
+    # ASCII escapes: a lone surrogate (the model can emit one in tool
+    # arguments, and results echo them) has no UTF-8 encoding.
+    return json.dumps(value).encode("ascii")
+
+
+def encode_value(value: Any, out: List[bytes]) -> None:
+    if isinstance(value, ImageData):
+        out.append(b'"data:' + value.mime.encode("ascii") + b";base64,")
+        out.append(binascii.b2a_base64(value.data, newline=False))
+        out.append(b'"')
+    elif isinstance(value, dict):
+        out.append(b"{")
+        for i, (k, v) in enumerate(value.items()):
+            out.append((b"," if i else b"") + _scalar(str(k)) + b":")
+            encode_value(v, out)
+        out.append(b"}")
+    elif isinstance(value, (list, tuple)):
+        out.append(b"[")
+        for i, v in enumerate(value):
+            if i:
+                out.append(b",")
+            encode_value(v, out)
+        out.append(b"]")
+    else:
+        out.append(_scalar(value))
+
+
+def encode(value: Any) -> bytes:
+    out: List[bytes] = []
+    encode_value(value, out)
+    return b"".join(out)
+
+
+class PayloadBuilder:
+    # Messages and the tools schema never change once they are in the
+    # history, so each one is serialized once and its bytes spliced into every
+    # later request body.
+    def __init__(self) -> None:
+        self._cache: Dict[int, Tuple[Any, bytes]] = {}
+        self.last_stats: Dict[str, Any] = {}
+        self.totals = {"serialized_bytes": 0, "reused_bytes": 0}
+
+    def _fragment(self, obj: Any, live: Dict[int, Tuple[Any, bytes]]) -> Tuple[bytes, bool]:
+        key = id(obj)
+        hit = self._cache.get(key)
+        if hit is not None and hit[0] is obj:
+            live[key] = hit
+            return hit[1], True
+        frag = encode(obj)
+        live[key] = (obj, frag)
+        return frag, False
+
+    def build(self, payload: Dict[str, Any], **extra: Any) -> bytes:
+        live: Dict[int, Tuple[Any, bytes]] = {}
+        parts: List[bytes] = [b"{"]
+        serialized = reused = 0
+        fragments = hits = 0
+
+        def add(frag: bytes, hit: bool) -> None:
+            nonlocal serialized, reused, fragments, hits
+            fragments += 1
+            if hit:
+                hits += 1
+                reused += len(frag)
+            else:
+                serialized += len(frag)
+            parts.append(frag)
+
+        items = list(payload.items()) + list(extra.items())
+        for i, (key, value) in enumerate(items):
+            parts.append((b"," if i else b"") + _scalar(key) + b":")
+            if key == "messages":
+                parts.append(b"[")
+                for j, msg in enumerate(value):
+                    if j:
+                        parts.append(b",")
+                    add(*self._fragment(msg, live))
+                parts.append(b"]")
+            elif isinstance(value, (dict, list)):
+                add(*self._fragment(value, live))
+            else:
+                frag = _scalar(value)
+                serialized += len(frag)
+                parts.append(frag)
+        parts.append(b"}")
+        self._cache = live
+        body = b"".join(parts)
+        self.totals["serialized_bytes"] += serialized
+        self.totals["reused_bytes"] += reused
+        self.last_stats = {
+            "bytes": len(body),
+            "serialized_bytes": serialized,
+            "reused_bytes": reused,
+            "fragments": fragments,
+            "reused_fragments": hits,
+        }
+        return body
@@ -0,0 +1,222 @@
+# sendinput.py
+from __future__ import annotations
+import ctypes
+import time
+from ctypes import wintypes
+from typing import Any, Callable, List, Tuple
+
+# ULONG_PTR = wintypes.ULONG_PTR
+ULONG_PTR = ctypes.c_ulonglong if ctypes.sizeof(ctypes.c_void_p) == 8 else ctypes.c_ulong
+
+INPUT_MOUSE = 0
+INPUT_KEYBOARD = 1
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_UNICODE = 0x0004
+MOUSEEVENTF_LEFTDOWN = 0x0002
+MOUSEEVENTF_LEFTUP = 0x0004
+MOUSEEVENTF_WHEEL = 0x0800
+WHEEL_DELTA = 120
+
+
+class MOUSEINPUT(ctypes.Structure):
+    _fields_ = [
+        ("dx", wintypes.LONG),
+        ("dy", wintypes.LONG),
+        ("mouseData", wintypes.DWORD),
+        ("dwFlags", wintypes.DWORD),
+        ("time", wintypes.DWORD),
+        ("dwExtraInfo", ULONG_PTR),
+    ]
+
+
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [
+        ("wVk", wintypes.WORD),
+        ("wScan", wintypes.WORD),
+        ("dwFlags", wintypes.DWORD),
+        ("time", wintypes.DWORD),
+        ("dwExtraInfo", ULONG_PTR),
+    ]
+
+
+class HARDWAREINPUT(ctypes.Structure):
+    _fields_ = [
+        ("uMsg", wintypes.DWORD),
+        ("wParamL", wintypes.WORD),
+        ("wParamH", wintypes.WORD),
+    ]
+
+
+class INPUT_I(ctypes.Union):
+    _fields_ = [("mi", MOUSEINPUT), ("ki", KEYBDINPUT), ("hi", HARDWAREINPUT)]
+
+
+class INPUT(ctypes.Structure):
+    _fields_ = [("type", wintypes.DWORD), ("ii", INPUT_I)]
+
+
+def utf16_units(text: str) -> List[Tuple[int, ...]]:
+    # One tuple per character: a single code unit, or a surrogate pair for
+    # characters outside the BMP.
+    data = text.encode("utf-16-le", "surrogatepass")
+    units = [data[i] | (data[i + 1] << 8) for i in range(0, len(data), 2)]
+    out: List[Tuple[int, ...]] = []
+    i = 0
+    while i < len(units):
+        u = units[i]
+        if 0xD800 <= u < 0xDC00 and i + 1 < len(units) and 0xDC00 <= units[i + 1] < 0xE000:
+            out.append((u, units[i + 1]))
+            i += 2
+        else:
+            out.append((u,))
+            i += 1
+    return out
+
+
+class InputBatch:
+    # A contiguous INPUT array plus the offsets where each logical event
+    # group (one character, one click) ends; chunks never split a group.
+    def __init__(self, count: int) -> None:
+        self.array = (INPUT * count)()
+        self.ends: List[int] = []
+        self.n = 0
+
+    def __len__(self) -> int:
+        return self.n
+
+    def key(self, scan: int, flags: int) -> None:
+        i = self.array[self.n]
+        i.type = INPUT_KEYBOARD
+        i.ii.ki.wScan = scan
+        i.ii.ki.dwFlags = flags
+        self.n += 1
+
+    def mouse(self, flags: int, data: int = 0) -> None:
+        i = self.array[self.n]
+        i.type = INPUT_MOUSE
+        i.ii.mi.mouseData = data & 0xFFFFFFFF
+        i.ii.mi.dwFlags = flags
+        self.n += 1
+
+    def end_group(self) -> None:
+        self.ends.append(self.n)
+
+
+def text_batch(text: str) -> InputBatch:
+    chars = utf16_units(text)
+    batch = InputBatch(sum(2 * len(c) for c in chars))
+    for units in chars:
+        # Both halves of a surrogate pair go down before either comes up, so
+        # the target sees the pair as one character.
+        for u in units:
+            batch.key(u, KEYEVENTF_UNICODE)
+        for u in units:
+            batch.key(u, KEYEVENTF_UNICODE | KEYEVENTF_KEYUP)
+        batch.end_group()
+    return batch
+
+
+def click_batch() -> InputBatch:
+    batch = InputBatch(2)
+    batch.mouse(MOUSEEVENTF_LEFTDOWN)
+    batch.mouse(MOUSEEVENTF_LEFTUP)
+    batch.end_group()
+    return batch
+
+
+def scroll_batch(notches: int) -> InputBatch:
+    # One wheel event per notch; some applications ignore deltas above 120.
+    batch = InputBatch(abs(notches))
+    delta = -WHEEL_DELTA if notches > 0 else WHEEL_DELTA
+    for _ in range(abs(notches)):
+        batch.mouse(MOUSEEVENTF_WHEEL, delta)
+        batch.end_group()
+    return batch
+
+
+class InputEngine:
+    # Sends prepared batches through user32.SendInput in as few calls as the
+    # chunk size allows. rate (groups per second, 0 = unlimited) paces slow
+    # targets; user32 can be any object with a SendInput(n, ptr, size).
+    def __init__(
+        self,
+        user32: Any,
+        chunk: int = 512,
+        rate: float = 0.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.user32 = user32
+        self.chunk = max(2, chunk)
+        self.rate = rate
+        self.sleep = sleep
+        self.calls = 0
+
+    def _submit(self, batch: InputBatch, start: int, end: int) -> None:
+        n = end - start
+        size = ctypes.sizeof(INPUT)
+        ptr = ctypes.cast(ctypes.addressof(batch.array) + start * size, ctypes.POINTER(INPUT))
+        sent = self.user32.SendInput(n, ptr, size)
+        self.calls += 1
+        if sent != n:
+            raise RuntimeError(f"SendInput inserted {sent} of {n} events")
+
+    def send(self, batch: InputBatch) -> None:
+        chunk = self.chunk
+        if self.rate > 0:
+            # Pace in ~50 ms slices rather than one call per group.
+            chunk = max(2, min(chunk, int(self.rate * 0.05) * 2))
+        t0 = time.perf_counter()
+        start = done = 0
+        prev = 0
+        for g, end in enumerate(batch.ends):
+            if end - start > chunk and prev > start:
+                self._pace(t0, done)
+                self._submit(batch, start, prev)
+                start = prev
+                done = g
+            prev = end
+        if prev > start:
+            self._pace(t0, done)
+            self._submit(batch, start, prev)
+
+    def _pace(self, t0: float, groups_done: int) -> None:
+        if self.rate > 0:
+            wait = t0 + groups_done / self.rate - time.perf_counter()
+            if wait > 0:
+                self.sleep(wait)
+
+    def type_text(self, text: str) -> None:
+        self.send(text_batch(text))
+
+    def click(self) -> None:
+        self.send(click_batch())
+
+    def scroll(self, notches: int = 1) -> None:
+        self.send(scroll_batch(notches))
+
+
+class RecordingUser32:
+    # Stand-in for user32 that keeps a copy of every INPUT it is handed.
+    def __init__(self) -> None:
+        self.calls: List[List[INPUT]] = []
+
+    def SendInput(self, n: int, ptr: Any, size: int) -> int:
+        if size != ctypes.sizeof(INPUT):
+            return 0
+        self.calls.append([INPUT.from_buffer_copy(ptr[i]) for i in range(n)])
+        return n
+
+    @property
+    def inputs(self) -> List[INPUT]:
+        return [i for call in self.calls for i in call]
+
+    def typed(self) -> str:
+        # Reassembles KEYEVENTF_UNICODE key-downs back into text.
+        units = [
+            i.ii.ki.wScan
+            for i in self.inputs
+            if i.type == INPUT_KEYBOARD and not i.ii.ki.dwFlags & KEYEVENTF_KEYUP
+        ]
+        data = b"".join(u.to_bytes(2, "little") for u in units)
+        return data.decode("utf-16-le", "surrogatepass")
+
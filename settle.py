@@ -0,0 +1,98 @@
+# settle.py
+from __future__ import annotations
+import json
+import sys
+import time
+import zlib
+from typing import Any, Dict, List, Tuple
+
+MODES = ("adaptive", "fixed")
+
+
+class SettleDetector:
+    # Waits for the UI to stop changing after an action. Adaptive mode polls
+    # a small frame from the backend and returns once its hash has held for
+    # `polls` consecutive polls, or after max_wait; fixed mode just sleeps.
+    def __init__(
+        self,
+        backend: Any,
+        mode: str = "adaptive",
+        polls: int = 2,
+        interval: float = 0.02,
+        max_wait: float = 0.5,
+        min_wait: float = 0.0,
+        fixed: float = 0.06,
+        size: Tuple[int, int] = (192, 108),
+        log: bool = False,
+    ) -> None:
+        if mode not in MODES:
+            raise ValueError(f"unknown settle mode: {mode}")
+        self.backend = backend
+        self.mode = mode
+        self.polls = max(1, polls)
+        self.interval = interval
+        self.max_wait = max_wait
+        self.min_wait = min_wait
+        self.fixed = fixed
+        self.size = size
+        self.log = log
+        self.times: Dict[str, List[float]] = {}
+
+    @property
+    def adaptive(self) -> bool:
+        return self.mode == "adaptive"
+
+    def _digest(self) -> int:
+        rgb, _, _ = self.backend.capture_frame(*self.size)
+        return zlib.crc32(rgb)
+
+    def wait(self, action: str) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        polls = 0
+        stable = True
+        if self.mode == "fixed":
+            time.sleep(self.fixed)
+        else:
+            if self.min_wait > 0:
+                time.sleep(self.min_wait)
+            last = self._digest()
+            same = 0
+            deadline = t0 + self.max_wait
+            while same < self.polls:
+                if time.perf_counter() + self.interval > deadline:
+                    stable = False
+                    break
+                time.sleep(self.interval)
+                cur = self._digest()
+                polls += 1
+                same = same + 1 if cur == last else 0
+                last = cur
+        ms = round((time.perf_counter() - t0) * 1000.0, 2)
+        self.times.setdefault(action, []).append(ms)
+        result = {"action": action, "settle_ms": ms, "polls": polls, "stable": stable}
+        if self.log:
+            print(f"[settle] {json.dumps(result)}", file=sys.stderr)
+        return result
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            action: {
+                "n": len(ms),
+                "mean_ms": round(sum(ms) / len(ms), 2),
+                "max_ms": max(ms),
+            }
+            for action, ms in self.times.items()
+        }
+
+
+def from_cfg(cfg: Dict[str, Any], backend: Any) -> SettleDetector:
+    return SettleDetector(
+        backend,
+        mode=cfg.get("settle_mode", "fixed"),
+        polls=cfg.get("settle_polls", 2),
+        interval=cfg.get("settle_interval", 0.02),
+        max_wait=cfg.get("settle_max_wait", 0.5),
+        min_wait=cfg.get("settle_min_wait", 0.0),
+        size=tuple(cfg.get("settle_size", (192, 108))),
+        log=cfg.get("log_settle", False),
+    )
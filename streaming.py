@@ -0,0 +1,127 @@
+# streaming.py
+from __future__ import annotations
+import json
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+def args_complete(arguments: str) -> bool:
+    # Tool arguments are a single JSON object, so once they parse nothing
+    # more can legally follow.
+    try:
+        return isinstance(json.loads(arguments), dict)
+    except json.JSONDecodeError:
+        return False
+
+
+class StreamAssembler:
+    def __init__(
+        self, on_tool_call: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> None:
+        self.on_tool_call = on_tool_call
+        self.content: List[str] = []
+        self.calls: Dict[int, Dict[str, Any]] = {}
+        self.dispatched = 0
+        self.finish_reason: Optional[str] = None
+        self.usage: Optional[Dict[str, Any]] = None
+        self.timings: Optional[Dict[str, Any]] = None
+
+    def feed(self, chunk: Dict[str, Any]) -> bool:
+        got = False
+        # Sent on the last chunk when asked for (stream_options.include_usage);
+        # llama.cpp adds its own prompt/predicted timings the same way.
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        if chunk.get("timings"):
+            self.timings = chunk["timings"]
+        for choice in chunk.get("choices") or []:
+            delta = choice.get("delta") or {}
+            if delta.get("content"):
+                self.content.append(delta["content"])
+                got = True
+            for part in delta.get("tool_calls") or []:
+                idx = part.get("index", len(self.calls))
+                call = self.calls.setdefault(
+                    idx,
+                    {
+                        "id": "",
+                        "type": "function",
+                        "function": {"name": "", "arguments": ""},
+                    },
+                )
+                if part.get("id"):
+                    call["id"] = part["id"]
+                fn = part.get("function") or {}
+                call["function"]["name"] += fn.get("name") or ""
+                call["function"]["arguments"] += fn.get("arguments") or ""
+                got = True
+            if choice.get("finish_reason"):
+                self.finish_reason = choice["finish_reason"]
+        self._dispatch_ready(final=self.finish_reason is not None)
+        return got
+
+    def finish(self) -> None:
+        self._dispatch_ready(final=True)
+
+    def _dispatch_ready(self, final: bool) -> None:
+        order = sorted(self.calls)
+        while self.dispatched < len(order):
+            idx = order[self.dispatched]
+            call = self.calls[idx]
+            # A later index starting also closes this one.
+            ready = final or idx != order[-1] or (
+                call["function"]["name"] and args_complete(call["function"]["arguments"])
+            )
+            if not ready:
+                return
+            if not call["id"]:
+                call["id"] = f"call_{idx}"
+            self.dispatched += 1
+            if self.on_tool_call is not None:
+                self.on_tool_call(call)
+
+    def message(self) -> Dict[str, Any]:
+        msg: Dict[str, Any] = {"role": "assistant", "content": "".join(self.content)}
+        if self.calls:
+            msg["tool_calls"] = [self.calls[i] for i in sorted(self.calls)]
+        return msg
+
+
+def stream_completion(
+    chunks: Iterable[Dict[str, Any]],
+    on_tool_call: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    t0 = time.perf_counter()
+    first_token: Optional[float] = None
+    first_action: Optional[float] = None
+
+    def dispatch(call: Dict[str, Any]) -> None:
+        nonlocal first_action
+        if first_action is None:
+            first_action = time.perf_counter()
+        if on_tool_call is not None:
+            on_tool_call(call)
+
+    asm = StreamAssembler(dispatch)
+    n = 0
+    for chunk in chunks:
+        n += 1
+        now = time.perf_counter()
+        if asm.feed(chunk) and first_token is None:
+            first_token = now
+    asm.finish()
+    t_end = time.perf_counter()
+
+    def ms(t: Optional[float]) -> Optional[float]:
+        return None if t is None else round((t - t0) * 1000.0, 2)
+
+    metrics = {
+        "chunks": n,
+        "ttft_ms": ms(first_token),
+        "tfa_ms": ms(first_action),
+        "total_ms": ms(t_end),
+        "finish_reason": asm.finish_reason,
+        "usage": asm.usage,
+        "timings": asm.timings,
+    }
+    return asm.message(), metrics
@@ -0,0 +1,131 @@
+# test_agent.py
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict, List
+
+import pytest
+
+import agent
+import batch
+import lmstub
+import main
+import vision
+from virtual_desktop import VirtualDesktop
+
+with open(os.path.join(os.path.dirname(__file__), "scenarios.json"), encoding="utf-8") as f:
+    SCENARIOS = json.load(f)
+
+# File Explorer's body at (150, 300), away from the Notepad++ window on top.
+FOCUS_SCRIPT: List[Any] = [
+    [{"name": "move_mouse", "arguments": {"x": 150, "y": 300}}],
+    [
+        {"name": "click_mouse"},
+        {"name": "type_text", "arguments": {"text": "SHOULD_BE_SKIPPED"}},
+        {"name": "take_screenshot"},
+    ],
+    "done",
+]
+
+
+def run_script(tmp_path: Any, script: List[Any], **overrides: Any) -> Dict[str, Any]:
+    desktop = VirtualDesktop()
+    latency = lmstub.LatencyModel(vision.VisionParams(), speed=0)
+    server = lmstub.start(lmstub.ScriptPolicy(script), latency)
+    try:
+        cfg = main.default_cfg(desktop)
+        cfg.update(batch.QUIET)
+        cfg.update(
+            endpoint=server.endpoint,
+            timeout=10,
+            dump_dir=str(tmp_path / "dumps"),
+            trace_dir=str(tmp_path / "traces"),
+            step_delay=0,
+            settle_interval=0,
+        )
+        cfg.update(overrides)
+        report: Dict[str, Any] = {}
+        final = agent.run_agent(
+            SCENARIOS["shared_system_prompt"], "task", SCENARIOS["tools"], cfg, report
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+    return {"final": final, "report": report, "desktop": desktop}
+
+
+@pytest.mark.parametrize("observe", [False, True])
+@pytest.mark.parametrize("stream", [False, True])
+def test_click_that_moves_focus_skips_later_calls(
+    tmp_path: Any, stream: bool, observe: bool
+) -> None:
+    out = run_script(tmp_path, FOCUS_SCRIPT, stream=stream, observe_after_act=observe)
+    desktop = out["desktop"]
+    assert out["final"] == "done"
+    assert desktop.focused.title == "File Explorer"
+    assert not any(kind == "type" for kind, _ in desktop.events)
+    assert out["report"]["skipped_calls"] == 2
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_click_without_focus_change_runs_the_whole_batch(tmp_path: Any, stream: bool) -> None:
+    # Clicking inside the focused Notepad++ window keeps focus where it is.
+    script = [
+        [
+            {"name": "move_mouse", "arguments": {"x": 400, "y": 400}},
+            {"name": "click_mouse"},
+            {"name": "type_text", "arguments": {"text": "kept"}},
+        ],
+        "done",
+    ]
+    out = run_script(tmp_path, script, stream=stream)
+    desktop = out["desktop"]
+    assert out["report"]["skipped_calls"] == 0
+    assert ("type", ("kept", "new 1 - Notepad++")) in desktop.events
+
+
+def test_early_dispatched_action_still_gets_its_frame(tmp_path: Any) -> None:
+    # A streamed type_text starts early without observing; run_tool_calls
+    # captures the one frame once the batch is done.
+    script = [
+        [
+            {"name": "type_text", "arguments": {"text": "a"}},
+            {"name": "type_text", "arguments": {"text": "b"}},
+        ],
+        "done",
+    ]
+    out = run_script(tmp_path, script, stream=True, observe_after_act=True)
+    assert out["report"]["observed_frames"] == 1
+    assert [e for e in out["desktop"].events if e[0] == "type"] == [
+        ("type", ("a", "new 1 - Notepad++")),
+        ("type", ("b", "new 1 - Notepad++")),
+    ]
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_lone_surrogate_in_tool_arguments_does_not_break_requests(
+    tmp_path: Any, stream: bool
+) -> None:
+    # The echoed "Typed: ..." result goes out in the next request body.
+    script = [[{"name": "type_text", "arguments": {"text": "a\ud83d"}}], "done"]
+    out = run_script(tmp_path, script, stream=stream)
+    assert out["final"] == "done"
+    assert ("type", ("a\ud83d", "new 1 - Notepad++")) in out["desktop"].events
+
+
+def test_zoom_never_captures_above_source_resolution(tmp_path: Any) -> None:
+    cfg = main.default_cfg(VirtualDesktop())
+    cfg.update(batch.QUIET, dump_format="none", trace_dir=str(tmp_path / "traces"))
+    tools = agent.ToolExecutor(cfg, cfg["backend"])
+    try:
+        small, _ = tools.zoom(100, 100, 110, 110)
+        thin, _ = tools.zoom(100, 100, 101, 900)
+        full, _ = tools.zoom(0, 0, 1000, 1000)
+    finally:
+        tools.close()
+    assert small == "Zoomed region captured at 20x12 from 20x12 screen pixels."
+    assert thin.startswith("Zoomed region captured at 3x")
+    # A full-screen zoom is downscaled to the zoom token budget.
+    assert full.endswith("from 1920x1080 screen pixels.")
+    assert "captured at 1920x1080" not in full
@@ -0,0 +1,97 @@
+# test_cursor.py
+from __future__ import annotations
+
+from typing import Tuple
+
+import pytest
+
+import cursor
+from virtual_desktop import VirtualDesktop
+
+GREY = (100, 100, 100)
+
+
+def frame(w: int, h: int, color: Tuple[int, int, int] = GREY) -> bytearray:
+    return bytearray(bytes(color) * (w * h))
+
+
+def pixel(fb: bytearray, w: int, x: int, y: int) -> Tuple[int, int, int]:
+    off = (y * w + x) * 3
+    return fb[off], fb[off + 1], fb[off + 2]
+
+
+def test_composite_copies_opaque_pixels_and_leaves_transparent_ones() -> None:
+    sprite = cursor.sprite_from_rows(("X.o", "oX."))
+    fb = frame(8, 6)
+    cursor.composite(fb, 8, 6, cursor.Prepared(sprite), 2, 3)
+    assert pixel(fb, 8, 2, 3) == (0, 0, 0)
+    assert pixel(fb, 8, 3, 3) == GREY
+    assert pixel(fb, 8, 4, 3) == (255, 255, 255)
+    assert pixel(fb, 8, 2, 4) == (255, 255, 255)
+    assert pixel(fb, 8, 3, 4) == (0, 0, 0)
+    assert pixel(fb, 8, 4, 4) == GREY
+    # Nothing outside the sprite's box is touched.
+    box = {(x, y) for y in (3, 4) for x in (2, 3, 4)}
+    rest = {pixel(fb, 8, x, y) for y in range(6) for x in range(8) if (x, y) not in box}
+    assert rest == {GREY}
+
+
+def test_composite_blends_partially_transparent_pixels() -> None:
+    rgba = bytes((200, 0, 50, 128))
+    fb = frame(1, 1, (0, 100, 250))
+    cursor.composite(fb, 1, 1, cursor.Prepared(cursor.Sprite(1, 1, rgba)), 0, 0)
+    assert pixel(fb, 1, 0, 0) == (100, 50, 150)
+
+
+def test_composite_clips_to_the_frame() -> None:
+    sprite = cursor.sprite_from_rows(("XXX", "XXX", "XXX"))
+    fb = frame(4, 4)
+    cursor.composite(fb, 4, 4, cursor.Prepared(sprite), -1, 2)
+    drawn = {(x, y) for y in range(4) for x in range(4) if pixel(fb, 4, x, y) == (0, 0, 0)}
+    assert drawn == {(0, 2), (1, 2), (0, 3), (1, 3)}
+    assert len(fb) == 4 * 4 * 3
+
+
+def test_overlay_aligns_hotspot_and_scales_the_sprite() -> None:
+    sprite = cursor.sprite_from_rows(("XXXX",) * 4, hot_x=2, hot_y=2)
+    overlay = cursor.CursorOverlay(loader=lambda handle: sprite)
+    fb = frame(10, 10)
+    overlay.draw(fb, 10, 10, 1, 5, 5, sx=0.5, sy=0.5)
+    drawn = {(x, y) for y in range(10) for x in range(10) if pixel(fb, 10, x, y) == (0, 0, 0)}
+    # Half size: 2x2 with the hotspot at (1, 1), on the pointer at (5, 5).
+    assert drawn == {(4, 4), (5, 4), (4, 5), (5, 5)}
+
+
+def test_overlay_caches_per_handle_and_never_goes_below_min_scale() -> None:
+    loads = []
+
+    def loader(handle: int) -> cursor.Sprite:
+        loads.append(handle)
+        return cursor.sprite_from_rows(("XXXX",) * 4)
+
+    overlay = cursor.CursorOverlay(loader=loader, min_scale=0.5)
+    for _ in range(3):
+        overlay.draw(frame(20, 20), 20, 20, 7, 0, 0, sx=0.1, sy=0.1)
+    assert loads == [7]
+    assert overlay.stats["misses"] == 1 and overlay.stats["hits"] == 2
+    prep = overlay.prepared(7, 0.1, 0.1)
+    assert (prep.w, prep.h) == (2, 2)
+
+
+@pytest.mark.parametrize("handle", [0, 5])
+def test_overlay_falls_back_to_the_arrow(handle: int) -> None:
+    # No handle, or one the loader cannot read.
+    overlay = cursor.CursorOverlay(loader=lambda h: None)
+    assert overlay.sprite(handle) is cursor.ARROW
+    assert overlay.stats["load_failures"] == (1 if handle else 0)
+
+
+def test_virtual_desktop_frames_carry_the_cursor() -> None:
+    desktop = VirtualDesktop(windows=[], cursor=[400, 300])
+    w, h = 960, 540
+    rgb, _, _ = desktop.capture_frame(w, h)
+    # The arrow's tip (its hotspot) sits on the pointer, halved with the frame.
+    assert pixel(bytearray(rgb), w, 200, 150) == (0, 0, 0)
+    desktop.move_mouse_norm(0, 0)
+    moved, _, _ = desktop.capture_frame(w, h)
+    assert pixel(bytearray(moved), w, 200, 150) != (0, 0, 0)
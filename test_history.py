@@ -0,0 +1,75 @@
+# test_history.py
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import agent
+import history as history_mod
+
+
+def call(call_id: str, name: str) -> Dict[str, Any]:
+    return {"id": call_id, "type": "function", "function": {"name": name, "arguments": "{}"}}
+
+
+def step(n: int, names: List[str], screens: List[str]) -> List[Dict[str, Any]]:
+    # One step in run_agent's layout: the assistant message, every tool
+    # result, then the images.
+    calls = [call(f"c{n}_{i}", name) for i, name in enumerate(names)]
+    msgs: List[Dict[str, Any]] = [{"role": "assistant", "content": "", "tool_calls": calls}]
+    for c in calls:
+        name = c["function"]["name"]
+        msgs.append({"role": "tool", "tool_call_id": c["id"], "name": name, "content": "ok"})
+    msgs += [agent.image_message(text, b"png") for text in screens]
+    return msgs
+
+
+def image_texts(messages: List[Dict[str, Any]]) -> List[str]:
+    return [m["content"][0]["text"] for m in messages if history_mod.is_image_message(m)]
+
+
+def run(steps: List[List[Dict[str, Any]]]) -> history_mod.History:
+    h = history_mod.History(
+        [{"role": "system", "content": "sys"}, {"role": "user", "content": "task"}],
+        policy="prune",
+        prune=agent.prune_old_screenshots,
+    )
+    for msgs in steps:
+        for msg in msgs:
+            h.append(msg)
+    return h
+
+
+def test_prune_keeps_only_the_newest_screen_across_multi_call_steps() -> None:
+    h = run(
+        [
+            step(1, ["move_mouse", "click_mouse", "take_screenshot"], ["Screen 1:"]),
+            step(2, ["type_text", "take_screenshot"], ["Screen 2:"]),
+        ]
+    )
+    assert image_texts(h.messages) == ["Screen 2:"]
+    # Every call still has its result.
+    results = {m["tool_call_id"] for m in h.messages if m["role"] == "tool"}
+    calls = {c["id"] for m in h.messages if m["role"] == "assistant" for c in m["tool_calls"]}
+    assert results == calls
+
+
+def test_prune_drops_observe_frames_after_actions() -> None:
+    h = run([step(n, ["move_mouse", "click_mouse"], [f"Screen {n}:"]) for n in range(1, 4)])
+    assert image_texts(h.messages) == ["Screen 3:"]
+
+
+def test_prune_keeps_zoom_crops_taken_after_the_newest_screen() -> None:
+    h = run(
+        [
+            step(1, ["take_screenshot"], ["Screen 1:"]),
+            step(2, ["zoom_region"], [f"{history_mod.ZOOM_PREFIX} (0, 0) to (10, 10):"]),
+        ]
+    )
+    assert image_texts(h.messages) == ["Screen 1:", "Zoomed region (0, 0) to (10, 10):"]
+    h = run(
+        [
+            step(1, ["zoom_region"], [f"{history_mod.ZOOM_PREFIX} (0, 0) to (10, 10):"]),
+            step(2, ["take_screenshot"], ["Screen 2:"]),
+        ]
+    )
+    assert image_texts(h.messages) == ["Screen 2:"]
@@ -0,0 +1,78 @@
+# test_lmclient.py
+from __future__ import annotations
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator, List, Tuple
+
+import pytest
+
+import lmclient
+
+
+def serve(status: int, message: str) -> Tuple[ThreadingHTTPServer, List[str]]:
+    # Answers gzip bodies with status/message and plain ones with a completion.
+    seen: List[str] = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def do_POST(self) -> None:
+            self.rfile.read(int(self.headers["Content-Length"]))
+            encoding = self.headers.get("Content-Encoding", "identity")
+            seen.append(encoding)
+            if encoding == "gzip":
+                code, body = status, json.dumps({"error": message})
+            else:
+                code, body = 200, json.dumps({"choices": [{"message": {"content": "ok"}}]})
+            data = body.encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, seen
+
+
+@pytest.fixture
+def servers() -> Iterator[List[ThreadingHTTPServer]]:
+    started: List[ThreadingHTTPServer] = []
+    yield started
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize(
+    "status, message",
+    [(415, "Unsupported Media Type"), (400, "unsupported Content-Encoding: gzip")],
+)
+def test_gzip_falls_back_when_the_server_rejects_the_encoding(
+    servers: List[ThreadingHTTPServer], status: int, message: str
+) -> None:
+    server, seen = serve(status, message)
+    servers.append(server)
+    client = lmclient.LMClient(f"http://127.0.0.1:{server.server_port}/v1", gzip_body=True)
+    assert client.post({"messages": []})["choices"][0]["message"]["content"] == "ok"
+    assert seen == ["gzip", "identity"]
+    assert client.gzip_body is False
+
+
+def test_other_400s_are_not_resent_and_keep_gzip_on(servers: List[ThreadingHTTPServer]) -> None:
+    server, seen = serve(400, "context length exceeded")
+    servers.append(server)
+    client = lmclient.LMClient(f"http://127.0.0.1:{server.server_port}/v1", gzip_body=True)
+    with pytest.raises(RuntimeError, match="HTTP 400: .*context length"):
+        client.post({"messages": []})
+    assert seen == ["gzip"]
+    assert client.gzip_body is True
+
+
+def test_dumps_compact_escapes_lone_surrogates() -> None:
+    body = lmclient.dumps_compact({"content": "Typed: a\ud83d é"})
+    assert json.loads(body) == {"content": "Typed: a\ud83d é"}
@@ -0,0 +1,61 @@
+# test_sendinput.py
+from __future__ import annotations
+
+import sendinput
+
+
+def test_typed_text_round_trips_through_input_array() -> None:
+    user32 = sendinput.RecordingUser32()
+    engine = sendinput.InputEngine(user32, chunk=4)
+    text = "héllo 😀 wörld"
+    engine.type_text(text)
+    assert user32.typed() == text
+    assert engine.calls == len(user32.calls) > 1
+    for call in user32.calls:
+        # Every call carries whole characters: each key-down has its key-up.
+        up = [bool(i.ii.ki.dwFlags & sendinput.KEYEVENTF_KEYUP) for i in call]
+        downs = [i.ii.ki.wScan for i, u in zip(call, up) if not u]
+        ups = [i.ii.ki.wScan for i, u in zip(call, up) if u]
+        assert downs == ups
+    for i in user32.inputs:
+        assert i.type == sendinput.INPUT_KEYBOARD
+        assert i.ii.ki.wVk == 0
+        assert i.ii.ki.dwFlags & sendinput.KEYEVENTF_UNICODE
+
+
+def test_surrogate_pair_goes_down_before_either_half_comes_up() -> None:
+    user32 = sendinput.RecordingUser32()
+    sendinput.InputEngine(user32).type_text("😀")
+    keys = [
+        (i.ii.ki.wScan, bool(i.ii.ki.dwFlags & sendinput.KEYEVENTF_KEYUP)) for i in user32.inputs
+    ]
+    assert keys == [(0xD83D, False), (0xDE00, False), (0xD83D, True), (0xDE00, True)]
+
+
+def test_click_is_one_call_with_down_then_up() -> None:
+    user32 = sendinput.RecordingUser32()
+    sendinput.InputEngine(user32).click()
+    assert len(user32.calls) == 1
+    assert [(i.type, i.ii.mi.dwFlags) for i in user32.inputs] == [
+        (sendinput.INPUT_MOUSE, sendinput.MOUSEEVENTF_LEFTDOWN),
+        (sendinput.INPUT_MOUSE, sendinput.MOUSEEVENTF_LEFTUP),
+    ]
+
+
+def test_scroll_sends_one_wheel_notch_per_event() -> None:
+    user32 = sendinput.RecordingUser32()
+    sendinput.InputEngine(user32).scroll(3)
+    assert [(i.ii.mi.dwFlags, i.ii.mi.mouseData) for i in user32.inputs] == [
+        (sendinput.MOUSEEVENTF_WHEEL, (-sendinput.WHEEL_DELTA) & 0xFFFFFFFF)
+    ] * 3
+
+
+def test_rate_limit_paces_between_calls() -> None:
+    waits = []
+    user32 = sendinput.RecordingUser32()
+    # 40 characters a second paces in 50 ms slices of two characters.
+    engine = sendinput.InputEngine(user32, rate=40, sleep=waits.append)
+    engine.type_text("abcdef")
+    assert user32.typed() == "abcdef"
+    assert len(user32.calls) == 3
+    assert waits and all(w > 0 for w in waits)
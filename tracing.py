@@ -0,0 +1,186 @@
+# Run with: python tracing.py traces/<run>.jsonl [more.jsonl ...]
+# Prints the per-phase percentile summary of recorded agent traces.
+
+# tracing.py
+from __future__ import annotations
+import itertools
+import json
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+_runs = itertools.count(1)
+
+# Attributes summed into counters alongside the timings.
+COUNTED = ("bytes", "prompt_tokens", "completion_tokens")
+
+
+def percentile(sorted_ms: List[float], q: float) -> float:
+    # Nearest rank; traces are small enough that interpolation buys nothing.
+    if not sorted_ms:
+        return 0.0
+    k = max(0, min(len(sorted_ms) - 1, math.ceil(q * len(sorted_ms)) - 1))
+    return sorted_ms[k]
+
+
+def summarize(spans: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    by_phase: Dict[str, List[Dict[str, Any]]] = {}
+    for s in spans:
+        by_phase.setdefault(s["phase"], []).append(s)
+    out: Dict[str, Dict[str, Any]] = {}
+    for phase, items in by_phase.items():
+        ms = sorted(s["ms"] for s in items)
+        row: Dict[str, Any] = {"n": len(ms), "total_ms": round(sum(ms), 2)}
+        for q in QUANTILES:
+            row[f"p{int(q * 100)}_ms"] = round(percentile(ms, q), 2)
+        row["max_ms"] = round(ms[-1], 2)
+        for key in COUNTED:
+            total = sum(s.get(key) or 0 for s in items)
+            if total:
+                row[key] = total
+        out[phase] = row
+    return out
+
+
+def format_summary(summary: Dict[str, Dict[str, Any]]) -> str:
+    cols = ["n", "total_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms"]
+    lines = [f"{'phase':<20}" + "".join(f"{c:>11}" for c in cols)]
+    for phase, row in sorted(summary.items(), key=lambda kv: -kv[1]["total_ms"]):
+        lines.append(f"{phase:<20}" + "".join(f"{row[c]:>11}" for c in cols))
+    return "\n".join(lines)
+
+
+class Tracer:
+    # Collects timed spans for one run. Each span is appended to a JSONL file
+    # as it finishes, and an optional Prometheus text file is rewritten every
+    # metrics_interval seconds so long runs can be watched while they go.
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        metrics_path: Optional[str] = None,
+        metrics_interval: float = 5.0,
+        run_id: Optional[str] = None,
+    ) -> None:
+        self.run_id = run_id or new_run_id()
+        self.path = path
+        self.metrics_path = metrics_path
+        self.metrics_interval = metrics_interval
+        self.step = 0
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._file = None
+        self._last_metrics = 0.0
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def record(self, phase: str, ms: float, step: Optional[int] = None, **attrs: Any) -> None:
+        span = {"run": self.run_id, "step": self.step if step is None else step, "phase": phase}
+        span["ms"] = round(ms, 3)
+        span.update((k, v) for k, v in attrs.items() if v is not None)
+        with self._lock:
+            self.spans.append(span)
+            if self._file is not None:
+                self._file.write(json.dumps(span) + "\n")
+        if self.metrics_path and time.monotonic() - self._last_metrics >= self.metrics_interval:
+            self.write_metrics()
+
+    @contextmanager
+    def span(self, phase: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+        # The yielded dict takes attributes known only at the end (bytes...).
+        t0 = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            self.record(phase, (time.perf_counter() - t0) * 1000.0, **attrs)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            spans = list(self.spans)
+        return summarize(spans)
+
+    def prometheus(self) -> str:
+        summary = self.summary()
+        lines = [
+            "# HELP agent_phase_seconds Time spent in each phase of the agent loop.",
+            "# TYPE agent_phase_seconds summary",
+        ]
+        for phase, row in sorted(summary.items()):
+            for q in QUANTILES:
+                value = round(row[f"p{int(q * 100)}_ms"] / 1000.0, 6)
+                lines.append(f'agent_phase_seconds{{phase="{phase}",quantile="{q}"}} {value}')
+            total = round(row["total_ms"] / 1000.0, 6)
+            lines.append(f'agent_phase_seconds_sum{{phase="{phase}"}} {total}')
+            lines.append(f'agent_phase_seconds_count{{phase="{phase}"}} {row["n"]}')
+        for key in COUNTED:
+            name = "agent_bytes_total" if key == "bytes" else f"agent_{key}_total"
+            rows = [(p, r[key]) for p, r in sorted(summary.items()) if key in r]
+            if rows:
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f'{name}{{phase="{p}"}} {v}' for p, v in rows)
+        lines.append("# TYPE agent_steps_total counter")
+        lines.append(f"agent_steps_total {self.step}")
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self) -> None:
+        # Written aside and renamed so a scraper never reads half a file.
+        with self._metrics_lock:
+            self._last_metrics = time.monotonic()
+            tmp = self.metrics_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.prometheus())
+            os.replace(tmp, self.metrics_path)
+
+    def close(self) -> Dict[str, Dict[str, Any]]:
+        if self.metrics_path:
+            self.write_metrics()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        return self.summary()
+
+
+def new_run_id() -> str:
+    # Unique across concurrent runs in one process and across processes.
+    return f"{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{next(_runs)}"
+
+
+def from_cfg(cfg: Dict[str, Any]) -> Tracer:
+    run_id = new_run_id()
+    trace_dir = cfg.get("trace_dir")
+    path = os.path.join(trace_dir, f"run_{run_id}.jsonl") if trace_dir else None
+    return Tracer(
+        path,
+        cfg.get("metrics_file"),
+        cfg.get("metrics_interval", 5.0),
+        run_id,
+    )
+
+
+def load(paths: List[str]) -> List[Dict[str, Any]]:
+    spans = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    spans.append(json.loads(line))
+    return spans
+
+
+def main() -> None:
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python tracing.py <trace.jsonl> [more.jsonl ...]")
+    print(format_summary(summarize(load(sys.argv[1:]))))
+
+
+if __name__ == "__main__":
+    main()
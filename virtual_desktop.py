@@ -0,0 +1,312 @@
+# virtual_desktop.py
+from __future__ import annotations
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from backends import Backend, norm_to_screen_px
+from cursor import CursorOverlay
+
+Color = Tuple[int, int, int]
+
+DESKTOP_BG: Color = (0, 90, 158)
+TASKBAR_BG: Color = (32, 32, 32)
+TASKBAR_H = 48
+TITLE_H = 30
+TITLE_BG: Color = (230, 230, 230)
+TITLE_BG_FOCUS: Color = (200, 220, 245)
+TITLE_FG: Color = (0, 0, 0)
+CLOSE_BG: Color = (196, 43, 28)
+BORDER: Color = (110, 110, 110)
+WINDOW_BG: Color = (255, 255, 255)
+TEXT_FG: Color = (20, 20, 20)
+CARET: Color = (0, 0, 0)
+
+GLYPH_PX = 3
+CHAR_ADV = 4 * GLYPH_PX
+LINE_H = 7 * GLYPH_PX
+PAD = 8
+SCROLL_LINES = 3
+
+_FONT_ROWS = {
+    "A": ("###", "#.#", "###", "#.#", "#.#"),
+    "B": ("##.", "#.#", "##.", "#.#", "##."),
+    "C": ("###", "#..", "#..", "#..", "###"),
+    "D": ("##.", "#.#", "#.#", "#.#", "##."),
+    "E": ("###", "#..", "##.", "#..", "###"),
+    "F": ("###", "#..", "##.", "#..", "#.."),
+    "G": ("###", "#..", "#.#", "#.#", "###"),
+    "H": ("#.#", "#.#", "###", "#.#", "#.#"),
+    "I": ("###", ".#.", ".#.", ".#.", "###"),
+    "J": ("..#", "..#", "..#", "#.#", "###"),
+    "K": ("#.#", "#.#", "##.", "#.#", "#.#"),
+    "L": ("#..", "#..", "#..", "#..", "###"),
+    "M": ("#.#", "###", "###", "#.#", "#.#"),
+    "N": ("##.", "#.#", "#.#", "#.#", "#.#"),
+    "O": ("###", "#.#", "#.#", "#.#", "###"),
+    "P": ("###", "#.#", "###", "#..", "#.."),
+    "Q": ("###", "#.#", "#.#", "###", "..#"),
+    "R": ("###", "#.#", "##.", "#.#", "#.#"),
+    "S": ("###", "#..", "###", "..#", "###"),
+    "T": ("###", ".#.", ".#.", ".#.", ".#."),
+    "U": ("#.#", "#.#", "#.#", "#.#", "###"),
+    "V": ("#.#", "#.#", "#.#", "#.#", ".#."),
+    "W": ("#.#", "#.#", "###", "###", "#.#"),
+    "X": ("#.#", "#.#", ".#.", "#.#", "#.#"),
+    "Y": ("#.#", "#.#", ".#.", ".#.", ".#."),
+    "Z": ("###", "..#", ".#.", "#..", "###"),
+    "0": ("###", "#.#", "#.#", "#.#", "###"),
+    "1": (".#.", "##.", ".#.", ".#.", "###"),
+    "2": ("###", "..#", "###", "#..", "###"),
+    "3": ("###", "..#", "###", "..#", "###"),
+    "4": ("#.#", "#.#", "###", "..#", "..#"),
+    "5": ("###", "#..", "###", "..#", "###"),
+    "6": ("###", "#..", "###", "#.#", "###"),
+    "7": ("###", "..#", "..#", "..#", "..#"),
+    "8": ("###", "#.#", "###", "#.#", "###"),
+    "9": ("###", "#.#", "###", "..#", "###"),
+    ".": ("...", "...", "...", "...", ".#."),
+    ",": ("...", "...", "...", ".#.", "#.."),
+    ":": ("...", ".#.", "...", ".#.", "..."),
+    "-": ("...", "...", "###", "...", "..."),
+    "+": ("...", ".#.", "###", ".#.", "..."),
+    "_": ("...", "...", "...", "...", "###"),
+    "/": ("..#", "..#", ".#.", "#..", "#.."),
+    "'": (".#.", ".#.", "...", "...", "..."),
+    "!": (".#.", ".#.", ".#.", "...", ".#."),
+    "?": ("###", "..#", ".##", "...", ".#."),
+    "(": (".#.", "#..", "#..", "#..", ".#."),
+    ")": (".#.", "..#", "..#", "..#", ".#."),
+}
+_UNKNOWN = ("###", "###", "###", "###", "###")
+
+def _sprite_cells(rows: Tuple[str, ...], mark: str) -> List[Tuple[int, int]]:
+    return [(x, y) for y, r in enumerate(rows) for x, c in enumerate(r) if c == mark]
+
+
+FONT = {ch: _sprite_cells(rows, "#") for ch, rows in _FONT_ROWS.items()}
+UNKNOWN_GLYPH = _sprite_cells(_UNKNOWN, "#")
+
+
+class Window:
+    def __init__(
+        self,
+        title: str,
+        rect: List[int],
+        lines: Optional[List[str]] = None,
+        editable: bool = True,
+        bg: Color = WINDOW_BG,
+    ) -> None:
+        self.title = title
+        self.x, self.y, self.w, self.h = (int(v) for v in rect)
+        self.lines = list(lines or [""])
+        self.editable = editable
+        self.bg = tuple(bg)
+        self.scroll = 0
+        self.caret = 0
+
+    def contains(self, x: int, y: int) -> bool:
+        return self.x <= x < self.x + self.w and self.y <= y < self.y + self.h
+
+    def in_title(self, x: int, y: int) -> bool:
+        return self.contains(x, y) and y < self.y + TITLE_H
+
+    def in_close(self, x: int, y: int) -> bool:
+        return self.in_title(x, y) and x >= self.x + self.w - TITLE_H
+
+    def visible_lines(self) -> int:
+        return max(1, (self.h - TITLE_H - 2 * PAD) // LINE_H)
+
+    def line_at(self, y: int) -> int:
+        row = (y - self.y - TITLE_H - PAD) // LINE_H
+        return max(0, min(len(self.lines) - 1, self.scroll + row))
+
+
+DEFAULT_WINDOWS: List[Dict[str, Any]] = [
+    {
+        "title": "File Explorer",
+        "rect": [120, 90, 760, 520],
+        "lines": ["Documents", "Downloads", "Pictures", "Music", "Videos"],
+        "editable": False,
+    },
+    {
+        "title": "new 1 - Notepad++",
+        "rect": [560, 220, 1100, 680],
+        "lines": ["Notes:", "- buy milk", "- call back"] + [""] * 30,
+        "editable": True,
+    },
+]
+
+
+class VirtualDesktop(Backend):
+    name = "virtual"
+
+    def __init__(
+        self,
+        width: int = 1920,
+        height: int = 1080,
+        windows: Optional[List[Dict[str, Any]]] = None,
+        cursor: Optional[List[int]] = None,
+    ) -> None:
+        self.width = int(width)
+        self.height = int(height)
+        specs = DEFAULT_WINDOWS if windows is None else windows
+        self.windows = [Window(**spec) for spec in specs]
+        self.cursor_x, self.cursor_y = cursor or (self.width // 2, self.height // 2)
+        self.events: List[Tuple[str, Any]] = []
+        self.version = 0
+        self._lock = threading.Lock()
+        self._cache: Dict[Tuple[int, int], Tuple[int, bytes]] = {}
+        self.overlay = CursorOverlay()
+
+    @property
+    def focused(self) -> Optional[Window]:
+        return self.windows[-1] if self.windows else None
+
+    def window_at(self, x: int, y: int) -> Optional[Window]:
+        for win in reversed(self.windows):
+            if win.contains(x, y):
+                return win
+        return None
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        return self.width, self.height
+
+    def focus_token(self) -> int:
+        with self._lock:
+            return id(self.focused)
+
+    def move_mouse_norm(self, xn: float, yn: float) -> Tuple[int, int]:
+        x, y = norm_to_screen_px(xn, yn, self.width, self.height)
+        with self._lock:
+            self.cursor_x, self.cursor_y = x, y
+            self.events.append(("move", (x, y)))
+        return self.width, self.height
+
+    def click_mouse(self) -> None:
+        with self._lock:
+            x, y = self.cursor_x, self.cursor_y
+            win = self.window_at(x, y)
+            self.events.append(("click", (x, y, win.title if win else None)))
+            if win is None:
+                return
+            self.windows.remove(win)
+            if win.in_close(x, y):
+                self.version += 1
+                return
+            self.windows.append(win)
+            if win.editable and not win.in_title(x, y):
+                win.caret = win.line_at(y)
+            self.version += 1
+
+    def type_text(self, text: str) -> None:
+        with self._lock:
+            win = self.focused
+            self.events.append(("type", (text, win.title if win else None)))
+            if win is None or not win.editable:
+                return
+            parts = text.split("\n")
+            win.lines[win.caret] += parts[0]
+            for part in parts[1:]:
+                win.caret += 1
+                win.lines.insert(win.caret, part)
+            self.version += 1
+
+    def scroll_down(self, notches: int = 1) -> None:
+        with self._lock:
+            win = self.window_at(self.cursor_x, self.cursor_y)
+            for _ in range(notches):
+                self.events.append(("scroll", win.title if win else None))
+            if win is None:
+                return
+            limit = max(0, len(win.lines) - win.visible_lines())
+            scroll = min(limit, win.scroll + SCROLL_LINES * notches)
+            if scroll != win.scroll:
+                win.scroll = scroll
+                self.version += 1
+
+    def capture_frame(self, target_w: int, target_h: int) -> Tuple[bytes, int, int]:
+        with self._lock:
+            cached = self._cache.get((target_w, target_h))
+            if cached is None or cached[0] != self.version:
+                cached = (self.version, self.render(target_w, target_h))
+                self._cache[(target_w, target_h)] = cached
+            fb = bytearray(cached[1])
+            self._draw_cursor(fb, target_w, target_h)
+        return bytes(fb), self.width, self.height
+
+    def capture_region(
+        self, x: int, y: int, w: int, h: int, target_w: int, target_h: int
+    ) -> bytes:
+        region = (x, y, w, h)
+        with self._lock:
+            fb = bytearray(self.render(target_w, target_h, region))
+            self._draw_cursor(fb, target_w, target_h, region)
+        return bytes(fb)
+
+    def render(
+        self,
+        target_w: int,
+        target_h: int,
+        region: Optional[Tuple[int, int, int, int]] = None,
+    ) -> bytes:
+        rx, ry, rw, rh = region or (0, 0, self.width, self.height)
+        sx = target_w / float(rw)
+        sy = target_h / float(rh)
+        fb = bytearray(bytes(DESKTOP_BG) * (target_w * target_h))
+
+        def fill(x: int, y: int, w: int, h: int, color: Color) -> None:
+            x0 = max(0, int(round((x - rx) * sx)))
+            y0 = max(0, int(round((y - ry) * sy)))
+            x1 = min(target_w, int(round((x + w - rx) * sx)))
+            y1 = min(target_h, int(round((y + h - ry) * sy)))
+            if x1 <= x0 or y1 <= y0:
+                return
+            span = bytes(color) * (x1 - x0)
+            for yy in range(y0, y1):
+                off = (yy * target_w + x0) * 3
+                fb[off : off + len(span)] = span
+
+        def text(x: int, y: int, s: str, color: Color, max_w: int) -> None:
+            for i, ch in enumerate(s[: max(0, max_w // CHAR_ADV)]):
+                if ch == " ":
+                    continue
+                cx = x + i * CHAR_ADV
+                for gx, gy in FONT.get(ch.upper(), UNKNOWN_GLYPH):
+                    fill(cx + gx * GLYPH_PX, y + gy * GLYPH_PX, GLYPH_PX, GLYPH_PX, color)
+
+        fill(0, self.height - TASKBAR_H, self.width, TASKBAR_H, TASKBAR_BG)
+        for i, win in enumerate(self.windows):
+            text(PAD + i * 200, self.height - TASKBAR_H + 14, win.title, WINDOW_BG, 190)
+
+        for win in self.windows:
+            focus = win is self.focused
+            fill(win.x - 1, win.y - 1, win.w + 2, win.h + 2, BORDER)
+            fill(win.x, win.y, win.w, TITLE_H, TITLE_BG_FOCUS if focus else TITLE_BG)
+            fill(win.x + win.w - TITLE_H, win.y, TITLE_H, TITLE_H, CLOSE_BG)
+            text(win.x + PAD, win.y + 8, win.title, TITLE_FG, win.w - TITLE_H - 2 * PAD)
+            fill(win.x, win.y + TITLE_H, win.w, win.h - TITLE_H, win.bg)
+            top = win.y + TITLE_H + PAD
+            shown = win.lines[win.scroll : win.scroll + win.visible_lines()]
+            for row, line in enumerate(shown):
+                text(win.x + PAD, top + row * LINE_H, line, TEXT_FG, win.w - 2 * PAD)
+            caret_row = win.caret - win.scroll
+            if focus and win.editable and 0 <= caret_row < len(shown):
+                cx = win.x + PAD + len(win.lines[win.caret]) * CHAR_ADV
+                if cx < win.x + win.w - PAD:
+                    fill(cx, top + caret_row * LINE_H - 2, 2, LINE_H, CARET)
+        return bytes(fb)
+
+    def _draw_cursor(
+        self,
+        fb: bytearray,
+        target_w: int,
+        target_h: int,
+        region: Optional[Tuple[int, int, int, int]] = None,
+    ) -> None:
+        # The same sprite path the Windows backend uses, with the fallback arrow.
+        rx, ry, rw, rh = region or (0, 0, self.width, self.height)
+        sx = target_w / float(rw)
+        sy = target_h / float(rh)
+        x = (self.cursor_x - rx) * sx
+        y = (self.cursor_y - ry) * sy
+        self.overlay.draw(fb, target_w, target_h, None, x, y, sx, sy)
@@ -0,0 +1,89 @@
+# vision.py
+from __future__ import annotations
+import math
+import os
+import re
+from typing import Any, Dict, Optional, Tuple
+
+_HPARAM = re.compile(r"^\s*load_hparams:\s*(\w+):\s*(\d+)\s*$")
+
+
+class VisionParams:
+    # Geometry of a ViT-style vision encoder that cuts the image into
+    # patch_size squares and merges n_merge x n_merge of them into one LM
+    # token. Sizes are snapped to that grid the same way the server does
+    # before the image is encoded.
+    def __init__(
+        self,
+        patch_size: int = 16,
+        n_merge: int = 2,
+        min_pixels: int = 8192,
+        max_pixels: int = 4194304,
+    ) -> None:
+        self.patch_size = patch_size
+        self.n_merge = n_merge
+        self.min_pixels = min_pixels
+        self.max_pixels = max_pixels
+
+    @property
+    def grid(self) -> int:
+        return self.patch_size * self.n_merge
+
+    def resize(self, w: int, h: int) -> Tuple[int, int]:
+        # The size the server actually encodes for a w x h image.
+        f = self.grid
+        rw = max(f, round(w / f) * f)
+        rh = max(f, round(h / f) * f)
+        if rw * rh > self.max_pixels:
+            beta = math.sqrt(w * h / self.max_pixels)
+            rw = max(f, math.floor(w / beta / f) * f)
+            rh = max(f, math.floor(h / beta / f) * f)
+        elif rw * rh < self.min_pixels:
+            beta = math.sqrt(self.min_pixels / (w * h))
+            rw = math.ceil(w * beta / f) * f
+            rh = math.ceil(h * beta / f) * f
+        return rw, rh
+
+    def tokens(self, w: int, h: int) -> int:
+        rw, rh = self.resize(w, h)
+        return (rw // self.grid) * (rh // self.grid)
+
+    def plan(self, src_w: int, src_h: int, budget: int) -> Tuple[int, int]:
+        # Largest grid-aligned size with the source aspect ratio that costs at
+        # most `budget` tokens. A source already under budget is only snapped
+        # to the grid, as the server would do anyway.
+        if self.tokens(src_w, src_h) <= budget:
+            return self.resize(src_w, src_h)
+        f = self.grid
+        scale = min(1.0, math.sqrt(budget * f * f / float(src_w * src_h)))
+        w = max(f, int(src_w * scale) // f * f)
+        h = max(f, int(src_h * scale) // f * f)
+        while self.tokens(w, h) > budget and (w > f or h > f):
+            if w * src_h >= h * src_w and w > f:
+                w -= f
+            else:
+                h -= f
+        return self.resize(w, h)
+
+
+def load_params(path: str) -> VisionParams:
+    # Reads the "vision hparams" block of a llama.cpp model-load log.
+    values: Dict[str, int] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            m = _HPARAM.match(line)
+            if m:
+                values[m.group(1)] = int(m.group(2))
+    return VisionParams(
+        patch_size=values.get("patch_size", 16),
+        n_merge=values.get("n_merge", 2),
+        min_pixels=values.get("image_min_pixels", 8192),
+        max_pixels=values.get("image_max_pixels", 4194304),
+    )
+
+
+def from_cfg(cfg: Dict[str, Any]) -> VisionParams:
+    path: Optional[str] = cfg.get("vision_hparams")
+    if path and os.path.exists(path):
+        return load_params(path)
+    return VisionParams()
@@ -1,12 +1,15 @@
 # winapi.py
 from __future__ import annotations
 import os
-import time
 import ctypes
 from ctypes import wintypes
-import struct
-import zlib
-from typing import Tuple
+from typing import Optional, Tuple
+
+from backends import norm_to_screen_px
+from cursor import CursorOverlay, Sprite
+from encoders import FrameEncoder, encode_png
+from imaging import Frame, bgra_to_rgb, dib_view
+from sendinput import INPUT, InputEngine
 
 if os.name != "nt":
     raise OSError("Windows required")
@@ -18,9 +21,6 @@ wintypes.HCURSOR = wintypes.HANDLE
 wintypes.HBITMAP = wintypes.HANDLE
 wintypes.HICON = wintypes.HANDLE
 
-# ULONG_PTR = wintypes.ULONG_PTR
-ULONG_PTR = ctypes.c_ulonglong if ctypes.sizeof(ctypes.c_void_p) == 8 else ctypes.c_ulong
-
 DPI_AWARENESS_CONTEXT_PER_MONITOR_AWARE_V2 = ctypes.c_void_p(-4)
 SM_CXSCREEN = 0
 SM_CYSCREEN = 1
@@ -28,13 +28,6 @@ CURSOR_SHOWING = 0x00000001
 DI_NORMAL = 0x0003
 BI_RGB = 0
 DIB_RGB_COLORS = 0
-INPUT_MOUSE = 0
-INPUT_KEYBOARD = 1
-KEYEVENTF_KEYUP = 0x0002
-KEYEVENTF_UNICODE = 0x0004
-MOUSEEVENTF_LEFTDOWN = 0x0002
-MOUSEEVENTF_LEFTUP = 0x0004
-MOUSEEVENTF_WHEEL = 0x0800
 HALFTONE = 4
 SRCCOPY = 0x00CC0020
 
@@ -82,43 +75,18 @@ class BITMAPINFO(ctypes.Structure):
     _fields_ = [("bmiHeader", BITMAPINFOHEADER), ("bmiColors", wintypes.DWORD * 3)]
 
 
-class MOUSEINPUT(ctypes.Structure):
+class BITMAP(ctypes.Structure):
     _fields_ = [
-        ("dx", wintypes.LONG),
-        ("dy", wintypes.LONG),
-        ("mouseData", wintypes.DWORD),
-        ("dwFlags", wintypes.DWORD),
-        ("time", wintypes.DWORD),
-        ("dwExtraInfo", ULONG_PTR),
+        ("bmType", wintypes.LONG),
+        ("bmWidth", wintypes.LONG),
+        ("bmHeight", wintypes.LONG),
+        ("bmWidthBytes", wintypes.LONG),
+        ("bmPlanes", wintypes.WORD),
+        ("bmBitsPixel", wintypes.WORD),
+        ("bmBits", wintypes.LPVOID),
     ]
 
 
-class KEYBDINPUT(ctypes.Structure):
-    _fields_ = [
-        ("wVk", wintypes.WORD),
-        ("wScan", wintypes.WORD),
-        ("dwFlags", wintypes.DWORD),
-        ("time", wintypes.DWORD),
-        ("dwExtraInfo", ULONG_PTR),
-    ]
-
-
-class HARDWAREINPUT(ctypes.Structure):
-    _fields_ = [
-        ("uMsg", wintypes.DWORD),
-        ("wParamL", wintypes.WORD),
-        ("wParamH", wintypes.WORD),
-    ]
-
-
-class INPUT_I(ctypes.Union):
-    _fields_ = [("mi", MOUSEINPUT), ("ki", KEYBDINPUT), ("hi", HARDWAREINPUT)]
-
-
-class INPUT(ctypes.Structure):
-    _fields_ = [("type", wintypes.DWORD), ("ii", INPUT_I)]
-
-
 _user32_sigs = [
     ("GetSystemMetrics", [wintypes.INT], wintypes.INT),
     ("GetDC", [wintypes.HWND], wintypes.HDC),
@@ -142,6 +110,7 @@ _user32_sigs = [
         wintypes.BOOL,
     ),
     ("SetCursorPos", [wintypes.INT, wintypes.INT], wintypes.BOOL),
+    ("GetForegroundWindow", [], wintypes.HWND),
     (
         "SendInput",
         [wintypes.UINT, ctypes.POINTER(INPUT), ctypes.c_int],
@@ -154,6 +123,8 @@ for _name, _args, _ret in _user32_sigs:
     _fn.argtypes = _args
     _fn.restype = _ret
 
+input_engine = InputEngine(user32)
+
 _gdi32_sigs = [
     ("CreateCompatibleDC", [wintypes.HDC], wintypes.HDC),
     ("DeleteDC", [wintypes.HDC], wintypes.BOOL),
@@ -189,6 +160,20 @@ _gdi32_sigs = [
         wintypes.BOOL,
     ),
     ("SetStretchBltMode", [wintypes.HDC, wintypes.INT], wintypes.INT),
+    ("GetObjectW", [wintypes.HGDIOBJ, wintypes.INT, wintypes.LPVOID], wintypes.INT),
+    (
+        "GetDIBits",
+        [
+            wintypes.HDC,
+            wintypes.HBITMAP,
+            wintypes.UINT,
+            wintypes.UINT,
+            wintypes.LPVOID,
+            ctypes.POINTER(BITMAPINFO),
+            wintypes.UINT,
+        ],
+        wintypes.INT,
+    ),
 ]
 for _name, _args, _ret in _gdi32_sigs:
     _fn = getattr(gdi32, _name)
@@ -222,17 +207,128 @@ def get_cursor_pos() -> Tuple[int, int]:
     return int(p.x), int(p.y)
 
 
-def norm_to_screen_px(
-    xn: float, yn: float, screen_w: int, screen_h: int
-) -> Tuple[int, int]:
-    x = int(round((xn / 1000.0) * (screen_w - 1)))
-    y = int(round((yn / 1000.0) * (screen_h - 1)))
-    return x, y
+CURSOR_MODES = ("sprite", "gdi", "none")
+
+# "sprite" composites a cached RGBA copy of the cursor into the converted
+# frame; "gdi" is the older DrawIconEx onto the bitmap before conversion.
+# Both leave the pointer out while Windows reports it hidden.
+cursor_mode = "sprite"
+
+
+def _bitmap_bgra(hdc: int, hbm: int, w: int, h: int) -> bytes:
+    # Top-down 32-bit copy of any bitmap; a 1-bit mask comes back as
+    # 0x000000 / 0xFFFFFF pixels.
+    bmi = BITMAPINFO()
+    ctypes.memset(ctypes.byref(bmi), 0, ctypes.sizeof(bmi))
+    bmi.bmiHeader.biSize = ctypes.sizeof(BITMAPINFOHEADER)
+    bmi.bmiHeader.biWidth = w
+    bmi.bmiHeader.biHeight = -h
+    bmi.bmiHeader.biPlanes = 1
+    bmi.bmiHeader.biBitCount = 32
+    bmi.bmiHeader.biCompression = BI_RGB
+    buf = ctypes.create_string_buffer(w * h * 4)
+    if gdi32.GetDIBits(hdc, hbm, 0, h, buf, ctypes.byref(bmi), DIB_RGB_COLORS) != h:
+        raise OSError("GetDIBits failed")
+    return buf.raw
+
+
+def load_cursor_sprite(hcursor: int) -> Optional[Sprite]:
+    # Reads the cursor's bitmaps once into an RGBA sprite. Colour cursors use
+    # their alpha channel, or the AND mask when it is empty; monochrome ones
+    # hold AND over XOR in one double-height mask, and inverting pixels are
+    # drawn black so they show on any background.
+    ii = ICONINFO()
+    if not user32.GetIconInfo(hcursor, ctypes.byref(ii)):
+        return None
+    hdc = user32.GetDC(None)
+    try:
+        bm = BITMAP()
+        if not gdi32.GetObjectW(ii.hbmMask, ctypes.sizeof(BITMAP), ctypes.byref(bm)):
+            return None
+        w = int(bm.bmWidth)
+        h = int(bm.bmHeight) if ii.hbmColor else int(bm.bmHeight) // 2
+        mask = _bitmap_bgra(hdc, ii.hbmMask, w, int(bm.bmHeight))
+        color = _bitmap_bgra(hdc, ii.hbmColor, w, h) if ii.hbmColor else None
+    except OSError:
+        return None
+    finally:
+        user32.ReleaseDC(None, hdc)
+        if ii.hbmMask:
+            gdi32.DeleteObject(ii.hbmMask)
+        if ii.hbmColor:
+            gdi32.DeleteObject(ii.hbmColor)
+    rgba = bytearray(w * h * 4)
+    has_alpha = color is not None and any(color[3::4])
+    for i in range(w * h):
+        p = i * 4
+        transparent = mask[p] != 0
+        if color is not None:
+            if has_alpha:
+                rgba[p : p + 4] = bytes((color[p + 2], color[p + 1], color[p], color[p + 3]))
+            elif not transparent:
+                rgba[p : p + 4] = bytes((color[p + 2], color[p + 1], color[p], 255))
+        else:
+            xor = mask[w * h * 4 + p] != 0
+            if not transparent:
+                rgba[p : p + 4] = b"\xff\xff\xff\xff" if xor else b"\x00\x00\x00\xff"
+            elif xor:
+                rgba[p : p + 4] = b"\x00\x00\x00\xff"
+    return Sprite(w, h, bytes(rgba), int(ii.xHotspot), int(ii.yHotspot))
+
+
+cursor_overlay = CursorOverlay(load_cursor_sprite)
+
+
+def get_cursor_info() -> Optional[Tuple[int, int, int]]:
+    # (handle, x, y) of a showing pointer, None while it is hidden. A
+    # showing pointer can still report handle 0; it gets the fallback arrow.
+    ci = CURSORINFO()
+    ci.cbSize = ctypes.sizeof(CURSORINFO)
+    if not user32.GetCursorInfo(ctypes.byref(ci)):
+        return None
+    if not (ci.flags & CURSOR_SHOWING):
+        return None
+    return ci.hCursor or 0, int(ci.ptScreenPos.x), int(ci.ptScreenPos.y)
+
+
+def draw_cursor_sprite(
+    rgb: Frame,
+    screen_w: int,
+    screen_h: int,
+    dst_w: int,
+    dst_h: int,
+    src_x: int = 0,
+    src_y: int = 0,
+) -> Frame:
+    # One GetCursorInfo per frame and no GDI objects; the sprite comes from
+    # cursor_overlay's cache and is drawn into the converter's bytearray in
+    # place (an immutable frame, from the NumPy engine, is copied once).
+    info = get_cursor_info()
+    if info is None:
+        return rgb
+    handle, x, y = info
+    sx = dst_w / float(screen_w)
+    sy = dst_h / float(screen_h)
+    fx, fy = (x - src_x) * sx, (y - src_y) * sy
+    margin = 256
+    if not (-margin < fx < dst_w + margin and -margin < fy < dst_h + margin):
+        return rgb
+    fb = rgb if isinstance(rgb, bytearray) else bytearray(rgb)
+    cursor_overlay.draw(fb, dst_w, dst_h, handle, fx, fy, sx, sy)
+    return fb
 
 
 def draw_cursor_on_dc(
-    hdc_mem: int, screen_w: int, screen_h: int, dst_w: int, dst_h: int
+    hdc_mem: int,
+    screen_w: int,
+    screen_h: int,
+    dst_w: int,
+    dst_h: int,
+    src_x: int = 0,
+    src_y: int = 0,
 ) -> bool:
+    # screen_w x screen_h at (src_x, src_y) is the source rectangle that was
+    # stretched onto the dst_w x dst_h bitmap.
     ci = CURSORINFO()
     ci.cbSize = ctypes.sizeof(CURSORINFO)
     if not user32.GetCursorInfo(ctypes.byref(ci)):
@@ -243,8 +339,8 @@ def draw_cursor_on_dc(
     if not user32.GetIconInfo(ci.hCursor, ctypes.byref(ii)):
         return False
     try:
-        cur_x = int(ci.ptScreenPos.x) - int(ii.xHotspot)
-        cur_y = int(ci.ptScreenPos.y) - int(ii.yHotspot)
+        cur_x = int(ci.ptScreenPos.x) - int(ii.xHotspot) - src_x
+        cur_y = int(ci.ptScreenPos.y) - int(ii.yHotspot) - src_y
         dx = int(round(cur_x * (dst_w / float(screen_w))))
         dy = int(round(cur_y * (dst_h / float(screen_h))))
         return bool(
@@ -258,42 +354,18 @@ def draw_cursor_on_dc(
 
 
 def encode_rgb_to_png(rgb: bytes, w: int, h: int) -> bytes:
-    sig = b"\x89PNG\r\n\x1a\n"
-    ihdr = struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0)
-
-    def chunk(t: bytes, d: bytes) -> bytes:
-        return (
-            struct.pack(">I", len(d))
-            + t
-            + d
-            + struct.pack(">I", zlib.crc32(t + d) & 0xFFFFFFFF)
-        )
+    return encode_png(rgb, w, h)
+
 
-    row = w * 3
-    stride = row + 1
-    raw = bytearray(stride * h)
-    for y in range(h):
-        base = y * stride
-        raw[base] = 0
-        off = y * row
-        raw[base + 1 : base + 1 + row] = rgb[off : off + row]
-    comp = zlib.compress(bytes(raw), 6)
-    return sig + chunk(b"IHDR", ihdr) + chunk(b"IDAT", comp) + chunk(b"IEND", b"")
-
-
-def bgra_to_rgb(bgra: bytes, w: int, h: int) -> bytes:
-    rgb = bytearray(w * h * 3)
-    j = 0
-    for i in range(0, len(bgra), 4):
-        rgb[j] = bgra[i + 2]
-        rgb[j + 1] = bgra[i + 1]
-        rgb[j + 2] = bgra[i]
-        j += 3
-    return bytes(rgb)
-
-
-def capture_screenshot_png(target_w: int, target_h: int) -> Tuple[bytes, int, int]:
+def capture_frame(target_w: int, target_h: int) -> Tuple[Frame, int, int]:
     screen_w, screen_h = get_screen_size()
+    rgb = capture_region(0, 0, screen_w, screen_h, target_w, target_h)
+    return rgb, screen_w, screen_h
+
+
+def capture_region(
+    src_x: int, src_y: int, src_w: int, src_h: int, target_w: int, target_h: int
+) -> Frame:
     hdc_screen = user32.GetDC(None)
     if not hdc_screen:
         raise RuntimeError("GetDC failed")
@@ -332,18 +404,20 @@ def capture_screenshot_png(target_w: int, target_h: int) -> Tuple[bytes, int, in
             target_w,
             target_h,
             hdc_screen,
-            0,
-            0,
-            screen_w,
-            screen_h,
+            src_x,
+            src_y,
+            src_w,
+            src_h,
             SRCCOPY,
         ):
             raise RuntimeError("StretchBlt failed")
-        draw_cursor_on_dc(hdc_mem, screen_w, screen_h, target_w, target_h)
+        if cursor_mode == "gdi":
+            draw_cursor_on_dc(hdc_mem, src_w, src_h, target_w, target_h, src_x, src_y)
         size = target_w * target_h * 4
-        bgra = ctypes.string_at(bits, size)
-        rgb = bgra_to_rgb(bgra, target_w, target_h)
-        return encode_rgb_to_png(rgb, target_w, target_h), screen_w, screen_h
+        rgb = bgra_to_rgb(dib_view(bits.value, size), target_w, target_h)
+        if cursor_mode == "sprite":
+            rgb = draw_cursor_sprite(rgb, src_w, src_h, target_w, target_h, src_x, src_y)
+        return rgb
     finally:
         if hdc_mem and old:
             gdi32.SelectObject(hdc_mem, old)
@@ -354,26 +428,13 @@ def capture_screenshot_png(target_w: int, target_h: int) -> Tuple[bytes, int, in
         user32.ReleaseDC(None, hdc_screen)
 
 
-def _send_inputs(*inps: INPUT) -> None:
-    n = len(inps)
-    if n <= 0:
-        return
-    arr = (INPUT * n)(*inps)
-    user32.SendInput(n, arr, ctypes.sizeof(INPUT))
-
-
-def _mi(flags: int, data: int = 0, dx: int = 0, dy: int = 0) -> INPUT:
-    i = INPUT()
-    i.type = INPUT_MOUSE
-    i.ii.mi = MOUSEINPUT(dx, dy, data, flags, 0, 0)
-    return i
-
-
-def _ki(scan: int, flags: int) -> INPUT:
-    i = INPUT()
-    i.type = INPUT_KEYBOARD
-    i.ii.ki = KEYBDINPUT(0, scan, flags, 0, 0)
-    return i
+def capture_screenshot_png(
+    target_w: int, target_h: int, encoder: Optional[FrameEncoder] = None
+) -> Tuple[bytes, int, int]:
+    rgb, screen_w, screen_h = capture_frame(target_w, target_h)
+    if encoder is None:
+        return encode_rgb_to_png(rgb, target_w, target_h), screen_w, screen_h
+    return encoder.encode(rgb, target_w, target_h), screen_w, screen_h
 
 
 def move_mouse_norm(xn: float, yn: float) -> Tuple[int, int]:
@@ -383,16 +444,17 @@ def move_mouse_norm(xn: float, yn: float) -> Tuple[int, int]:
     return screen_w, screen_h
 
 
+def get_foreground_window() -> int:
+    return user32.GetForegroundWindow() or 0
+
+
 def click_mouse() -> None:
-    _send_inputs(_mi(MOUSEEVENTF_LEFTDOWN), _mi(MOUSEEVENTF_LEFTUP))
+    input_engine.click()
 
 
-def scroll_down() -> None:
-    _send_inputs(_mi(MOUSEEVENTF_WHEEL, (-120) & 0xFFFFFFFF))
+def scroll_down(notches: int = 1) -> None:
+    input_engine.scroll(notches)
 
 
 def type_text(text: str) -> None:
-    for ch in text:
-        code = ord(ch)
-        _send_inputs(_ki(code, KEYEVENTF_UNICODE), _ki(code, KEYEVENTF_UNICODE | KEYEVENTF_KEYUP))
-        time.sleep(0.005)
\ No newline at end of file
+    input_engine.type_text(text)
\ No newline at end of file